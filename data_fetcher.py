@@ -8,6 +8,7 @@ import logging
 
 import concurrent.futures
 
+from easyquotation.throttle import limit
 from utils import DateHelper
 
 
@@ -15,13 +16,14 @@ def fetch(stock_code):
     # 起始日期取回测时间+120天前的数据
     start_date = DateHelper.get_days_before(120, DateHelper.get_end_date())
     format_start_date = DateHelper.date_to_str(DateHelper.str_to_date(start_date),"%Y%m%d")
-    # 使用akshare获取股票数据, 捕获异常,并打印
-    data = ak.stock_zh_a_hist(
-            symbol=stock_code,     # 股票代码
-            period="daily",        # 日线数据
-            start_date= format_start_date, # 起始日期
-            adjust="qfq"           # 前复权
-        )
+    # 使用akshare获取股票数据, 捕获异常,并打印; 与其他请求共用东方财富的限流
+    with limit('push2his.eastmoney.com'):
+        data = ak.stock_zh_a_hist(
+                symbol=stock_code,     # 股票代码
+                period="daily",        # 日线数据
+                start_date= format_start_date, # 起始日期
+                adjust="qfq"           # 前复权
+            )
     if data.empty:
         # logging.info("股票日线数据缺失:{}".format(stock_code))
         return None
@@ -1,6 +1,9 @@
 from .strategy.strategyTemplate import StrategyTemplate
 from .push_engine.base_engine import BaseEngine as PushBaseEngine
-from .push_engine.quotation_engine import QuotationEngine
+from .push_engine.quotation_engine import QuotationEngine, AsyncQuotationEngine
 from .log_handler.default_handler import DefaultLogHandler
 from .main_engine import MainEngine
 from .log_handler.default_handler import DefaultLogHandler
+
+__all__ = ['StrategyTemplate', 'PushBaseEngine', 'QuotationEngine', 'AsyncQuotationEngine',
+           'DefaultLogHandler', 'MainEngine']
@@ -13,6 +13,7 @@ from .event_engine import EventEngine
 from .log_handler.default_handler import MockLogHandler
 from .push_engine.quotation_engine import QuotationEngine
 from .quotation import use_quotation
+from .replay_feed import ReplayFeed
 from .strategy.strategyTemplate import StrategyTemplate
 
 StreamHandler(sys.stdout).push_application()
@@ -61,6 +62,9 @@ class BackTestEngine:
         self.end_date = end_date
 
         self.quotation_engine = QuotationEngine(self.quotation, self.event_engine, bar_type=bar_type)
+        # 每个股票的K线只获取一次, 按回测时间回放
+        self.feed = ReplayFeed(self.quotation, bar_type, start_date, end_date,
+                               window=self.quotation_engine.buffer_size)
         self.strategy: StrategyTemplate = strategy_class(self.user, self.log, self)
 
         # 加载锁
@@ -84,16 +88,9 @@ class BackTestEngine:
     def start(self):
         """ 启动回测 """
         self.user.set_quotation(self.quotation)
-        start_date_time = datetime.strptime(self.start_date, '%Y-%m-%d')
-        end_date_time = datetime.strptime(self.end_date, '%Y-%m-%d')
-
-        current_dt = start_date_time
-
-        while current_dt <= end_date_time:
-            # 交易日
-            if not self.context.is_trade_date(current_dt.strftime("%Y-%m-%d")):
-                current_dt = current_dt + timedelta(days=1)
-                continue
+        # 只遍历区间内的交易日
+        for day in self.context.calendar.range(self.start_date, self.end_date):
+            current_dt = datetime.combine(day.astype(object), datetime.min.time())
 
             # TODO 待优化
             self.context.user.set_time(current_dt)
@@ -106,7 +103,6 @@ class BackTestEngine:
             self.context.change_dt(current_dt + timedelta(hours=15, minutes=30))
             self.strategy.on_close(self.context)
 
-            current_dt = current_dt + timedelta(days=1)
             # 记录交易
 
             self.user.get_balance()
@@ -122,12 +118,12 @@ class BackTestEngine:
             while current_time <= end_date:
                 self.context.change_dt(current_time)
                 # 更新
-                strategy.on_bar(self.context, self.quotation_engine.fetch_quotation(end_date=current_time))
+                strategy.on_bar(self.context, self.feed.fetch(self.quotation_engine.stocks, current_time))
                 current_time += timedelta(minutes=minute)
         else:
             # day = int
             self.context.change_dt(end_date)
-            quotation_data = self.quotation_engine.fetch_quotation(end_date=end_date)
+            quotation_data = self.feed.fetch(self.quotation_engine.stocks, end_date)
             self.user.update_balance(quotation_data)
             # 更新持仓
             strategy.on_bar(self.context, quotation_data)
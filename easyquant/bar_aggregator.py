@@ -0,0 +1,153 @@
+# coding: utf-8
+import datetime
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from .easydealutils.time import get_bar_close_times
+
+
+def _minute_of_day(t):
+    return t.hour * 60 + t.minute
+
+
+def _bar_lookup(closes):
+    """
+    一天中每一分钟(0~1439) -> 所属1分钟K线的下标, K线以结束时间标记
+    开盘前的集合竞价并入第一根K线, 午间休市并入上午最后一根, 收盘后并入最后一根
+    """
+    lookup = np.zeros(24 * 60, dtype=np.int16)
+    previous_end = 0
+    for index, close in enumerate(closes):
+        end = _minute_of_day(close)
+        # 与上一根K线之间的空档(休市)归上一根
+        lookup[previous_end:end - 1] = max(index - 1, 0)
+        lookup[end - 1:end] = index
+        previous_end = end
+    lookup[previous_end:] = len(closes) - 1
+    return lookup
+
+
+class MinuteBarAggregator:
+    """
+    用全市场快照合成1分钟K线
+
+    每次快照按股票代码批量更新: 快照时间定位到所属的K线, 现价更新 OHLC,
+    累计成交量 / 成交额与上一次快照的差值计入当前K线. 全部状态是 [K线数, 股票数] 的数组, 每天重置
+    """
+    FIELDS = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+    def __init__(self):
+        self.closes = get_bar_close_times(1)
+        self._lookup = _bar_lookup(self.closes)
+        self.day = None
+        self.codes = {}
+        self._reset(0)
+
+    def _reset(self, size):
+        n = len(self.closes)
+        self.bars = {field: np.full((n, size), np.nan) for field in self.FIELDS}
+        # 每个股票上一次快照的累计成交量 / 成交额 / 时间
+        self._last_volume = np.full(size, np.nan)
+        self._last_amount = np.full(size, np.nan)
+        self._last_time = np.full(size, -1, dtype=np.int64)
+        # 每个股票第一次收到快照时所在的K线, 不为 0 说明当天开头的K线缺失
+        self._first_bar = np.full(size, -1, dtype=np.int64)
+        # 每个股票当前(最后一根)K线的下标
+        self._current_bar = np.full(size, -1, dtype=np.int64)
+
+    def _grow(self, size):
+        old = len(self._last_volume)
+        if size <= old:
+            return
+        extra = size - old
+        n = len(self.closes)
+        for field in self.FIELDS:
+            self.bars[field] = np.hstack([self.bars[field], np.full((n, extra), np.nan)])
+        self._last_volume = np.concatenate([self._last_volume, np.full(extra, np.nan)])
+        self._last_amount = np.concatenate([self._last_amount, np.full(extra, np.nan)])
+        self._last_time = np.concatenate([self._last_time, np.full(extra, -1, dtype=np.int64)])
+        self._first_bar = np.concatenate([self._first_bar, np.full(extra, -1, dtype=np.int64)])
+        self._current_bar = np.concatenate([self._current_bar, np.full(extra, -1, dtype=np.int64)])
+
+    def _code_ids(self, codes):
+        for code in codes:
+            if code not in self.codes:
+                self.codes[code] = len(self.codes)
+        self._grow(len(self.codes))
+        return np.fromiter((self.codes[code] for code in codes), dtype=np.int64, count=len(codes))
+
+    def update(self, codes, times, price, volume, amount):
+        """
+        合并一次快照
+        :param codes: 股票代码列表
+        :param times: 各股票的行情时间, datetime64 数组或 Series
+        :param price: 现价
+        :param volume: 当天累计成交量
+        :param amount: 当天累计成交额
+        """
+        times = pd.DatetimeIndex(times)
+        if not len(times):
+            return
+        day = times.max().date()
+        if day != self.day:
+            self.day = day
+            self.codes = {}
+            self._reset(0)
+        ids = self._code_ids(list(codes))
+        price = np.asarray(price, dtype=np.float64)
+        volume = np.asarray(volume, dtype=np.float64)
+        amount = np.asarray(amount, dtype=np.float64)
+        seconds = (times.hour * 3600 + times.minute * 60 + times.second).to_numpy(dtype=np.int64)
+
+        # 只处理当天的、行情时间有更新的、有成交价的股票
+        valid = (times.normalize() == pd.Timestamp(day)) & (seconds > self._last_time[ids]) & (price > 0)
+        ids, price, volume, amount, seconds = ids[valid], price[valid], volume[valid], amount[valid], seconds[valid]
+        bar = self._lookup[seconds // 60].astype(np.int64)
+
+        first = self._first_bar[ids] < 0
+        self._first_bar[ids[first]] = bar[first]
+        # 第一次收到的快照: 只有在第一根K线内才能把累计量都算到当前K线, 否则之前的量无法分配
+        last_volume = np.where(first, np.where(bar == 0, 0, volume), self._last_volume[ids])
+        last_amount = np.where(first, np.where(bar == 0, 0, amount), self._last_amount[ids])
+        volume_delta = np.maximum(volume - last_volume, 0)
+        amount_delta = np.maximum(amount - last_amount, 0)
+
+        bars = self.bars
+        is_new = np.isnan(bars['open'][bar, ids])
+        bars['open'][bar[is_new], ids[is_new]] = price[is_new]
+        bars['high'][bar, ids] = np.fmax(bars['high'][bar, ids], price)
+        bars['low'][bar, ids] = np.fmin(bars['low'][bar, ids], price)
+        bars['close'][bar, ids] = price
+        bars['volume'][bar, ids] = np.nan_to_num(bars['volume'][bar, ids]) + volume_delta
+        bars['amount'][bar, ids] = np.nan_to_num(bars['amount'][bar, ids]) + amount_delta
+
+        self._last_volume[ids] = volume
+        self._last_amount[ids] = amount
+        self._last_time[ids] = seconds
+        self._current_bar[ids] = np.maximum(self._current_bar[ids], bar)
+
+    def is_complete(self, code):
+        """当天的K线是否从第一根开始都已合成"""
+        index = self.codes.get(code)
+        return index is not None and self._first_bar[index] == 0
+
+    def bars_of(self, code) -> DataFrame:
+        """
+        股票当天已合成的1分钟K线, 最后一根可能还没走完
+        没有成交的分钟用上一根K线的收盘价补齐, 成交量为 0
+        """
+        index = self.codes.get(code)
+        if index is None or self._current_bar[index] < 0:
+            return DataFrame(columns=self.FIELDS, index=pd.DatetimeIndex([]))
+        start, end = int(self._first_bar[index]), int(self._current_bar[index]) + 1
+        df = DataFrame({field: self.bars[field][start:end, index] for field in self.FIELDS},
+                       index=pd.DatetimeIndex([datetime.datetime.combine(self.day, close)
+                                               for close in self.closes[start:end]]))
+        df['close'] = df['close'].ffill()
+        missing = df['open'].isna()
+        for field in ('open', 'high', 'low'):
+            df.loc[missing, field] = df.loc[missing, 'close']
+        df[['volume', 'amount']] = df[['volume', 'amount']].fillna(0)
+        return df
@@ -0,0 +1,114 @@
+# coding: utf-8
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+
+# 行情源的列名 -> BarBuffer 的列名, 如 tushare 的成交量列为 vol(单位沿用行情源)
+COLUMN_ALIASES = {'vol': 'volume'}
+
+
+def to_ohlcv(df: DataFrame) -> DataFrame:
+    """只保留 BarBuffer.FIELDS 列, 按 COLUMN_ALIASES 统一列名"""
+    return df.rename(columns=COLUMN_ALIASES)[BarBuffer.FIELDS]
+
+
+class BarBuffer:
+    """
+    单个股票定长的K线缓冲区, 只保存 OHLCV(BarBuffer.FIELDS), 行情源的其他列(如 jqdata 的 money)不保存
+
+    数据存放在 2 倍容量的连续数组中, 数组写满后把最近 capacity 根K线搬到新数组的开头, 追加K线均摊 O(1).
+    frame() 返回缓冲区的可写副本(与回测的 ReplayFeed 一致), 策略增加列或原地修改都不会影响缓冲区;
+    复制的是 capacity x 5 的数组, 相比每次重新请求和解析全部K线可以忽略
+    """
+    FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+    def __init__(self, capacity=200):
+        """
+        :param capacity: 最多保留的K线数量
+        """
+        self.capacity = capacity
+        self._times = np.empty(2 * capacity, dtype='datetime64[ns]')
+        self._values = np.empty((2 * capacity, len(self.FIELDS)), dtype='float64')
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def last_time(self):
+        """最后一根K线的时间"""
+        if not len(self):
+            return None
+        return pd.Timestamp(self._times[self._end - 1])
+
+    def load(self, df: DataFrame):
+        """全量加载K线, 丢弃原有数据"""
+        times, values = self._to_arrays(df)
+        self._reallocate(0)
+        self._append(times, values)
+
+    def update(self, df: DataFrame):
+        """
+        合并增量K线: 与最后一根K线时间相同的行覆盖最后一根(未走完的K线), 时间更新的行追加到后面
+        :return: False 表示增量数据没有包含最后一根K线, 中间可能有缺口, 需要重新全量加载
+        """
+        if not len(self):
+            return False
+        times, values = self._to_arrays(df)
+        last_time = self._times[self._end - 1]
+        pos = int(np.searchsorted(times, last_time))
+        if pos == len(times) or times[pos] != last_time:
+            return False
+        # 最后一根K线重新写入
+        self._end -= 1
+        self._append(times[pos:], values[pos:])
+        return True
+
+    def sync(self, fetch, now, bar_seconds):
+        """
+        从行情源刷新缓冲区: 为空时全量加载, 否则只获取最后一根K线以来的K线(多取一根覆盖未走完的K线)
+        :param fetch: fetch(count) -> DataFrame, 获取最近 count 根K线
+        :param now: datetime.datetime, 当前时间
+        :param bar_seconds: 每根K线的时长(秒)
+        """
+        if len(self):
+            elapsed = (now - self.last_time.to_pydatetime()).total_seconds()
+            count = min(self.capacity, int(elapsed // bar_seconds) + 2)
+            if self.update(fetch(count)):
+                return
+        self.load(fetch(self.capacity))
+
+    def frame(self) -> DataFrame:
+        """当前缓冲区K线的 DataFrame 副本, 按时间升序"""
+        times = self._times[self._start:self._end].copy()
+        values = self._values[self._start:self._end].copy()
+        return DataFrame(values, index=pd.DatetimeIndex(times), columns=self.FIELDS, copy=False)
+
+    def _append(self, times, values):
+        if len(times) > self.capacity:
+            times, values = times[-self.capacity:], values[-self.capacity:]
+        n = len(times)
+        if self._end + n > len(self._times):
+            self._reallocate(self.capacity - n)
+        self._times[self._end:self._end + n] = times
+        self._values[self._end:self._end + n] = values
+        self._end += n
+        self._start = max(self._start, self._end - self.capacity)
+
+    def _reallocate(self, keep):
+        """把最近 keep 根K线搬到新数组的开头"""
+        keep = max(0, min(keep, len(self)))
+        times = np.empty_like(self._times)
+        values = np.empty_like(self._values)
+        times[:keep] = self._times[self._end - keep:self._end]
+        values[:keep] = self._values[self._end - keep:self._end]
+        self._times, self._values = times, values
+        self._start, self._end = 0, keep
+
+    def _to_arrays(self, df: DataFrame):
+        df = df.sort_index()
+        times = pd.to_datetime(df.index).values.astype('datetime64[ns]')
+        values = to_ohlcv(df).to_numpy(dtype='float64')
+        return times, values
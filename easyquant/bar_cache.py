@@ -0,0 +1,143 @@
+# coding: utf-8
+"""
+行情数据的内存缓存
+
+按估算的字节数限制总大小, 超出时淘汰最久未使用的条目;
+同一个 key 同时未命中时只有一个线程调用 loader, 其余线程等待它的结果
+"""
+import collections
+import sys
+import threading
+import time
+
+import numpy as np
+from pandas import DataFrame, Series
+
+
+def estimate_size(value) -> int:
+    """估算缓存对象占用的字节数"""
+    if isinstance(value, DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, Series):
+        return int(value.memory_usage(index=True, deep=False))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+class _Flight:
+    """正在加载的 key, 等待的线程通过 event 获取结果"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class BarCache:
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        :param max_bytes: 缓存总大小上限(字节)
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (value, size, expires), 按使用顺序排列, 最近使用的在末尾
+        self._entries = collections.OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader, expires=None):
+        """
+        获取缓存, 未命中或已过期时调用 loader() 加载并放入缓存
+        :param key: 可哈希的缓存键
+        :param loader: 无参数函数, 返回要缓存的值; 抛出的异常会传给所有等待的线程, 结果不缓存
+        :param expires: 新加载的值的过期时间(time.time() 时间戳), 为 None 时不过期
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.time():
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            self.put(key, flight.value, expires)
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+        return flight.value
+
+    def peek(self, key):
+        """获取未过期的缓存, 未命中时返回 None, 不加载"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.time():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, expires=None):
+        size = estimate_size(value)
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                # 单个条目超过上限, 不缓存
+                return
+            self._entries[key] = (value, size, expires)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """命中 / 未命中 / 淘汰次数和当前占用"""
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+                        entries=len(self._entries), bytes=self.bytes, max_bytes=self.max_bytes)
@@ -0,0 +1,237 @@
+# coding: utf-8
+"""
+按 (股票, 周期) 保存的本地K线缓存
+
+每个 (股票, 周期) 一个目录: times.<版本>.npy(datetime64[ns]) + values.<版本>.npy(float64[K线数, 列数]) + meta.json,
+meta.json 记录当前版本、列名和已覆盖的时间区间. 查询任意 end_dt / count 时在已覆盖区间内切片,
+只有缺少的部分才向行情源请求, 请求结果合并进缓存.
+数据文件以内存映射方式读取, 每次保存写入新版本的文件而不是覆盖, 之前返回的数据仍可能映射着旧文件
+(Windows 上不能替换或删除被映射的文件).
+前复权的行情源每次请求都以请求当天为复权基准, 除权除息后已走完的K线价格会变: 合并时比较新旧数据重叠的已走完K线,
+不一致说明复权基准变了, 丢弃整个缓存重新请求, 缓存中的K线始终是同一个复权基准
+"""
+import datetime
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from .easydealutils.time import calendar
+
+# 区间起点为 BEGIN 表示已经取到了行情源最早的K线
+BEGIN = np.iinfo(np.int64).min
+
+
+def bars_per_day(unit):
+    """每个交易日的K线数量(估计), 用于计算补齐缺口需要请求多少根K线, 分钟周期为 '5m' / '5min', '1M' 是月线"""
+    for suffix in ('min', 'm'):
+        if unit.endswith(suffix) and unit[:-len(suffix)].isdigit():
+            return max(240 // int(unit[:-len(suffix)]), 1)
+    return 1
+
+
+class BarStore:
+
+    def __init__(self, root='data/bars'):
+        """
+        :param root: 缓存根目录
+        """
+        self.root = root
+        # (股票, 周期) -> (times, values, columns, ranges)
+        self._loaded = {}
+        # (股票, 周期) -> 当前数据文件的版本
+        self._versions = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _path(self, symbol, unit):
+        return os.path.join(self.root, unit, symbol)
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _load(self, symbol, unit):
+        key = (symbol, unit)
+        if key in self._loaded:
+            return self._loaded[key]
+        path = self._path(symbol, unit)
+        meta_path = os.path.join(path, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        version = self._versions[key] = meta['version']
+        times = np.load(os.path.join(path, 'times.%d.npy' % version), mmap_mode='r')
+        values = np.load(os.path.join(path, 'values.%d.npy' % version), mmap_mode='r')
+        loaded = self._loaded[key] = (times, values, meta['columns'], [tuple(r) for r in meta['ranges']])
+        return loaded
+
+    def _save(self, symbol, unit, times, values, columns, ranges):
+        key = (symbol, unit)
+        path = self._path(symbol, unit)
+        os.makedirs(path, exist_ok=True)
+        # 数据写入新版本的文件, 最后替换 meta.json 切换版本, 中途退出不会留下不完整的缓存
+        version = self._versions.get(key, 0) + 1
+        for name, array in (('times', times), ('values', values)):
+            with open(os.path.join(path, '%s.%d.npy' % (name, version)), 'wb') as f:
+                np.save(f, array)
+        with open(os.path.join(path, 'meta.json.tmp'), 'w', encoding='utf-8') as f:
+            json.dump(dict(version=version, columns=columns, ranges=[list(r) for r in ranges]), f)
+        os.replace(os.path.join(path, 'meta.json.tmp'), os.path.join(path, 'meta.json'))
+        self._versions[key] = version
+        self._loaded[key] = (times, values, columns, ranges)
+        self._remove_old_versions(path, version)
+
+    @staticmethod
+    def _remove_old_versions(path, version):
+        """删除旧版本的数据文件, 仍被映射的文件(Windows)删除失败时留到下次保存再删"""
+        current = {'times.%d.npy' % version, 'values.%d.npy' % version}
+        for name in os.listdir(path):
+            if name.endswith('.npy') and name.startswith(('times.', 'values.')) and name not in current:
+                try:
+                    os.remove(os.path.join(path, name))
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _covering(ranges, end):
+        for start, stop in ranges:
+            if start <= end <= stop:
+                return start, stop
+        return None
+
+    @staticmethod
+    def _merge_ranges(ranges):
+        merged = []
+        for start, stop in sorted(ranges):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+            else:
+                merged.append((start, stop))
+        return merged
+
+    def _available(self, loaded, end, count, covered):
+        """已缓存的数据能否回答查询(covered 在已覆盖区间内), 能则返回 (起, 止) 位置"""
+        if loaded is None:
+            return None
+        times, _, _, ranges = loaded
+        covering = self._covering(ranges, covered)
+        if covering is None:
+            return None
+        stop = int(np.searchsorted(times, end, side='right'))
+        first = 0 if covering[0] == BEGIN else int(np.searchsorted(times, covering[0], side='left'))
+        if stop - first < count and covering[0] != BEGIN:
+            return None
+        return max(first, stop - count), stop
+
+    def _merge(self, symbol, unit, loaded, df, end, reached_begin):
+        """
+        把请求到的K线合并进缓存, 覆盖区间为 [第一根K线, end]
+        :param reached_begin: 是否已经取到了最早的K线
+        """
+        df = df.sort_index()
+        new_times = pd.DatetimeIndex(df.index).to_numpy(dtype='datetime64[ns]')
+        new_range = (BEGIN if reached_begin else int(new_times[0].view(np.int64)), end)
+        if loaded is None:
+            columns = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+            times, values, ranges = new_times, df[columns].to_numpy(dtype=np.float64), []
+        else:
+            times, values, columns, ranges = loaded
+            # 新数据覆盖时间相同的旧数据(例如当时还没走完的K线)
+            keep = ~np.isin(times, new_times)
+            times = np.concatenate([np.asarray(times)[keep], new_times])
+            new_values = df.reindex(columns=columns).to_numpy(dtype=np.float64)
+            values = np.concatenate([np.asarray(values)[keep], new_values])
+            order = np.argsort(times, kind='stable')
+            times, values = times[order], values[order]
+        ranges = self._merge_ranges(list(ranges) + [new_range])
+        self._save(symbol, unit, times, values, columns, ranges)
+        return self._loaded[(symbol, unit)]
+
+    @staticmethod
+    def _rebased(loaded, df):
+        """
+        新请求的K线与缓存中时间相同的已走完K线(缓存的最后一根可能当时还没走完, 不比较)数值不同,
+        说明复权基准变了, 缓存不能与新数据合并
+        """
+        if loaded is None or not len(df):
+            return False
+        times, values, columns, _ = loaded
+        new_times = pd.DatetimeIndex(df.index).to_numpy(dtype='datetime64[ns]')
+        settled = np.asarray(times)[:-1]
+        overlap = np.isin(settled, new_times)
+        if not overlap.any():
+            return False
+        old_values = np.asarray(values)[:-1][overlap]
+        new_values = df.set_axis(new_times, axis=0).reindex(index=settled[overlap], columns=columns)
+        return not np.allclose(old_values, new_values.to_numpy(dtype=np.float64), equal_nan=True)
+
+    @staticmethod
+    def _bounds(end):
+        end_ns = int(np.datetime64(end, 'ns').view(np.int64))
+        # 未来的K线还没有产生, 覆盖区间最多记到当前时间
+        return end_ns, min(end_ns, int(np.datetime64(datetime.datetime.now(), 'ns').view(np.int64)))
+
+    def has(self, symbol, unit, end, count) -> bool:
+        """本地缓存能否直接回答 get(symbol, unit, end, count), 不需要请求行情源"""
+        end_ns, covered = self._bounds(end)
+        with self._key_lock((symbol, unit)):
+            return self._available(self._load(symbol, unit), end_ns, count, covered) is not None
+
+    def get(self, symbol, unit, end, count, fetch) -> DataFrame:
+        """
+        获取截止到 end 的最近 count 根K线
+        :param symbol: 股票代码
+        :param unit: 周期
+        :param end: datetime.datetime, 截止时间(含)
+        :param count: K线数量
+        :param fetch: fetch(end, count) -> DataFrame, 向行情源请求截止到 end 的最近 count 根K线, 索引为时间
+        :return: DataFrame, 索引为时间
+        """
+        end_ns, covered = self._bounds(end)
+        with self._key_lock((symbol, unit)):
+            loaded = self._load(symbol, unit)
+            found = self._available(loaded, end_ns, count, covered)
+            if found is None and loaded is not None:
+                # 只请求最近一个已覆盖区间之后缺少的部分
+                stops = [stop for _, stop in loaded[3] if stop < covered]
+                if stops:
+                    last = pd.Timestamp(max(stops)).to_pydatetime()
+                    # 多取两根K线, 与缓存至少重叠一根已走完的K线, 用来检查复权基准
+                    missing = calendar.count(last.date(), end.date()) * bars_per_day(unit) + 2
+                    if missing < count:
+                        df = fetch(end, missing)
+                        if self._rebased(loaded, df):
+                            loaded = None
+                        elif len(df):
+                            loaded = self._merge(symbol, unit, loaded, df, covered, False)
+                            found = self._available(loaded, end_ns, count, covered)
+            if found is None:
+                df = fetch(end, count)
+                if not len(df):
+                    return df
+                if self._rebased(loaded, df):
+                    loaded = None
+                # 不足 count 根说明已经取到了最早的K线
+                loaded = self._merge(symbol, unit, loaded, df, covered, len(df) < count)
+                found = self._available(loaded, end_ns, count, covered)
+                if found is None:
+                    stop = int(np.searchsorted(loaded[0], end_ns, side='right'))
+                    found = max(stop - count, 0), stop
+        times, values, columns, _ = loaded
+        start, stop = found
+        return DataFrame(np.asarray(values[start:stop]), columns=columns,
+                         index=pd.DatetimeIndex(np.asarray(times[start:stop])))
+
+
+def end_of_day(dt):
+    """dt 当天的最后时刻, 按天请求的行情源用它作为截止时间"""
+    if isinstance(dt, str):
+        dt = datetime.datetime.strptime(dt, '%Y-%m-%d')
+    if not isinstance(dt, datetime.datetime):
+        dt = datetime.datetime.combine(dt, datetime.time(0))
+    return datetime.datetime.combine(dt.date(), datetime.time(23, 59, 59))
@@ -2,6 +2,7 @@
 import datetime
 from typing import List
 
+from easyquant.easydealutils.trade_calendar import TradeCalendar
 from easyquant.quotation import Quotation
 from easytrader.webtrader import WebTrader
 from easytrader.model import *
@@ -20,10 +21,11 @@ class Context:
         self.user = user
         self.quotation = quotation
         self.trade_days = self.quotation.get_all_trade_days()
+        self.calendar = TradeCalendar(self.trade_days)
         self.is_trade_mode = trade_mode
 
     def is_trade_date(self, date: str):
-        return date in self.trade_days
+        return self.calendar.is_trade_day(date)
 
     def change_dt(self, current_dt:datetime.datetime):
         self.current_dt = current_dt
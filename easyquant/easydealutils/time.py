@@ -5,17 +5,19 @@ from functools import lru_cache
 
 import requests
 
+from .trade_calendar import TradeCalendar
 
 f = open("trade_days.json", mode='r', encoding='utf-8')
 days = list(json.loads(f.read()).values())
 f.close()
+calendar = TradeCalendar(days)
 
 def get_all_trade_days():
     return days
 
 def _is_trade_day(now_time):
-    today = now_time.strftime('%Y%m%d')
-    return today in days
+    # 超出交易日历范围时按工作日判断
+    return calendar.is_trade_day(now_time)
 
 
 def is_weekend(now_time):
@@ -33,19 +35,7 @@ def get_next_trade_date(now_time):
     >>> get_next_trade_date(datetime.date(2016, 5, 5))
     datetime.date(2016, 5, 6)
     """
-    now = now_time
-    max_days = 365
-    days = 0
-    while 1:
-        days += 1
-        now += datetime.timedelta(days=1)
-        if is_trade_date(now):
-            if isinstance(now, datetime.date):
-                return now
-            else:
-                return now.date()
-        if days > max_days:
-            raise ValueError('无法确定 %s 下一个交易日' % now_time)
+    return calendar.next(now_time)
 
 
 OPEN_TIME = (
@@ -100,6 +90,54 @@ CLOSE_TIME = (
     datetime.time(15, 0, 0),
 )
 
+# 连续竞价时段, K线按时段对齐
+BAR_SESSIONS = (
+    (datetime.time(9, 30, 0), datetime.time(11, 30, 0)),
+    (datetime.time(13, 0, 0), datetime.time(15, 0, 0)),
+)
+
+
+@lru_cache()
+def get_bar_close_times(minutes=None):
+    """
+    一个交易日内所有K线的收盘时间
+    :param minutes: K线周期(分钟), 为 None 时为日线, 只在 15:00 收盘
+    :return: tuple of datetime.time
+    >>> get_bar_close_times(60)
+    (datetime.time(10, 30), datetime.time(11, 30), datetime.time(14, 0), datetime.time(15, 0))
+    """
+    if not minutes:
+        return CLOSE_TIME
+    closes = []
+    for begin, end in BAR_SESSIONS:
+        close = datetime.datetime.combine(datetime.date.today(), begin)
+        session_end = datetime.datetime.combine(datetime.date.today(), end)
+        while close < session_end:
+            close = min(close + datetime.timedelta(minutes=minutes), session_end)
+            closes.append(close.time())
+    return tuple(closes)
+
+
+def get_next_bar_close(now_time, minutes=None):
+    """
+    now_time 之后(不含)最近一根K线的收盘时间, 跳过午休和非交易日
+    :param now_time: datetime.datetime
+    :param minutes: K线周期(分钟), 为 None 时为日线
+    :return: datetime.datetime
+    >>> get_next_bar_close(datetime.datetime(2016, 5, 5, 11, 30), 5)
+    datetime.datetime(2016, 5, 5, 13, 5)
+    >>> get_next_bar_close(datetime.datetime(2016, 5, 5, 15, 0, 1), 5)
+    datetime.datetime(2016, 5, 6, 9, 35)
+    """
+    day = now_time.date()
+    if is_trade_date(day):
+        for close in get_bar_close_times(minutes):
+            close_dt = datetime.datetime.combine(day, close)
+            if close_dt > now_time:
+                return close_dt
+    day = get_next_trade_date(day)
+    return datetime.datetime.combine(day, get_bar_close_times(minutes)[0])
+
 
 def is_closing(now_time, start=datetime.time(14, 54, 30)):
     now = now_time.time()
@@ -0,0 +1,127 @@
+import datetime
+
+import numpy as np
+
+
+class TradeCalendar:
+    """
+    交易日历: 交易日保存为升序的 datetime64[D] 数组和集合,
+    判断交易日为集合查找, 前后交易日 / 偏移为二分查找, 区间和批量判断为数组运算.
+    超出日历最后一天的日期按工作日计算
+
+    >>> calendar = TradeCalendar(['2016-05-04', '2016-05-05', '2016-05-06', '2016-05-09'])
+    >>> calendar.is_trade_day('2016-05-07')
+    False
+    >>> calendar.next(datetime.date(2016, 5, 6))
+    datetime.date(2016, 5, 9)
+    >>> calendar.prev('2016-05-07')
+    datetime.date(2016, 5, 6)
+    >>> calendar.offset('2016-05-04', 3)
+    datetime.date(2016, 5, 9)
+    >>> calendar.next('2016-05-09')
+    datetime.date(2016, 5, 10)
+    >>> calendar.range('2016-05-05', '2016-05-10').astype(str).tolist()
+    ['2016-05-05', '2016-05-06', '2016-05-09', '2016-05-10']
+    >>> calendar.is_trade_days(['2016-05-05', '2016-05-08', '2016-05-11']).tolist()
+    [True, False, True]
+    """
+
+    def __init__(self, days):
+        """
+        :param days: 交易日列表, 'YYYY-MM-DD' 字符串 / datetime.date / datetime64
+        """
+        self.days = np.unique(self.to_days(days))
+        if not len(self.days):
+            raise ValueError('交易日历为空')
+        self._ordinals = set(self.days.astype(np.int64).tolist())
+        self.start = self.days[0]
+        self.end = self.days[-1]
+
+    @staticmethod
+    def to_day(value) -> np.datetime64:
+        """单个日期转为 datetime64[D], 支持 'YYYY-MM-DD' / 'YYYYMMDD' 字符串和各种日期类型"""
+        if isinstance(value, str) and len(value) == 8 and value.isdigit():
+            value = '%s-%s-%s' % (value[:4], value[4:6], value[6:])
+        elif isinstance(value, datetime.datetime):
+            value = value.date()
+        return np.datetime64(value, 'D')
+
+    @classmethod
+    def to_days(cls, values) -> np.ndarray:
+        """批量转为 datetime64[D] 数组"""
+        values = np.asarray(values)
+        if values.dtype.kind == 'M':
+            return values.astype('datetime64[D]')
+        return np.array([cls.to_day(value) for value in values.ravel()], dtype='datetime64[D]').reshape(values.shape)
+
+    @staticmethod
+    def _to_date(day) -> datetime.date:
+        return day.astype(datetime.date)
+
+    def is_trade_day(self, day) -> bool:
+        day = self.to_day(day)
+        if day > self.end:
+            return bool(np.is_busday(day))
+        return int(day.astype(np.int64)) in self._ordinals
+
+    def is_trade_days(self, days) -> np.ndarray:
+        """批量判断, 返回 bool 数组"""
+        days = self.to_days(days)
+        pos = np.minimum(np.searchsorted(self.days, days), len(self.days) - 1)
+        result = self.days[pos] == days
+        beyond = days > self.end
+        result[beyond] = np.is_busday(days[beyond])
+        return result
+
+    def _at(self, index):
+        """第 index 个交易日, 超出日历末尾时按工作日顺延"""
+        if index < 0:
+            raise ValueError('超出交易日历范围: 早于 %s' % self.start)
+        if index < len(self.days):
+            return self.days[index]
+        return np.busday_offset(self.end, index - len(self.days) + 1, roll='forward')
+
+    def next(self, day, n=1) -> datetime.date:
+        """day 之后的第 n 个交易日"""
+        day = self.to_day(day)
+        if day > self.end:
+            return self._to_date(np.busday_offset(day, n, roll='backward'))
+        return self._to_date(self._at(int(np.searchsorted(self.days, day, side='right')) + n - 1))
+
+    def prev(self, day, n=1) -> datetime.date:
+        """day 之前的第 n 个交易日"""
+        day = self.to_day(day)
+        if day > self.end:
+            result = np.busday_offset(day, -n, roll='forward')
+            if result > self.end:
+                return self._to_date(result)
+            # 回到日历范围内, 按日历计算剩余的步数
+            n -= int(np.busday_count(self.end + 1, day))
+            day = self.end + 1
+        return self._to_date(self._at(int(np.searchsorted(self.days, day, side='left')) - n))
+
+    def offset(self, day, n) -> datetime.date:
+        """
+        交易日偏移: n > 0 为之后第 n 个交易日, n < 0 为之前第 -n 个交易日,
+        n == 0 时 day 是交易日则返回 day, 否则返回下一个交易日
+        """
+        if n > 0:
+            return self.next(day, n)
+        if n < 0:
+            return self.prev(day, -n)
+        if self.is_trade_day(day):
+            return self._to_date(self.to_day(day))
+        return self.next(day)
+
+    def range(self, start, end) -> np.ndarray:
+        """[start, end] 内的交易日, datetime64[D] 数组"""
+        start, end = self.to_day(start), self.to_day(end)
+        days = self.days[np.searchsorted(self.days, start):np.searchsorted(self.days, end, side='right')]
+        if end > self.end:
+            beyond = np.arange(max(start, self.end + 1), end + 1, dtype='datetime64[D]')
+            days = np.concatenate([days, beyond[np.is_busday(beyond)]])
+        return days
+
+    def count(self, start, end) -> int:
+        """[start, end] 内的交易日数量"""
+        return len(self.range(start, end))
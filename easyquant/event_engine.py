@@ -1,25 +1,79 @@
-from collections import defaultdict
+import asyncio
+from collections import defaultdict, Counter
 from datetime import datetime
 from queue import Queue, Empty
-from threading import Thread
+from threading import Thread, Condition
+import time
+import traceback
+
+from .metrics import metrics, handler_name
 
 
 class Event:
     """事件对象"""
 
-    def __init__(self, event_type, data=None):
+    def __init__(self, event_type, data=None, bar_close=None):
+        """
+        :param bar_close: 行情事件对应的K线收盘时间戳, 用于统计K线收盘到策略处理完成的延迟
+        """
         self.event_type = event_type
         self.data = data
+        self.bar_close = bar_close
+        # 放入事件引擎的时间戳, 用于统计排队时间
+        self.created = time.time()
+
+
+class QueuePolicy:
+    """单个事件类型的排队策略"""
+
+    def __init__(self, maxsize=0, coalesce=False, block=True):
+        """
+        :param maxsize: 该类型最多积压的未处理事件数, 0 为不限制
+        :param coalesce: 是否合并未处理的事件, 为 True 时只保留最新一个事件的数据(latest-wins)
+        :param block: 积压达到 maxsize 时, True 阻塞生产者直到有空位(保证送达), False 丢弃新事件
+        """
+        self.maxsize = maxsize
+        self.coalesce = coalesce
+        self.block = block
 
 
 class EventEngine:
     """事件驱动引擎"""
 
-    def __init__(self):
-        """初始化事件引擎"""
+    def __init__(self, pool_size=None, lanes=None, policies=None):
+        """初始化事件引擎
+        :param pool_size: 处理线程池大小, 为 None 时每个事件启动一个新线程处理(旧模式)
+        :param lanes: dict, 事件类型 -> 工作线程编号, 同一个工作线程上的事件严格按顺序处理;
+            未配置的事件类型按首次出现的顺序轮流分配工作线程
+        :param policies: dict, 事件类型 -> QueuePolicy, 未配置的事件类型不限制积压且保证送达;
+            pool_size 为 None 时事件分发后立即开始处理, 不会积压, 合并 / 积压限制实际不起作用
+        """
         # 事件队列
         self.__queue = Queue()
 
+        # 排队策略
+        self.__policies = dict(policies or {})
+        self.__policy_cond = Condition()
+        # 每个事件类型已放入但尚未开始处理的事件数
+        self.__pending = Counter()
+        # 合并模式下, 每个事件类型尚未开始处理的那个事件
+        self.__coalescing = {}
+        # 丢弃 / 合并的事件计数
+        self.dropped = Counter()
+        self.merged = Counter()
+
+        # 工作线程池, 每个工作线程有自己的队列, 保证同一事件类型按顺序处理
+        self.__pool_size = pool_size
+        self.__lanes = dict(lanes or {})
+        for event_type, lane in self.__lanes.items():
+            if not pool_size or not isinstance(lane, int) or not 0 <= lane < pool_size:
+                raise ValueError('事件类型 %s 的工作线程编号 %r 超出线程池范围 [0, %s)' % (event_type, lane, pool_size or 0))
+        self.__worker_queues = [Queue() for _ in range(pool_size or 0)]
+        self.__workers = [
+            Thread(target=self.__work, name="EventEngine.__worker_%d" % i, args=(q,))
+            for i, q in enumerate(self.__worker_queues)
+        ]
+
         # 事件引擎开关
         self.__active = False
 
@@ -34,28 +88,66 @@ class EventEngine:
         while self.__active:
             try:
                 event = self.__queue.get(block=True, timeout=1)
-                handle_thread = Thread(target=self.__process, name="EventEngine.__process", args=(event,))
-                handle_thread.start()
             except Empty:
-                pass
+                continue
+            try:
+                if self.__workers:
+                    self.__worker_queues[self.__lane(event.event_type)].put(event)
+                else:
+                    handle_thread = Thread(target=self.__process, name="EventEngine.__process", args=(event,))
+                    handle_thread.start()
+            except Exception:
+                # 分发异常不能终止引擎线程, 该事件不再处理
+                traceback.print_exc()
+                self.__release(event)
+
+    def __lane(self, event_type):
+        """事件类型对应的工作线程编号"""
+        lane = self.__lanes.get(event_type)
+        if lane is None:
+            lane = len(self.__lanes) % self.__pool_size
+            self.__lanes[event_type] = lane
+        return lane
+
+    def __work(self, worker_queue):
+        """工作线程, 顺序处理分配到本线程的事件"""
+        while self.__active:
+            try:
+                event = worker_queue.get(block=True, timeout=1)
+            except Empty:
+                continue
+            try:
+                self.__process(event)
+            except Exception:
+                # 处理函数异常不能终止常驻的工作线程
+                traceback.print_exc()
 
     def __process(self, event):
         """事件处理"""
+        self.__release(event)
+        metrics.observe('event_queue_wait', time.time() - event.created, event_type=event.event_type)
         # 检查该事件是否有对应的处理函数
         if event.event_type in self.__handlers:
             # 若存在,则按顺序将时间传递给处理函数执行
             for handler in self.__handlers[event.event_type]:
+                started = time.time()
                 handler(event)
+                metrics.observe('event_handler', time.time() - started,
+                                event_type=event.event_type, handler=handler_name(handler))
 
     def start(self):
         """引擎启动"""
         self.__active = True
+        for worker in self.__workers:
+            worker.start()
         self.__thread.start()
 
     def stop(self):
         """停止引擎"""
         self.__active = False
         self.__thread.join()
+        for worker in self.__workers:
+            worker.join()
 
     def register(self, event_type, handler):
         """注册事件处理函数监听"""
@@ -76,8 +168,178 @@ class EventEngine:
     def put(self, event):
         """放入事件"""
         print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 事件引擎：添加新事件: {event.event_type}")  # 添加日志
-        self.__queue.put(event)
+        if self.__admit(event):
+            self.__queue.put(event)
+
+    def __admit(self, event):
+        """
+        按排队策略决定事件是否需要入队
+        :return: False 表示事件已被合并到未处理的事件中或被丢弃
+        """
+        policy = self.__policies.get(event.event_type)
+        with self.__policy_cond:
+            if policy is not None and policy.coalesce:
+                pending_event = self.__coalescing.get(event.event_type)
+                if pending_event is not None:
+                    # 未处理的事件直接换成最新的数据, 延迟统计也从最新一次推送算起
+                    pending_event.data = event.data
+                    pending_event.bar_close = event.bar_close
+                    pending_event.created = event.created
+                    self.merged[event.event_type] += 1
+                    return False
+            if policy is not None and policy.maxsize:
+                while self.__pending[event.event_type] >= policy.maxsize:
+                    if not policy.block:
+                        self.dropped[event.event_type] += 1
+                        return False
+                    self.__policy_cond.wait(timeout=1)
+            self.__pending[event.event_type] += 1
+            if policy is not None and policy.coalesce:
+                self.__coalescing[event.event_type] = event
+        return True
+
+    def __release(self, event):
+        """事件开始处理, 之后到达的同类型事件不再合并到该事件中"""
+        with self.__policy_cond:
+            self.__pending[event.event_type] -= 1
+            if self.__coalescing.get(event.event_type) is event:
+                self.__coalescing.pop(event.event_type)
+            self.__policy_cond.notify_all()
+
+    @property
+    def stats(self):
+        """
+        各事件类型的排队统计
+        :return: dict, 事件类型 -> {'pending': 积压数, 'dropped': 丢弃数, 'merged': 合并数}
+        """
+        with self.__policy_cond:
+            event_types = set(self.__pending) | set(self.dropped) | set(self.merged)
+            return {
+                event_type: dict(pending=self.__pending[event_type],
+                                 dropped=self.dropped[event_type],
+                                 merged=self.merged[event_type])
+                for event_type in event_types
+            }
 
     @property
     def queue_size(self):
         return self.__queue.qsize()
+
+
+class AsyncEventEngine:
+    """基于 asyncio 的事件驱动引擎, 事件分发与协程处理函数都运行在同一个事件循环上"""
+
+    def __init__(self):
+        """初始化事件引擎"""
+        # 事件循环, 在事件引擎线程中运行
+        self.loop = asyncio.new_event_loop()
+
+        # 事件队列, 在事件循环线程中创建
+        self.__queue = None
+
+        # 每个事件类型一个队列和处理协程, 保证同一事件类型按顺序处理
+        self.__type_queues = {}
+
+        # 事件引擎开关
+        self.__active = False
+
+        # 事件引擎线程
+        self.__thread = Thread(target=self.__run, name="AsyncEventEngine.__thread")
+
+        # 事件字典，key 为时间， value 为对应监听事件函数的列表
+        self.__handlers = defaultdict(list)
+
+    def __run(self):
+        """启动事件循环"""
+        asyncio.set_event_loop(self.loop)
+        self.__queue = asyncio.Queue()
+        try:
+            self.loop.run_until_complete(self.__dispatch())
+        finally:
+            self.loop.close()
+
+    async def __dispatch(self):
+        """按事件类型分发事件"""
+        while self.__active:
+            try:
+                event = await asyncio.wait_for(self.__queue.get(), timeout=1)
+            except asyncio.TimeoutError:
+                continue
+            type_queue = self.__type_queues.get(event.event_type)
+            if type_queue is None:
+                type_queue = asyncio.Queue()
+                self.__type_queues[event.event_type] = type_queue
+                self.loop.create_task(self.__consume(type_queue))
+            type_queue.put_nowait(event)
+
+        # 引擎停止, 取消事件循环上的其余协程(处理协程, 行情 / 时钟引擎)
+        tasks = [task for task in asyncio.all_tasks(self.loop) if task is not asyncio.current_task(self.loop)]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def __consume(self, type_queue):
+        """顺序处理同一类型的事件, 同一事件的多个处理函数并发执行"""
+        while True:
+            event = await type_queue.get()
+            metrics.observe('event_queue_wait', time.time() - event.created, event_type=event.event_type)
+            handlers = list(self.__handlers.get(event.event_type, []))
+            results = await asyncio.gather(*(self.__call(handler, event) for handler in handlers),
+                                           return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    traceback.print_exception(type(result), result, result.__traceback__)
+
+    async def __call(self, handler, event):
+        """协程处理函数直接等待, 普通处理函数放到线程池中执行, 避免阻塞事件循环"""
+        started = time.time()
+        if asyncio.iscoroutinefunction(handler):
+            await handler(event)
+        else:
+            await self.loop.run_in_executor(None, handler, event)
+        metrics.observe('event_handler', time.time() - started,
+                        event_type=event.event_type, handler=handler_name(handler))
+
+    def __enqueue(self, event):
+        self.__queue.put_nowait(event)
+
+    def start(self):
+        """引擎启动"""
+        self.__active = True
+        self.__thread.start()
+
+    def stop(self):
+        """停止引擎"""
+        self.__active = False
+        self.__thread.join()
+
+    def submit(self, coro):
+        """
+        在事件循环上运行协程, 可以在任意线程调用
+        :return: concurrent.futures.Future
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def register(self, event_type, handler):
+        """注册事件处理函数监听, 处理函数可以是普通函数或协程函数"""
+        if handler not in self.__handlers[event_type]:
+            self.__handlers[event_type].append(handler)
+
+    def unregister(self, event_type, handler):
+        """注销事件处理函数"""
+        handler_list = self.__handlers.get(event_type)
+        if handler_list is None:
+            return
+        if handler in handler_list:
+            handler_list.remove(handler)
+        if len(handler_list) == 0:
+            self.__handlers.pop(event_type)
+
+    def put(self, event):
+        """放入事件, 可以在任意线程调用"""
+        print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 事件引擎：添加新事件: {event.event_type}")  # 添加日志
+        self.loop.call_soon_threadsafe(self.__enqueue, event)
+
+    @property
+    def queue_size(self):
+        return self.__queue.qsize() if self.__queue is not None else 0
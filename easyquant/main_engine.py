@@ -13,11 +13,12 @@ import easytrader
 from logbook import Logger, StreamHandler
 
 from .context import Context
-from .event_engine import EventEngine, Event
+from .event_engine import EventEngine, Event, QueuePolicy, AsyncEventEngine
 from .log_handler.default_handler import DefaultLogHandler
-from .push_engine.clock_engine import ClockEngine
-from .push_engine.quotation_engine import QuotationEngine
-from .quotation import use_quotation
+from .metrics import metrics, METRICS_FILE
+from .push_engine.clock_engine import ClockEngine, AsyncClockEngine
+from .push_engine.quotation_engine import QuotationEngine, AsyncQuotationEngine
+from .quotation import use_quotation, ResampleQuotation, SnapshotQuotation
 from .strategy.strategyTemplate import StrategyTemplate
 
 log = Logger(os.path.basename(__file__))
@@ -36,13 +37,30 @@ class MainEngine:
     def __init__(self, broker=None, need_data=None,
                  bar_type="5m",
                  quotation='default',
-                 log_handler=DefaultLogHandler(), tzinfo=None):
+                 log_handler=DefaultLogHandler(), tzinfo=None,
+                 event_pool_size=None, event_lanes=None, event_policies=None,
+                 async_mode=False, resample=False, snapshot=None,
+                 metrics_file=METRICS_FILE, metrics_interval=10):
         """初始化事件 / 行情 引擎并启动事件引擎
+        :param event_pool_size: 事件处理线程池大小, 默认 None 为每个事件一个线程(原有方式);
+            设置后各事件类型固定在一个处理线程上按顺序处理, 不同事件类型的处理函数会并发执行
+        :param event_lanes: dict, 事件类型 -> 处理线程编号, 同一线程上的事件按顺序处理
+        :param event_policies: dict, 事件类型 -> QueuePolicy, 只在设置了 event_pool_size 时起作用
+            (每个事件一个线程时事件立即开始处理, 不会积压); 默认在线程池模式下行情事件只处理最新一次推送, 时钟事件保证送达
+        :param async_mode: 是否使用 asyncio 事件循环运行事件 / 行情 / 时钟引擎, 支持 async def on_bar 策略
+        :param resample: 是否只获取1分钟K线, 其他周期的K线在本地合成, 行情引擎与各策略共用一份下载
+        :param snapshot: 快照行情源(sina / tencent), 设置后当天的K线由全市场快照合成, 不再逐只股票请求
+        :param metrics_file: 延迟统计的输出文件, 供 web_server.py 读取, 为 None 时不输出
+        :param metrics_interval: 延迟统计的输出间隔(秒)
         """
         self.log = log_handler
         self.bar_type = bar_type
         self.broker = broker
         self.quotation = use_quotation(quotation)
+        if snapshot is not None:
+            self.quotation = SnapshotQuotation(self.quotation, snapshot_source=snapshot)
+        if resample:
+            self.quotation = ResampleQuotation(self.quotation)
 
         # 登录账户
         if (broker is not None) and (need_data is not None):
@@ -58,10 +76,19 @@ class MainEngine:
 
         self.context = Context(self.user, self.quotation)
 
-        self.event_engine = EventEngine()
-        self.clock_engine = ClockEngine(self.event_engine, self.context, tzinfo)
+        self.async_mode = async_mode
+        if async_mode:
+            self.event_engine = AsyncEventEngine()
+            self.clock_engine = AsyncClockEngine(self.event_engine, self.context, tzinfo)
 
-        self.quotation_engine = QuotationEngine(self.quotation, self.event_engine, bar_type=bar_type)
+            self.quotation_engine = AsyncQuotationEngine(self.quotation, self.event_engine, bar_type=bar_type)
+        else:
+            if event_policies is None and event_pool_size:
+                event_policies = {QuotationEngine.EventType: QueuePolicy(coalesce=True)}
+            self.event_engine = EventEngine(pool_size=event_pool_size, lanes=event_lanes, policies=event_policies)
+            self.clock_engine = ClockEngine(self.event_engine, self.context, tzinfo)
+
+            self.quotation_engine = QuotationEngine(self.quotation, self.event_engine, bar_type=bar_type)
 
         # 保存读取的策略类
         self.strategies = OrderedDict()
@@ -81,6 +108,11 @@ class MainEngine:
         # 加载线程
         self._watch_thread = Thread(target=self._load_strategy, name="MainEngine.watch_reload_strategy")
 
+        # 延迟统计输出线程
+        self.metrics_file = metrics_file
+        self.metrics_interval = metrics_interval
+        self._metrics_thread = Thread(target=self._dump_metrics, name="MainEngine.dump_metrics", daemon=True)
+
         # shutdown 函数
         self.before_shutdown = []  # 关闭引擎前的 shutdown
         self.main_shutdown = []  # 引擎自身要执行的 shutdown
@@ -109,6 +141,17 @@ class MainEngine:
         self.clock_engine.start() # 启动时钟引擎
         self._add_main_shutdown(self.clock_engine.stop) # 添加时钟引擎的shutdown
 
+        if self.metrics_file:
+            self._metrics_thread.start() # 定期输出延迟统计
+
+    def _dump_metrics(self):
+        while True:
+            time.sleep(self.metrics_interval)
+            try:
+                metrics.dump(self.metrics_file)
+            except Exception as e:
+                self.log.warn('输出延迟统计失败: %s' % e)
+
     def load(self, names, strategy_file):
         with self.lock:
             mtime = os.path.getmtime(os.path.join('strategies', strategy_file))
@@ -165,11 +208,15 @@ class MainEngine:
         }.get(_type)
 
         # 行情引擎的事件
-        func(self.quotation_engine.EventType, strategy.run)
+        func(self.quotation_engine.EventType, strategy.run_async if self.async_mode else strategy.run)
 
         # 时钟事件
         func(ClockEngine.EventType, strategy.clock)
 
+        if _type == "unlisten":
+            # 释放策略监听的股票
+            self.quotation_engine.set_watchlist(strategy, [])
+
     def load_strategy(self, names=None):
         """动态加载策略
         :param names: 策略名列表，元素为策略的 name 属性"""
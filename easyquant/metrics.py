@@ -0,0 +1,123 @@
+# coding: utf-8
+"""
+运行时延迟统计
+
+各引擎把耗时(秒)记录到内存中的直方图, 通过 snapshot() 拉取统计结果;
+主引擎定期把统计结果写入文件, web_server.py 读取该文件对外提供
+"""
+import bisect
+import json
+import os
+import threading
+
+# 直方图桶上界(秒): 0.1ms 起每档翻倍, 最后一档约 420s
+BUCKETS = tuple(0.0001 * 2 ** i for i in range(23))
+
+METRICS_FILE = 'metrics.json'
+
+
+class Histogram:
+    """固定对数分桶的直方图, 记录一次耗时只需一次二分查找和几次加法"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(BUCKETS, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, q):
+        """按桶上界估算分位数"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(BUCKETS[index], self.max) if index < len(BUCKETS) else self.max
+        return self.max
+
+    def snapshot(self):
+        with self._lock:
+            return dict(count=self.count,
+                        mean=self.sum / self.count if self.count else 0.0,
+                        p50=self.percentile(0.5),
+                        p90=self.percentile(0.9),
+                        p99=self.percentile(0.99),
+                        max=self.max)
+
+
+class MetricsRegistry:
+    """按 指标名 + 标签 管理直方图"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, **labels) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def observe(self, name, value, **labels):
+        """记录一次耗时(秒)"""
+        self.histogram(name, **labels).observe(value)
+
+    def snapshot(self):
+        """
+        拉取所有统计结果
+        :return: dict, 指标名 -> [{'labels': {...}, 'count', 'mean', 'p50', 'p90', 'p99', 'max'}]
+        """
+        with self._lock:
+            items = list(self._histograms.items())
+        result = {}
+        for (name, labels), histogram in sorted(items, key=lambda item: item[0]):
+            stats = histogram.snapshot()
+            stats['labels'] = dict(labels)
+            result.setdefault(name, []).append(stats)
+        return result
+
+    def dump(self, path=METRICS_FILE):
+        """把统计结果写入文件, 先写临时文件再替换, 读取方不会读到写了一半的文件"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+
+def load(path=METRICS_FILE):
+    """读取 dump 写入的统计结果, 文件不存在时返回空 dict"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def handler_name(handler):
+    """处理函数的名称, 策略的方法使用 策略名.方法名"""
+    owner = getattr(handler, '__self__', None)
+    name = getattr(handler, '__name__', repr(handler))
+    if owner is None:
+        return name
+    return '%s.%s' % (getattr(owner, 'name', type(owner).__name__), name)
+
+
+# 进程内默认的统计对象
+metrics = MetricsRegistry()
@@ -0,0 +1,196 @@
+# coding: utf-8
+import os
+import threading
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from ..bar_buffer import BarBuffer
+
+# 共享内存头部: [最新序号, 槽0 K线数, 槽1 K线数, 槽0 序号, 槽1 序号], 槽序号为 -1 表示正在写入
+HEADER_SIZE = 5
+
+
+class StaleBarsError(LookupError):
+    """要读取的序号已被之后的写入覆盖(读取端落后写入端两次以上)"""
+
+
+class SharedBars:
+    """事件中传递的K线引用, 只包含每个股票更新到的序号, 数据在共享内存中"""
+
+    def __init__(self, seqs):
+        """
+        :param seqs: dict, 股票代码 -> 序号
+        """
+        self.seqs = seqs
+
+
+class _Segment:
+    """
+    单个股票的共享内存块, 固定布局:
+    头部 int64[5] + 时间 int64[2, capacity] + OHLCV float64[2, capacity, 5]
+    两个槽交替写入(双缓冲), 序号 seq 的数据在槽 seq % 2 中, 在写入 seq + 2 之前一直有效
+    """
+
+    def __init__(self, shm, capacity):
+        self.shm = shm
+        width = len(BarBuffer.FIELDS)
+        header_bytes = HEADER_SIZE * 8
+        times_bytes = 2 * capacity * 8
+        self.header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=shm.buf)
+        self.times = np.ndarray((2, capacity), dtype=np.int64, buffer=shm.buf, offset=header_bytes)
+        self.values = np.ndarray((2, capacity, width), dtype=np.float64, buffer=shm.buf,
+                                 offset=header_bytes + times_bytes)
+
+    @staticmethod
+    def size(capacity):
+        return HEADER_SIZE * 8 + 2 * capacity * 8 + 2 * capacity * len(BarBuffer.FIELDS) * 8
+
+    def close(self):
+        # 先释放对共享内存的引用再关闭
+        self.header = self.times = self.values = None
+        self.shm.close()
+
+
+def _is_plain_bars(df):
+    return (isinstance(df, DataFrame) and list(df.columns) == BarBuffer.FIELDS
+            and all(dtype == np.float64 for dtype in df.dtypes)
+            and df.index.dtype == 'datetime64[ns]' and df.index.name is None)
+
+
+class SharedBarStore:
+    """
+    主进程写入端: 把每个股票的K线写入固定布局的共享内存, 事件只需传递 SharedBars 序号
+    同一份行情数据只写入一次, 多个 ProcessWrapper 可以共用一个 SharedBarStore
+    """
+
+    def __init__(self, capacity=200, prefix=None):
+        """
+        :param capacity: 每个股票保留的K线数量
+        :param prefix: 共享内存名称前缀, 读取端按 前缀_股票代码 打开
+        """
+        self.capacity = capacity
+        self.prefix = prefix or 'eq_bars_%d_%d' % (os.getpid(), id(self))
+        self._segments = {}
+        self._lock = threading.Lock()
+        # 最近一次写入的行情数据及其序号
+        self._last_data = None
+        self._last_seqs = None
+
+    def __getstate__(self):
+        # 子进程只需要名称前缀和容量
+        return dict(capacity=self.capacity, prefix=self.prefix, _segments={}, _lock=None,
+                    _last_data=None, _last_seqs=None)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def accepts(self, data):
+        """
+        是否是可以放入共享内存的行情数据: dict, 股票代码 -> DataFrame, 列与 BarBuffer.FIELDS 完全相同(float64),
+        索引为 datetime64[ns], 且不超过 capacity 根. 共享内存只有这些列和 capacity 根K线,
+        其他数据(如带 money 列或更长的K线)仍经队列传递, 保证策略看到的数据不变
+        """
+        return isinstance(data, dict) and all(_is_plain_bars(df) and len(df) <= self.capacity
+                                              for df in data.values())
+
+    def publish(self, data):
+        """
+        写入一次推送的行情数据
+        :param data: dict, 股票代码 -> DataFrame
+        :return: SharedBars
+        """
+        with self._lock:
+            if data is self._last_data:
+                return SharedBars(self._last_seqs)
+            seqs = {}
+            for code, df in data.items():
+                seqs[code] = self._write(code, df)
+            self._last_data, self._last_seqs = data, seqs
+            return SharedBars(seqs)
+
+    def _write(self, code, df):
+        segment = self._segments.get(code)
+        if segment is None:
+            shm = shared_memory.SharedMemory(name='%s_%s' % (self.prefix, code), create=True,
+                                             size=_Segment.size(self.capacity))
+            segment = self._segments[code] = _Segment(shm, self.capacity)
+            segment.header[:] = 0
+        n = len(df)
+        if n > self.capacity:
+            raise ValueError('%s 的K线数量 %d 超过共享内存容量 %d' % (code, n, self.capacity))
+        seq = int(segment.header[0]) + 1
+        slot = seq % 2
+        # 先把槽标记为正在写入, 正在读取该槽的读取端会发现数据已失效
+        segment.header[3 + slot] = -1
+        segment.times[slot, :n] = pd.to_datetime(df.index).values.astype('datetime64[ns]').view(np.int64)
+        segment.values[slot, :n] = df[BarBuffer.FIELDS].to_numpy(dtype='float64')
+        segment.header[1 + slot] = n
+        # 数据写完后再发布序号
+        segment.header[3 + slot] = seq
+        segment.header[0] = seq
+        return seq
+
+    def close(self):
+        """关闭并删除所有共享内存"""
+        with self._lock:
+            for segment in self._segments.values():
+                shm = segment.shm
+                segment.close()
+                shm.unlink()
+            self._segments = {}
+
+
+class SharedBarReader:
+    """子进程读取端, 按需打开共享内存, 返回K线的副本, 之后的写入不会改变已返回的数据"""
+
+    def __init__(self, prefix, capacity):
+        self.prefix = prefix
+        self.capacity = capacity
+        self._segments = {}
+
+    def _segment(self, code):
+        segment = self._segments.get(code)
+        if segment is None:
+            name = '%s_%s' % (self.prefix, code)
+            try:
+                shm = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:
+                # Python 3.13 之前打开共享内存也会被 resource_tracker 记录, 进程退出时会被误删
+                shm = shared_memory.SharedMemory(name=name)
+                resource_tracker.unregister(shm._name, 'shared_memory')
+            segment = self._segments[code] = _Segment(shm, self.capacity)
+        return segment
+
+    def read(self, code, seq) -> DataFrame:
+        """
+        读取股票序号为 seq 的K线
+        :raise StaleBarsError: 序号 seq 的数据已被覆盖
+        """
+        segment = self._segment(code)
+        slot = seq % 2
+        if segment.header[3 + slot] != seq:
+            raise StaleBarsError('%s 的K线序号 %d 已被覆盖, 最新序号 %d' % (code, seq, segment.header[0]))
+        n = int(segment.header[1 + slot])
+        times = segment.times[slot, :n].copy()
+        values = segment.values[slot, :n].copy()
+        # 复制期间该槽被重新写入, 复制的数据可能不完整
+        if segment.header[3 + slot] != seq:
+            raise StaleBarsError('%s 的K线序号 %d 在读取时被覆盖' % (code, seq))
+        return DataFrame(values, index=pd.DatetimeIndex(times.view('datetime64[ns]')),
+                         columns=BarBuffer.FIELDS, copy=False)
+
+    def read_all(self, shared_bars: SharedBars):
+        """
+        :return: dict, 股票代码 -> DataFrame
+        :raise StaleBarsError: 有股票的数据已被覆盖, 该次推送已过期
+        """
+        return {code: self.read(code, seq) for code, seq in shared_bars.seqs.items()}
+
+    def close(self):
+        for segment in self._segments.values():
+            segment.close()
+        self._segments = {}
@@ -1,16 +1,24 @@
 import multiprocessing as mp
 from threading import Thread
 
+from ..event_engine import Event
+from .shared_bars import SharedBarStore, SharedBarReader, SharedBars, StaleBarsError
+
 __author__ = 'keping.chu'
 
 
 class ProcessWrapper(object):
-    def __init__(self, strategy):
+    def __init__(self, strategy, bar_store=None, shared_bars=True):
         """
         @:param
             strategy 策略
+            bar_store 共享内存K线存储, 多个 ProcessWrapper 共用时每次推送只写入一次, 为 None 时自己创建
+            shared_bars 行情事件是否通过共享内存传递, 为 False 时整个事件经队列序列化传递
         """
         self.__strategy = strategy
+        # 共享内存K线存储, 行情事件只传递序号
+        self.__own_bar_store = shared_bars and bar_store is None
+        self.__bar_store = (bar_store or SharedBarStore()) if shared_bars else None
         # 事件队列
         self.__event_queue = mp.Queue(10000)
         # 时钟队列
@@ -26,12 +34,16 @@ class ProcessWrapper(object):
         self.__event_queue.put(0)
         self.__clock_queue.put(0)
         self.__proc.join()
+        if self.__own_bar_store:
+            self.__bar_store.close()
 
     def on_event(self, event):
         """
         推送消息
         """
         # print(event)
+        if self.__bar_store is not None and self.__bar_store.accepts(event.data):
+            event = Event(event.event_type, self.__bar_store.publish(event.data), bar_close=event.bar_close)
         self.__event_queue.put(event)
 
     def on_clock(self, event):
@@ -50,6 +62,14 @@ class ProcessWrapper(object):
                 # 退出
                 if event == 0:
                     break
+                if isinstance(event.data, SharedBars):
+                    try:
+                        data = self.__bar_reader.read_all(event.data)
+                    except StaleBarsError as e:
+                        # 策略处理落后两次以上推送, 跳过已被覆盖的推送, 处理之后更新的推送
+                        print('策略进程：跳过过期的行情推送: %s' % e)
+                        continue
+                    event = Event(event.event_type, data, bar_close=event.bar_close)
                 self.__strategy.run(event)
             except:
                 pass
@@ -73,6 +93,8 @@ class ProcessWrapper(object):
         """
         启动进程
         """
+        if self.__bar_store is not None:
+            self.__bar_reader = SharedBarReader(self.__bar_store.prefix, self.__bar_store.capacity)
         event_thread = Thread(target=self._process_event, name="ProcessWrapper._process_event")
         event_thread.start()
         clock_thread = Thread(target=self._process_clock, name="ProcessWrapper._process_clock")
@@ -1,4 +1,5 @@
 # coding: utf-8
+import asyncio
 import datetime
 from collections import deque
 from threading import Thread
@@ -101,7 +102,7 @@ class ClockMomentHandler:
         """
         if self.is_active():
             if self.is_trading_date:
-                next_date = etime.get_next_trade_date(self.clock_engine.now_dt)
+                next_date = etime.calendar.next(self.clock_engine.now_dt)
             else:
                 next_date = self.next_time.date() + datetime.timedelta(days=1)
 
@@ -111,7 +112,7 @@ class ClockMomentHandler:
             )
 
     def is_active(self):
-        if self.is_trading_date and not etime.is_trade_date(self.clock_engine.now_dt):
+        if self.is_trading_date and not etime.calendar.is_trade_day(self.clock_engine.now_dt):
             # 仅在交易日触发时的判断
             return False
         return self.next_time <= self.clock_engine.now_dt
@@ -137,7 +138,7 @@ class ClockEngine:
         self.is_active = True
         self.clock_engine_thread = Thread(target=self.clock_tick, name="ClockEngine.clocktick")
         self.sleep_time = 1
-        self.trading_state = True if (etime.is_tradetime(datetime.datetime.now()) and etime.is_trade_date(
+        self.trading_state = True if (etime.is_tradetime(datetime.datetime.now()) and etime.calendar.is_trade_day(
             datetime.datetime.now())) else False
         self.clock_moment_handlers = deque()
         self.clock_interval_handlers = set()
@@ -258,3 +259,16 @@ class ClockEngine:
         handler = ClockIntervalHandler(self, interval_minute, trading, call)
         self.clock_interval_handlers.add(handler)
         return handler
+
+
+class AsyncClockEngine(ClockEngine):
+    """运行在 AsyncEventEngine 事件循环上的时间推送引擎"""
+
+    def start(self):
+        self.event_engine.submit(self.clock_tick_async())
+
+    async def clock_tick_async(self):
+        while self.is_active:
+            self.context.change_dt(self.now_dt)
+            self.tock()
+            await asyncio.sleep(self.sleep_time)
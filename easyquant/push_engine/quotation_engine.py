@@ -1,22 +1,36 @@
 # coding: utf-8
+import asyncio
+import concurrent.futures
 import datetime
 import time
-from threading import Thread
+from threading import Lock, Thread
 
+from ..bar_buffer import BarBuffer
+from ..easydealutils import time as etime
 from ..event_engine import EventEngine, Event
-from ..quotation import Quotation
+from ..metrics import metrics
+from .watch_registry import WatchRegistry
+from ..quotation import Quotation, SETTLE_LAG
+
+# 非分钟K线每根的大致时长(秒), 用于估算增量获取的K线数
+BAR_SECONDS = {'1d': 24 * 3600, '1w': 7 * 24 * 3600, '1M': 31 * 24 * 3600}
 
 
 class QuotationEngine:
     EventType = 'bar'
     PushInterval = 3600
 
-    def __init__(self, quotation: Quotation, event_engine: EventEngine, bar_type='5m'):
+    def __init__(self, quotation: Quotation, event_engine: EventEngine, bar_type='5m', buffer_size=200,
+                 fetch_workers=8, fetch_deadline=None, settle_lag=SETTLE_LAG):
         """
 
         :param quotation:
         :param event_engine:
         :param bar_type: K线类型
+        :param buffer_size: 每个股票缓存的K线数量
+        :param fetch_workers: 并发获取行情的线程数
+        :param fetch_deadline: 实时行情每轮获取的截止时长(秒), 超时未返回的股票标记为过期, 默认为推送间隔的一半
+        :param settle_lag: K线收盘后等待行情源更新的时长(秒), 每轮在 K线收盘时间 + settle_lag 推送
         """
         self.event_engine = event_engine
         self.quotation_source = quotation
@@ -26,18 +40,53 @@ class QuotationEngine:
         self.quotation_thread.setDaemon(False)
 
         self.bar_type = bar_type
+        self.bar_seconds = BAR_SECONDS.get(bar_type, 24 * 3600)
+        # K线周期(分钟), 非分钟K线为 None, 按日线收盘时间推送
+        self.bar_minutes = None
         if "m" in bar_type:
             minute = int(bar_type.replace("m", ""))
             self.PushInterval = minute * 60
+            self.bar_seconds = minute * 60
+            self.bar_minutes = minute
+        self.settle_lag = datetime.timedelta(seconds=settle_lag)
+
+        # 每个股票的K线缓冲区, 首次全量加载后只获取增量K线
+        self.buffer_size = buffer_size
+        self.buffers = {}
+
+        # 并发获取行情的线程池
+        self.fetch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=fetch_workers,
+                                                                    thread_name_prefix="QuotationEngine.fetch")
+        self.fetch_deadline = fetch_deadline if fetch_deadline is not None else self.PushInterval / 2
+        # 尚未取走结果的获取任务, 股票代码 -> (提交时的轮次, future), 同一股票同时只有一个获取任务
+        self._pending_fetches = {}
+        # 获取行情的轮次
+        self._cycle = 0
+        # 每个股票最近一次获取到的K线, 超时的股票推送这份数据
+        self._last_bars = {}
+        # 最近一轮没有按时获取到的股票
+        self.stale_codes = set()
+        # 最近一轮获取的耗时统计
+        self.fetch_stats = {}
+        # 本轮推送对应的K线收盘时间戳, 首次推送时为 None
+        self.bar_close = None
+        # 保护 buffers / _pending_fetches / _last_bars, 监听变化与获取任务可能在不同线程中进行
+        self._fetch_lock = Lock()
+
+        # 监听的股票, 按订阅者登记并做引用计数
+        self.watch_registry = WatchRegistry(on_add=self._warm, on_remove=self._evict)
+        self._started = False
 
         print('初始化行情引擎')
         self.init()
 
     def start(self):
+        self._started = True
         self.quotation_thread.start()
 
     def stop(self):
         self.is_active = False
+        self.fetch_executor.shutdown(wait=False)
 
     def push_quotation(self):
         print('行情引擎：启动')
@@ -47,7 +96,7 @@ class QuotationEngine:
             except:
                 self.wait()
                 continue
-            event = Event(event_type=self.EventType, data=response_data)
+            event = Event(event_type=self.EventType, data=response_data, bar_close=self.bar_close)
             print('行情引擎：推送行情')
             self.event_engine.put(event)
             self.wait()
@@ -56,23 +105,225 @@ class QuotationEngine:
         # do something init
         pass
 
+    def next_push_time(self, now=None):
+        """
+        下一次推送时间: 下一根K线收盘时间 + settle_lag, 跳过午休和非交易日.
+        按绝对时间计算, 获取行情的耗时不会累积到推送时间上
+        """
+        now = now or datetime.datetime.now()
+        return etime.get_next_bar_close(now - self.settle_lag, self.bar_minutes) + self.settle_lag
+
     def wait(self):
         # for receive quit signal
-        for _ in range(int(self.PushInterval) + 1):
-            time.sleep(1)
+        push_time = self.next_push_time()
+        self.bar_close = (push_time - self.settle_lag).timestamp()
+        while self.is_active:
+            remaining = (push_time - datetime.datetime.now()).total_seconds()
+            if remaining <= 0:
+                break
+            time.sleep(min(1, remaining))
+
+    @property
+    def stocks(self):
+        """所有监听的股票"""
+        return self.watch_registry.codes()
 
-    stocks = []
+    def watch(self, stock_code: str, subscriber=None):
+        self.watch_registry.add(subscriber, stock_code)
 
-    def watch(self, stock_code: str):
-        self.stocks.append(stock_code)
+    def un_watch(self, stock_code: str, subscriber=None):
+        self.watch_registry.remove(subscriber, stock_code)
+
+    def set_watchlist(self, subscriber, stock_codes):
+        """
+        更新订阅者监听的股票, 只增删有变化的股票
+        :param subscriber: 订阅者, 一般为策略对象
+        :return: (新增的股票集合, 移除的股票集合)
+        """
+        return self.watch_registry.set_watchlist(subscriber, stock_codes)
 
-    def un_watch(self, stock_code: str):
-        self.stocks.remove(stock_code)
+    def _warm(self, code):
+        """股票开始被监听: 引擎运行中时提前加载K线缓冲区, 下一轮推送直接使用"""
+        with self._fetch_lock:
+            if self._started and self.is_active and code not in self._pending_fetches:
+                self._pending_fetches[code] = (self._cycle,
+                                               self.fetch_executor.submit(self._timed_fetch, code, None))
+
+    def _evict(self, code):
+        """股票不再被监听: 释放K线缓冲区, 仍在进行的获取任务的结果会被丢弃"""
+        with self._fetch_lock:
+            self.buffers.pop(code, None)
+            self._last_bars.pop(code, None)
+            self._pending_fetches.pop(code, None)
 
     def fetch_quotation(self, end_date=None):
+        """
+        并发获取所有监听股票的K线.
+        实时行情在 fetch_deadline 内没有返回或获取失败的股票记入 stale_codes,
+        推送其上一次获取到的K线(没有则不推送).
+        之前轮次提交的任务是上一根K线的数据: 已返回的结果只更新兜底数据并重新获取, 仍未返回的本轮记为过期.
+        获取期间不再被监听的股票, 结果直接丢弃
+        """
+        if end_date:
+            return self.fetch_history(end_date)
+        started = time.time()
+        codes = self.stocks
+        futures = {}
+        stale_codes = set()
+        with self._fetch_lock:
+            self._cycle += 1
+            for code in codes:
+                if code not in self.watch_registry:
+                    continue
+                pending = self._pending_fetches.get(code)
+                if pending is not None and pending[0] < self._cycle:
+                    if not pending[1].done():
+                        stale_codes.add(code)
+                        continue
+                    self._pending_fetches.pop(code, None)
+                    self._collect_late(code, pending[1])
+                    pending = None
+                if pending is None:
+                    pending = self._pending_fetches[code] = (self._cycle,
+                                                             self.fetch_executor.submit(self._timed_fetch, code, None))
+                futures[pending[1]] = code
+
+        done, _ = concurrent.futures.wait(futures, timeout=self.fetch_deadline)
+
         bars = {}
-        for code in self.stocks:
-            bars[code] = self.quotation_source.get_bars(code, 200, unit=self.bar_type,
-                                                        end_dt=end_date if end_date else datetime.datetime.now())
+        latencies = []
+        with self._fetch_lock:
+            for future, code in futures.items():
+                if code not in self.watch_registry:
+                    continue
+                if future not in done:
+                    stale_codes.add(code)
+                    continue
+                if self._pending_fetches.get(code, (None, None))[1] is future:
+                    self._pending_fetches.pop(code)
+                try:
+                    bars[code], latency = future.result()
+                    latencies.append(latency)
+                    metrics.observe('quotation_fetch_stock', latency)
+                except Exception as e:
+                    print('行情引擎：获取 %s 行情失败: %s' % (code, e))
+                    stale_codes.add(code)
+            stale_codes = {code for code in stale_codes if code in self.watch_registry}
+            for code in stale_codes:
+                if code in self._last_bars:
+                    bars[code] = self._last_bars[code]
+            self._last_bars.update(bars)
 
+        self.stale_codes = stale_codes
+        self.fetch_stats = self._latency_stats(latencies, len(stale_codes), time.time() - started)
+        metrics.observe('quotation_fetch', self.fetch_stats['elapsed'])
+        print('行情引擎：获取行情 %(count)d 只, 过期 %(stale)d 只, 总耗时 %(elapsed).3fs, '
+              'p50 %(p50).3fs, p90 %(p90).3fs, p99 %(p99).3fs, max %(max).3fs' % self.fetch_stats)
         return bars
+
+    def _collect_late(self, code, future):
+        """之前轮次超时后才返回的结果, 只作为过期时推送的兜底数据"""
+        try:
+            self._last_bars[code] = future.result()[0]
+        except Exception as e:
+            print('行情引擎：获取 %s 行情失败: %s' % (code, e))
+
+    def fetch_history(self, end_date):
+        """历史行情没有截止时长, 通过行情源的批量接口一次获取所有监听股票"""
+        started = time.time()
+        codes = self.stocks
+        bars = self.quotation_source.get_bars_batch(codes, self.buffer_size, unit=self.bar_type, end_dt=end_date)
+        self._last_bars.update(bars)
+        self.stale_codes = set(codes) - set(bars)
+        elapsed = time.time() - started
+        metrics.observe('quotation_fetch', elapsed)
+        print('行情引擎：批量获取历史行情 %d 只, 失败 %d 只, 总耗时 %.3fs' % (len(bars), len(self.stale_codes), elapsed))
+        return bars
+
+    def _timed_fetch(self, code, end_date):
+        started = time.time()
+        return self.fetch_stock(code, end_date), time.time() - started
+
+    @staticmethod
+    def _latency_stats(latencies, stale, elapsed):
+        """单轮获取的耗时分布(秒)"""
+        latencies = sorted(latencies)
+
+        def percentile(q):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+        return dict(count=len(latencies), stale=stale, elapsed=elapsed,
+                    min=latencies[0] if latencies else 0.0,
+                    p50=percentile(0.5), p90=percentile(0.9), p99=percentile(0.99),
+                    max=latencies[-1] if latencies else 0.0)
+
+    def fetch_stock(self, code, end_date=None):
+        """
+        获取单个股票的K线
+        :param end_date: 截止时间, 为 None 时获取实时行情, 通过K线缓冲区增量获取
+        """
+        if end_date:
+            return self.fetch_bars(code, end_date)
+        return self.fetch_incremental(code)
+
+    def fetch_bars(self, code, end_dt, count=None):
+        """从行情源获取单个股票的K线"""
+        return self.quotation_source.get_bars(code, count or self.buffer_size, unit=self.bar_type, end_dt=end_dt)
+
+    def fetch_incremental(self, code):
+        """
+        增量获取实时K线: 首次全量加载到缓冲区, 之后只获取最后一根K线以来的K线,
+        覆盖未走完的最后一根K线并追加新K线
+        :return: 缓冲区K线的 DataFrame 副本
+        """
+        now = datetime.datetime.now()
+        with self._fetch_lock:
+            buffer = self.buffers.get(code)
+        if buffer is None:
+            buffer = BarBuffer(self.buffer_size)
+        buffer.sync(lambda count: self.fetch_bars(code, now, count), now, self.bar_seconds)
+        with self._fetch_lock:
+            # 获取期间股票已不再被监听时不保存缓冲区, 避免泄漏
+            if code in self.watch_registry:
+                self.buffers.setdefault(code, buffer)
+        return buffer.frame()
+
+
+class AsyncQuotationEngine(QuotationEngine):
+    """
+    运行在 AsyncEventEngine 事件循环上的行情引擎,
+    行情源为阻塞接口, 各股票的K线在 fetch_quotation 的线程池中并发获取, 事件循环只等待结果
+    """
+
+    def start(self):
+        self._started = True
+        self.event_engine.submit(self.push_quotation_async())
+
+    async def push_quotation_async(self):
+        print('行情引擎：启动')
+        while self.is_active:
+            try:
+                response_data = await self.fetch_quotation_async()
+            except Exception:
+                await self.wait_async()
+                continue
+            event = Event(event_type=self.EventType, data=response_data, bar_close=self.bar_close)
+            print('行情引擎：推送行情')
+            self.event_engine.put(event)
+            await self.wait_async()
+
+    async def wait_async(self):
+        # for receive quit signal
+        push_time = self.next_push_time()
+        self.bar_close = (push_time - self.settle_lag).timestamp()
+        while self.is_active:
+            remaining = (push_time - datetime.datetime.now()).total_seconds()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(1, remaining))
+
+    async def fetch_quotation_async(self, end_date=None):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.fetch_quotation, end_date)
@@ -0,0 +1,93 @@
+# coding: utf-8
+from collections import defaultdict
+from threading import RLock
+
+
+class WatchRegistry:
+    """
+    股票监听登记表
+    每个订阅者(策略等)登记自己的股票集合, 每个股票记录被多少个订阅者监听(引用计数),
+    登记 / 注销都是 O(1), 只有引用计数从 0 变 1 或从 1 变 0 时才回调 on_add / on_remove
+    """
+
+    def __init__(self, on_add=None, on_remove=None):
+        """
+        :param on_add: on_add(code), 股票开始被监听时调用
+        :param on_remove: on_remove(code), 股票不再被任何订阅者监听时调用
+        """
+        self.on_add = on_add or (lambda code: None)
+        self.on_remove = on_remove or (lambda code: None)
+        # 订阅者 -> 股票集合
+        self._subscriptions = defaultdict(set)
+        # 股票 -> 引用计数, 按首次监听的顺序排列
+        self._refcounts = {}
+        self._lock = RLock()
+
+    def add(self, subscriber, code):
+        """
+        :return: bool, 该订阅者之前是否没有监听该股票
+        """
+        with self._lock:
+            codes = self._subscriptions[subscriber]
+            if code in codes:
+                return False
+            codes.add(code)
+            count = self._refcounts.get(code, 0)
+            self._refcounts[code] = count + 1
+            if count == 0:
+                self.on_add(code)
+            return True
+
+    def remove(self, subscriber, code):
+        """
+        :return: bool, 该订阅者之前是否监听了该股票
+        """
+        with self._lock:
+            codes = self._subscriptions.get(subscriber)
+            if codes is None or code not in codes:
+                return False
+            codes.remove(code)
+            if not codes:
+                self._subscriptions.pop(subscriber)
+            count = self._refcounts[code] - 1
+            if count == 0:
+                self._refcounts.pop(code)
+                self.on_remove(code)
+            else:
+                self._refcounts[code] = count
+            return True
+
+    def set_watchlist(self, subscriber, codes):
+        """
+        把订阅者的股票集合更新为 codes, 只增删有变化的股票
+        :return: (新增的股票集合, 移除的股票集合)
+        """
+        codes = set(codes)
+        with self._lock:
+            current = set(self._subscriptions.get(subscriber, ()))
+            added = codes - current
+            removed = current - codes
+            for code in removed:
+                self.remove(subscriber, code)
+            for code in added:
+                self.add(subscriber, code)
+            return added, removed
+
+    def watchlist(self, subscriber):
+        """订阅者监听的股票集合"""
+        with self._lock:
+            return set(self._subscriptions.get(subscriber, ()))
+
+    def refcount(self, code):
+        return self._refcounts.get(code, 0)
+
+    def codes(self):
+        """所有被监听的股票, 按首次监听的顺序"""
+        with self._lock:
+            return list(self._refcounts)
+
+    def __contains__(self, code):
+        return code in self._refcounts
+
+    def __len__(self):
+        return len(self._refcounts)
@@ -1,9 +1,12 @@
 import abc
+import concurrent.futures
 import json
 import multiprocessing.pool
-import os
+import threading
+import time
 import warnings
 import datetime
+import numpy as np
 import jqdatasdk
 import pandas as pd
 
@@ -13,17 +16,47 @@ import tushare as ts
 import requests
 from jqdatasdk import finance, query
 
-from easyquant.easydealutils.time import get_all_trade_days
+import easyquotation
+from easyquotation.helpers import get_stock_type
+from easyquotation.throttle import limit, registry as throttle_registry
+from easyquant.bar_aggregator import MinuteBarAggregator
+from easyquant.bar_buffer import BarBuffer, to_ohlcv
+from easyquant.bar_cache import BarCache
+from easyquant.bar_store import BarStore, bars_per_day, end_of_day
+from easyquant.easydealutils.time import calendar, get_all_trade_days, get_bar_close_times, get_next_bar_close, \
+    is_tradetime
+from easyquant.metrics import metrics
 from easyquant.models import SecurityInfo
+from easyquant.tick_recorder import COLUMNS as SNAPSHOT_COLUMNS, is_session_time
 from easytrader.utils.misc import file2dict
 from pandas import DataFrame
 
 from easyquotation.bar import get_price
 
+# K线收盘后等待行情源更新的时长(秒), 行情引擎在收盘 + SETTLE_LAG 时推送, 缓存在同一时间失效
+SETTLE_LAG = 3
+
+# 上游请求的排队延迟记入延迟统计
+throttle_registry.observer = lambda host, wait: metrics.observe('upstream_queue_wait', wait, host=host)
 
 class Quotation(metaclass=abc.ABCMeta):
     """行情获取基类"""
 
+    # 所有行情源共享的K线内存缓存, 大小上限可通过 Quotation.cache.max_bytes 调整
+    cache = BarCache()
+    # get_bars_batch 没有批量接口时并发获取的线程数
+    batch_workers = 8
+
+    def _cached(self, key, loader, expires=None) -> DataFrame:
+        """
+        从共享缓存获取K线, 未命中时调用 loader 加载
+        返回副本, 调用方修改返回的 DataFrame 不会影响缓存
+        :param expires: datetime.datetime, 缓存失效时间, 为 None 时不失效
+        """
+        if expires is not None:
+            expires = expires.timestamp()
+        return self.cache.get((type(self).__name__,) + key, loader, expires).copy()
+
     def get_bars(self, security, count, unit='1d',
                  fields=['date', 'open', 'high', 'low', 'close', 'volume'],
                  include_now=False, end_dt=None) -> DataFrame:
@@ -43,6 +76,49 @@ class Quotation(metaclass=abc.ABCMeta):
         """
         pass
 
+    def get_bars_batch(self, securities, count, unit='1d',
+                       fields=['date', 'open', 'high', 'low', 'close', 'volume'],
+                       include_now=False, end_dt=None, panel=False):
+        """
+        批量获取多个股票的K线, 参数同 get_bars.
+        行情源有批量接口时在子类中覆盖 _get_bars_batch, 否则并发调用 get_bars
+
+        :param securities: 股票代码列表
+        :param panel: 为 True 时返回按时间对齐的 DataFrame, 见 to_panel
+        :return: dict, 股票代码 -> DataFrame, 按 securities 的顺序, 获取失败或没有数据的股票不包含在内
+        """
+        securities = list(dict.fromkeys(securities))
+        bars = self._get_bars_batch(securities, count, unit, fields, include_now, end_dt) if securities else {}
+        bars = {security: bars[security] for security in securities
+                if bars.get(security) is not None and len(bars[security])}
+        return to_panel(bars) if panel else bars
+
+    def _get_bars_batch(self, securities, count, unit, fields, include_now, end_dt):
+        return fetch_concurrently(securities,
+                                  lambda security: self.get_bars(security, count, unit=unit, fields=fields,
+                                                                 include_now=include_now, end_dt=end_dt),
+                                  self.batch_workers)
+
+    def _store_batch(self, codes, unit, end, count, fetch_one, fetch_many):
+        """
+        批量从 self.store 获取K线: 本地缓存不能回答的股票用 fetch_many 一次请求, 结果合并进缓存
+        :param codes: 行情源格式的股票代码列表
+        :param fetch_one: fetch_one(code) -> 单个股票的 fetch(end, count), 用于缓存只缺少最近几根K线的股票
+        :param fetch_many: fetch_many(codes, end, count) -> dict, 代码 -> DataFrame(索引为时间)
+        :return: dict, 代码 -> DataFrame
+        """
+        missing = [code for code in codes if not self.store.has(code, unit, end, count)]
+        fetched = fetch_many(missing, end, count) if missing else {}
+        bars = {}
+        for code in codes:
+            if code in missing:
+                df = fetched.get(code)
+                fetch = lambda fetch_end, fetch_count, df=DataFrame() if df is None else df: df
+            else:
+                fetch = fetch_one(code)
+            bars[code] = self.store.get(code, unit, end, count, fetch)
+        return bars
+
     def get_all_trade_days(self):
         """
         所有交易日期
@@ -68,6 +144,40 @@ class Quotation(metaclass=abc.ABCMeta):
         return SecurityInfo
 
 
+def fetch_concurrently(securities, fetch, workers=8):
+    """
+    并发调用 fetch(security), 失败的股票打印错误后跳过
+    :return: dict, 股票代码 -> fetch 的返回值
+    """
+    result = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(min(workers, len(securities)), 1)) as executor:
+        futures = {executor.submit(fetch, security): security for security in securities}
+        for future in concurrent.futures.as_completed(futures):
+            security = futures[future]
+            try:
+                result[security] = future.result()
+            except Exception as e:
+                print('批量获取行情：获取 %s 行情失败: %s' % (security, e))
+    return result
+
+
+def to_panel(bars) -> DataFrame:
+    """
+    把多个股票的K线按时间对齐成一个 DataFrame, 用于横截面计算
+    :param bars: dict, 股票代码 -> DataFrame(索引为时间)
+    :return: DataFrame, 索引为所有股票K线时间的并集, 列为 (字段, 股票代码) 两级,
+        例如 panel['close'] 为 时间 x 股票 的收盘价, 某个股票在某个时间没有K线时为 nan
+    """
+    if not bars:
+        return DataFrame()
+    frames = {}
+    for security, df in bars.items():
+        df = df.select_dtypes('number')
+        frames[security] = df.set_axis(pd.to_datetime(df.index), axis=0)
+    panel = pd.concat(frames, axis=1, sort=True)
+    return panel.swaplevel(axis=1).sort_index(axis=1, level=0, sort_remaining=False)
+
+
 def is_shanghai(stock_code):
     """判断股票ID对应的证券市场
     匹配规则
@@ -94,9 +204,13 @@ class TushareQuotation(Quotation):
     tushare 行情
     """""
 
+    # pro.daily 单次请求最多返回的行数
+    daily_limit = 6000
+
     def __init__(self):
         tushare_config = file2dict('tushare.json')
         ts.set_token(tushare_config['token'])
+        self.store = BarStore('data/bars/tushare')
 
     def get_stock_type(self, stock_code: str):
         return "SH" if is_shanghai(stock_code) else "SZ"
@@ -104,9 +218,6 @@ class TushareQuotation(Quotation):
     def _format_code(self, code: str) -> str:
         return "%s.%s" % (code, self.get_stock_type(code))
 
-    def _get_cache_key(self, security, end_dt, unit):
-        return "data/tushare_%s_%s_%s.csv" % (self._format_code(security), to_date_str(end_dt), unit)
-
     def get_bars(self, security, count, unit='1d',
                  fields=['trade_date', 'open', 'high', 'low', 'close'],
                  include_now=False, end_dt=None) -> DataFrame:
@@ -114,38 +225,80 @@ class TushareQuotation(Quotation):
         if unit == "1d":
             unit = "D"
 
-        cache_file = self._get_cache_key(security, end_dt, unit)
-
-        if os.path.exists(cache_file):
-            df = pd.read_csv(cache_file)
+        ts_code = self._format_code(security)
+        end = end_of_day(end_dt or datetime.datetime.now())
+        return self._cached((ts_code, count, unit, end.date()),
+                            lambda: self._with_codes(ts_code, self.store.get(ts_code, unit, end, count,
+                                                                             self._fetch(ts_code, unit))),
+                            live_expire_time(unit, end))
+
+    def _fetch(self, ts_code, unit):
+        """单个股票的请求函数 fetch(end, count)"""
+
+        def fetch(end, limit_count):
+            with limit('tushare'):
+                df = ts.pro_bar(ts_code=ts_code,
+                                end_date=to_date_str(end),
+                                freq=unit,  # 只免费
+                                asset='E',
+                                limit=limit_count)
+            if df is None:
+                return DataFrame()
             df.index = pandas.to_datetime(df["trade_date"])
-            return df
-
-        df = ts.pro_bar(ts_code=self._format_code(security),
-                        end_date=to_date_str(end_dt),
-                        freq=unit,  # 只免费
-                        asset='E',
-                        limit=count)
-        df.index = pandas.to_datetime(df["trade_date"])
-        df.sort_index(inplace=True)
+            return df.sort_index()
 
-        df.to_csv(cache_file)
+        return fetch
 
+    @staticmethod
+    def _with_codes(ts_code, df):
+        """补上缓存中不保存的 ts_code / trade_date 列"""
+        if len(df):
+            df.insert(0, 'trade_date', df.index.strftime('%Y%m%d'))
+            df.insert(0, 'ts_code', ts_code)
         return df
 
+    def _get_bars_batch(self, securities, count, unit, fields, include_now, end_dt):
+        if unit not in ("1d", "D"):
+            # 只有日线有多股票接口
+            return super()._get_bars_batch(securities, count, unit, fields, include_now, end_dt)
+        codes = {self._format_code(security): security for security in securities}
+        bars = self._store_batch(list(codes), "D", end_of_day(end_dt or datetime.datetime.now()), count,
+                                 lambda ts_code: self._fetch(ts_code, "D"), self._fetch_daily)
+        return {codes[ts_code]: self._with_codes(ts_code, df) for ts_code, df in bars.items()}
+
+    def _fetch_daily(self, ts_codes, end, count):
+        """
+        pro.daily 一次请求多个股票的日线, 每次请求的行数不超过 daily_limit
+        按 2 * count 个交易日请求, 停牌的股票也能取满 count 根
+        """
+        start = calendar.prev(end, 2 * count)
+        step = max(self.daily_limit // (2 * count + 1), 1)
+        pro = ts.pro_api()
+        frames = []
+        for i in range(0, len(ts_codes), step):
+            with limit('tushare'):
+                frames.append(pro.daily(ts_code=','.join(ts_codes[i:i + step]),
+                                        start_date=start.strftime('%Y%m%d'),
+                                        end_date=end.strftime('%Y%m%d')))
+        frames = [df for df in frames if df is not None and len(df)]
+        if not frames:
+            return {}
+        result = {}
+        for ts_code, df in pd.concat(frames).groupby('ts_code'):
+            df = df.set_axis(pandas.to_datetime(df["trade_date"]), axis=0)
+            result[ts_code] = df.sort_index().tail(count)
+        return result
+
 
 class JQDataQuotation(Quotation):
     """
     JQData行情
     """""
-    cache = {}
 
     def __init__(self):
         config = file2dict('jqdata.json')
         jqdatasdk.auth(config["user"], config["password"])
-
-    def _get_cache_key(self, security, end_dt, unit):
-        return "%s_%s_%s" % (self._format_code(security), to_date_str(end_dt), unit)
+        self.store = BarStore('data/bars/jqdata')
 
     def get_stock_type(self, stock_code: str):
         return ".XSHG" if is_shanghai(stock_code) else ".XSHE"
@@ -154,12 +307,14 @@ class JQDataQuotation(Quotation):
         return "%s%s" % (code, self.get_stock_type(code))
 
     def get_north_money(self, date):
-        n_sh = finance.run_query(query(finance.STK_ML_QUOTA).filter(finance.STK_ML_QUOTA.day <= date,
-                                                                    finance.STK_ML_QUOTA.link_id == 310001).order_by(
-            finance.STK_ML_QUOTA.day.desc()).limit(10))
-        n_sz = finance.run_query(query(finance.STK_ML_QUOTA).filter(finance.STK_ML_QUOTA.day <= date,
-                                                                    finance.STK_ML_QUOTA.link_id == 310002).order_by(
-            finance.STK_ML_QUOTA.day.desc()).limit(10))
+        with limit('jqdata'):
+            n_sh = finance.run_query(query(finance.STK_ML_QUOTA).filter(finance.STK_ML_QUOTA.day <= date,
+                                                                        finance.STK_ML_QUOTA.link_id == 310001).order_by(
+                finance.STK_ML_QUOTA.day.desc()).limit(10))
+        with limit('jqdata'):
+            n_sz = finance.run_query(query(finance.STK_ML_QUOTA).filter(finance.STK_ML_QUOTA.day <= date,
+                                                                        finance.STK_ML_QUOTA.link_id == 310002).order_by(
+                finance.STK_ML_QUOTA.day.desc()).limit(10))
         total_net_in = 0
         for i in range(0, 3):
             sh_in = n_sh['buy_amount'][i] - n_sh['sell_amount'][i]
@@ -172,65 +327,445 @@ class JQDataQuotation(Quotation):
                  fields=['date', 'open', 'high', 'low', 'close', 'volume'],
                  include_now=True, end_dt=None) -> DataFrame:
 
-        query_dt = end_dt
-        if not isinstance(query_dt, datetime.datetime):
-            query_dt = datetime.datetime.strptime(query_dt, "%Y-%m-%d")
+        end_dt = self._end_dt(end_dt)
+        fields = self._fields(fields)
+        code = self._format_code(security)
+
+        def load():
+            # 按天请求, 分钟K线再按 end_dt 过滤
+            df = self.store.get(code, unit, end_of_day(end_dt), count + bars_per_day(unit),
+                                lambda end, fetch_count: self._frame(
+                                    self._query(code, fetch_count, unit, fields, include_now, end)))
+            return self._slice(df, count, unit, end_dt)
+
+        # 分钟K线截止时间在同一根K线周期内的请求结果相同, 日线只与日期有关
+        end_key = bar_expire_time(unit, end_dt, 0) if "m" in unit else end_dt.date()
+        return self._cached((code, count, unit, end_key, include_now), load, live_expire_time(unit, end_dt))
+
+    def get_bars_batch(self, securities, count, unit='1d',
+                       fields=['date', 'open', 'high', 'low', 'close', 'volume'],
+                       include_now=True, end_dt=None, panel=False):
+        # 与 get_bars 的默认值一致, 默认包含当前K线
+        return super().get_bars_batch(securities, count, unit=unit, fields=fields, include_now=include_now,
+                                      end_dt=end_dt, panel=panel)
+
+    def _get_bars_batch(self, securities, count, unit, fields, include_now, end_dt):
+        end_dt = self._end_dt(end_dt)
+        fields = self._fields(fields)
+        codes = {self._format_code(security): security for security in securities}
+
+        def fetch_one(code):
+            return lambda end, fetch_count: self._frame(self._query(code, fetch_count, unit, fields, include_now, end))
+
+        def fetch_many(missing, end, fetch_count):
+            # 传入股票列表时返回 (股票代码, 序号) 两级索引的 DataFrame
+            df = self._query(missing, fetch_count, unit, fields, include_now, end)
+            return {code: self._frame(group.droplevel(0)) for code, group in df.groupby(level=0)}
+
+        bars = self._store_batch(list(codes), unit, end_of_day(end_dt), count + bars_per_day(unit),
+                                 fetch_one, fetch_many)
+        return {codes[code]: self._slice(df, count, unit, end_dt) for code, df in bars.items()}
+
+    @staticmethod
+    def _end_dt(end_dt):
+        if end_dt is None:
+            return datetime.datetime.now()
+        if not isinstance(end_dt, datetime.datetime):
+            return end_of_day(end_dt)
+        return end_dt
+
+    @staticmethod
+    def _fields(fields):
+        # 缓存中保存全部行情字段, 按需返回
+        return list(dict.fromkeys(['date', 'open', 'high', 'low', 'close', 'volume', 'money'] + list(fields)))
+
+    @staticmethod
+    def _query(codes, count, unit, fields, include_now, end):
+        with limit('jqdata'):
+            return jqdatasdk.get_bars(codes, count,
+                                      unit=unit,
+                                      fields=fields,
+                                      include_now=include_now,
+                                      # 取整天的数据
+                                      end_dt=to_date_str(end + datetime.timedelta(days=1)),
+                                      fq_ref_date=datetime.datetime.now())
+
+    @staticmethod
+    def _frame(df):
+        df = df.set_axis(pd.to_datetime(df.date), axis=0)
+        return df.drop(columns='date')
+
+    @staticmethod
+    def _slice(df, count, unit, end_dt):
+        if not len(df):
+            return df
+        if "m" in unit:
+            df = df[df.index <= end_dt]
+        df = df.tail(count)
+        df.insert(0, 'date', df.index)
+        return df
+
+    def get_stock_info(self, security: str):
+        with limit('jqdata'):
+            return jqdatasdk.get_security_info(self._format_code(security))
+
+
+class FreeOnlineQuotation(Quotation):
+    """
+    实时行情
+    """""
+
+    def get_stock_type(self, stock_code: str):
+        return "sh" if is_shanghai(stock_code) else "sz"
+
+    def _format_code(self, code: str) -> str:
+        return "%s%s" % (self.get_stock_type(code), code)
+
+    # 腾讯分钟K线接口支持的周期, 批量获取实时分钟K线时使用
+    KLINE_MINUTES = (1, 5, 15, 30, 60)
+    _minute_kline = None
 
-        query_dt += datetime.timedelta(days=1)
+    @staticmethod
+    def _cache_key(security, count, unit, end_dt):
+        # 截止时间在同一根K线周期内的请求共用一个缓存, 到下一根K线收盘时失效
+        end_key = bar_expire_time(unit, end_dt, 0) if isinstance(end_dt, datetime.datetime) else end_dt
+        return security, count, unit, end_key
 
-        if 'date' not in fields:
-            fields.append('date')
+    def get_bars(self, security, count, unit='1d',
+                 fields=['date', 'open', 'high', 'low', 'close', 'volume'],
+                 include_now=False, end_dt=None) -> DataFrame:
+        return self._cached(self._cache_key(security, count, unit, end_dt),
+                            lambda: get_price(self._format_code(security), end_date=end_dt, count=count, frequency=unit),
+                            bar_expire_time(unit, datetime.datetime.now()))
+
+    def _get_bars_batch(self, securities, count, unit, fields, include_now, end_dt):
+        minute = int(unit[:-1]) if unit.endswith('m') and unit[:-1].isdigit() else None
+        if minute not in self.KLINE_MINUTES or (
+                end_dt is not None and pd.Timestamp(end_dt).date() != datetime.date.today()):
+            return super()._get_bars_batch(securities, count, unit, fields, include_now, end_dt)
+        # 腾讯批量K线接口的最后一根K线没有用实时价格修正收盘价, 与 get_bars(get_price) 的结果分开缓存
+        keys = {security: (type(self).__name__, 'minutekline') + self._cache_key(security, count, unit, end_dt)
+                for security in securities}
+        bars = {}
+        for security in securities:
+            df = self.cache.peek(keys[security])
+            if df is not None:
+                bars[security] = df.copy()
+        missing = [security for security in securities if security not in bars]
+        if not missing:
+            return bars
+        # 当天的分钟K线由 easyquotation 的常驻连接池并发请求
+        if self._minute_kline is None:
+            FreeOnlineQuotation._minute_kline = easyquotation.use('minutekline')
+        arrays = self._minute_kline.bars(missing, minute=minute, count=count)
+        expires = bar_expire_time(unit, datetime.datetime.now())
+        for security, data in arrays.items():
+            df = DataFrame({name: data[name] for name in ('open', 'high', 'low', 'close', 'volume')},
+                           index=pd.DatetimeIndex(data['time'].astype('datetime64[ns]')))
+            self.cache.put(keys[security], df, expires.timestamp())
+            bars[security] = df.copy()
+        return bars
+
+
+def bar_expire_time(unit, now, settle_lag=SETTLE_LAG):
+    """
+    unit 周期的K线缓存失效时间
+    分钟K线到下一根K线收盘; 日 / 周 / 月线盘中最新一根K线随成交变化, 按1分钟失效, 盘后保持到下一个交易时段开盘.
+    收盘后 settle_lag 秒内行情源可能还没有更新最后一根K线, 失效时间整体推后 settle_lag 秒
+    :param unit: '1m', '5m', ..., '1d', '1w', '1M'
+    :param now: datetime.datetime
+    :param settle_lag: 收盘后等待行情源更新的时长(秒), 为 0 时即K线收盘时间
+    :return: datetime.datetime
+    """
+    lag = datetime.timedelta(seconds=settle_lag)
+    now = now - lag
+    if unit.endswith('m') and unit[:-1].isdigit():
+        return get_next_bar_close(now, int(unit[:-1])) + lag
+    if is_tradetime(now):
+        return get_next_bar_close(now, 1) + lag
+    # 下一根1分钟K线的开始时间即下一个交易时段的开盘时间
+    return get_next_bar_close(now, 1) - datetime.timedelta(minutes=1) + lag
 
-        cache_key = self._get_cache_key(security, query_dt, unit)
 
-        if cache_key in self.cache:
-            df = self.cache[cache_key]
-            return df[df.index <= end_dt] if "m" in unit else df
+def live_expire_time(unit, end_dt):
+    """
+    截止时间为 end_dt 的K线缓存失效时间: 截止到今天及以后的K线还会更新, 按 bar_expire_time 失效,
+    历史K线不再变化, 不失效
+    :return: datetime.datetime 或 None
+    """
+    if end_dt.date() < datetime.date.today():
+        return None
+    return bar_expire_time(unit, datetime.datetime.now())
 
-        cache_file = "data/jqdata-%s.csv" % cache_key
 
-        if os.path.exists(cache_file):
-            df = pd.read_csv(cache_file)
-            df.index = df.date
-            self.cache[cache_key] = df
-            return df[df.index <= end_dt] if "m" in unit else df
+def resample_bars(df: DataFrame, minutes: int) -> DataFrame:
+    """
+    把1分钟K线合成为 minutes 分钟K线, 按A股交易时段对齐(上午 11:30 收盘, 下午 15:00 收盘),
+    K线时间为收盘时间
+    :param df: 1分钟K线, 索引为K线收盘时间, 包含 open, high, low, close, volume
+    """
+    if df.empty:
+        return df[BarBuffer.FIELDS]
+    closes = np.array([t.hour * 60 + t.minute for t in get_bar_close_times(minutes)])
+    index = pd.DatetimeIndex(df.index)
+    minute_of_day = (index.hour * 60 + index.minute).values
+    # 每根1分钟K线归属的周期收盘时间, 9:30 集合竞价 / 13:00 的K线并入其后第一根
+    pos = np.minimum(np.searchsorted(closes, minute_of_day, side='left'), len(closes) - 1)
+    labels = index.normalize() + pd.to_timedelta(closes[pos], unit='m')
+    grouped = df.groupby(labels, sort=True)
+    return DataFrame({
+        'open': grouped['open'].first(),
+        'high': grouped['high'].max(),
+        'low': grouped['low'].min(),
+        'close': grouped['close'].last(),
+        'volume': grouped['volume'].sum(),
+    })
+
+
+class ResampleQuotation(Quotation):
+    """
+    本地多周期行情: 每个股票只从行情源获取一份1分钟K线, 5m/15m/30m/60m/120m K线在本地合成;
+    日线使用行情源的历史日线(每天获取一次), 当天的日线由1分钟K线合成, 行情源各周期的成交量单位需一致(股).
+    本地只缓存 capacity 根1分钟K线, 合成的K线不够 count 根时(如 15m 及以上取 200 根),
+    该周期更早的历史K线在首次使用时从行情源获取一次, 之后新的和未走完的K线都由1分钟K线合成, 接在历史K线后面.
+    查询历史时间时回退到行情源
+    """
+    MINUTE_UNITS = ['1m', '5m', '15m', '30m', '60m', '120m']
 
-        df = jqdatasdk.get_bars(self._format_code(security), 10000,
-                                unit=unit,
-                                fields=fields,
-                                include_now=include_now,
-                                # 取整天的数据
-                                end_dt=to_date_str(query_dt), fq_ref_date=datetime.datetime.now())
-        df.index = df.date
-        df.sort_index(inplace=True)
-        # 放入缓存
-        self.cache[cache_key] = df
+    def __init__(self, source: Quotation, capacity=1200):
+        """
+        :param source: 行情源
+        :param capacity: 每个股票缓存的1分钟K线数量, 受行情源单次能返回的1分钟K线数量限制
+        """
+        self.source = source
+        self.capacity = capacity
+        self._buffers = {}
+        # 每个股票1分钟K线最近一次刷新时所在的分钟
+        self._refreshed = {}
+        # 每个股票的历史日线, (日期, 获取的数量, DataFrame)
+        self._daily = {}
+        # (股票, 周期) -> (获取的数量, DataFrame), 行情源的分钟历史K线, 用本地合成的K线向后延伸
+        self._history = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _security_lock(self, security):
+        with self._lock:
+            return self._locks.setdefault(security, threading.Lock())
+
+    def _minute_bars(self, security) -> DataFrame:
+        """1分钟K线, 每分钟最多从行情源增量刷新一次"""
+        now = datetime.datetime.now()
+        minute = now.replace(second=0, microsecond=0)
+        with self._security_lock(security):
+            buffer = self._buffers.get(security)
+            if buffer is None:
+                buffer = self._buffers[security] = BarBuffer(self.capacity)
+            if self._refreshed.get(security) != minute:
+                buffer.sync(lambda count: self.source.get_bars(security, count, unit='1m', end_dt=now), now, 60)
+                self._refreshed[security] = minute
+            return buffer.frame()
+
+    def _daily_history(self, security, count) -> DataFrame:
+        """行情源的历史日线, 每天获取一次"""
+        today = datetime.date.today()
+        with self._security_lock(security):
+            cached = self._daily.get(security)
+            if cached is None or cached[0] != today or cached[1] < count:
+                df = self.source.get_bars(security, count + 1, unit='1d', end_dt=datetime.datetime.now())
+                cached = self._daily[security] = (today, count, df)
+            return cached[2]
 
-        df.to_csv(cache_file)
+    def get_bars(self, security, count, unit='1d',
+                 fields=['date', 'open', 'high', 'low', 'close', 'volume'],
+                 include_now=False, end_dt=None) -> DataFrame:
+        if unit not in self.MINUTE_UNITS and unit != '1d':
+            return self.source.get_bars(security, count, unit=unit, fields=fields,
+                                        include_now=include_now, end_dt=end_dt)
+
+        minute_bars = self._minute_bars(security)
+        # 未走完的1分钟K线以收盘时间标记, 实时查询的 end_dt 可能比它早不到1分钟
+        if end_dt is not None and (minute_bars.empty or
+                                   pd.Timestamp(end_dt) + pd.Timedelta(minutes=1) < minute_bars.index[-1]):
+            # 查询历史时间, 本地只有最近的1分钟K线
+            return self.source.get_bars(security, count, unit=unit, fields=fields,
+                                        include_now=include_now, end_dt=end_dt)
+
+        if unit == '1d':
+            return self._daily_bars(security, count, minute_bars)
+
+        resampled = minute_bars if unit == '1m' else resample_bars(minute_bars, int(unit[:-1]))
+        # 最早一根可能只合成了部分1分钟K线
+        df = resampled if unit == '1m' else resampled.iloc[1:]
+        if len(df) < count:
+            if resampled.empty:
+                return self.source.get_bars(security, count, unit=unit, fields=fields,
+                                            include_now=include_now, end_dt=end_dt)
+            return self._extend_history(security, count, unit, resampled, df)
+        return df.iloc[-count:]
+
+    def _extend_history(self, security, count, unit, resampled, local) -> DataFrame:
+        """
+        行情源的历史K线接上本地合成的K线, 历史K线首次使用时获取, 数量不够或与本地K线之间有缺口时重新获取
+        :param resampled: 本地合成的K线, 第一根可能不完整
+        :param local: 本地合成的完整K线
+        """
+        key = (security, unit)
+        with self._security_lock(security):
+            cached = self._history.get(key)
+            # 历史K线要包含本地第一根(可能不完整的)K线, 才能与本地K线连续
+            if cached is None or cached[0] < count or cached[1].index[-1] < resampled.index[0]:
+                df = self.source.get_bars(security, count, unit=unit, end_dt=datetime.datetime.now())
+                df = to_ohlcv(df).sort_index()
+                df.index = pd.DatetimeIndex(df.index)
+                cached = (count, df)
+            history = cached[1]
+            if not local.empty:
+                history = pd.concat([history[history.index < local.index[0]], local])
+            history = history.iloc[-cached[0]:]
+            self._history[key] = (cached[0], history)
+        # 返回副本, 调用方修改不会影响缓存的历史K线
+        return history.iloc[-count:].copy()
+
+    def _daily_bars(self, security, count, minute_bars) -> DataFrame:
+        history = to_ohlcv(self._daily_history(security, count))
+        today = pd.Timestamp(datetime.date.today())
+        history = history[pd.DatetimeIndex(history.index).normalize() < today]
+        today_bars = minute_bars[minute_bars.index >= today]
+        if not today_bars.empty:
+            today_bar = DataFrame({
+                'open': [today_bars['open'].iloc[0]],
+                'high': [today_bars['high'].max()],
+                'low': [today_bars['low'].min()],
+                'close': [today_bars['close'].iloc[-1]],
+                'volume': [today_bars['volume'].sum()],
+            }, index=pd.DatetimeIndex([today]))
+            history = pd.concat([history, today_bar])
+        return history.iloc[-count:]
 
-        # 过滤数据
-        return df[df.index <= end_dt] if "m" in unit else df
+    def get_all_trade_days(self):
+        return self.source.get_all_trade_days()
+
+    def get_north_money(self, date):
+        return self.source.get_north_money(date)
 
     def get_stock_info(self, security: str):
-        return jqdatasdk.get_security_info(self._format_code(security))
+        return self.source.get_stock_info(security)
 
 
-class FreeOnlineQuotation(Quotation):
+class SnapshotQuotation(Quotation):
     """
-    实时行情
-    """""
+    用全市场快照合成当天的K线: 后台线程每 interval 秒批量获取一次全市场快照(新浪每个请求 800 只股票),
+    由 MinuteBarAggregator 合成所有股票的1分钟K线, 代替逐只股票请求分钟K线.
+    当天之前的历史K线每个股票每个周期每天只从行情源获取一次;
+    当天开盘后才开始合成(缺少开头的K线)、查询历史时间或其他周期时回退到行情源
+    """
+    MINUTE_UNITS = ResampleQuotation.MINUTE_UNITS
 
-    def get_stock_type(self, stock_code: str):
-        return "sh" if is_shanghai(stock_code) else "sz"
+    def __init__(self, source: Quotation, snapshot_source='sina', interval=3):
+        """
+        :param source: 历史K线的行情源
+        :param snapshot_source: easyquotation 快照行情源, 支持 sina / tencent
+        :param interval: 获取快照的间隔(秒)
+        """
+        self.source = source
+        self.snapshot = easyquotation.use(snapshot_source)
+        self.to_columns = SNAPSHOT_COLUMNS[snapshot_source]
+        self.interval = interval
+        self.aggregator = MinuteBarAggregator()
+        # 每个股票每个周期的历史K线, (日期, 获取的数量, DataFrame)
+        self._history = {}
+        self._lock = threading.Lock()
+        self.is_active = True
+        self._thread = threading.Thread(target=self._poll_loop, name='SnapshotQuotation', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.is_active = False
+
+    @staticmethod
+    def stock_rows(df: DataFrame) -> DataFrame:
+        """
+        带市场前缀的快照中股票的行, 索引改为6位代码.
+        与股票代码相同的指数(如上证指数 sh000001 和平安银行 sz000001)只保留股票,
+        市场前缀与 get_stock_type 推断的不同的行是按前缀请求的指数, 丢弃
+        """
+        codes = [code[2:] for code in df.index]
+        keep = np.array([key[:2] == get_stock_type(code) for key, code in zip(df.index, codes)], dtype=bool)
+        df = df[keep]
+        df.index = pd.Index(np.array(codes, dtype=object)[keep], name=df.index.name)
+        return df
 
-    def _format_code(self, code: str) -> str:
-        return "%s%s" % (self.get_stock_type(code), code)
+    def poll(self):
+        """获取一次全市场快照并合成K线"""
+        df = self.stock_rows(self.snapshot.market_snapshot(prefix=True, columnar=True))
+        columns = self.to_columns(df)
+        with self._lock:
+            self.aggregator.update(df.index, columns['time'], columns['price'],
+                                   columns['volume'], columns['amount'])
+
+    def _poll_loop(self):
+        while self.is_active:
+            if is_session_time(datetime.datetime.now()):
+                try:
+                    self.poll()
+                except Exception as e:
+                    print('获取全市场快照失败: %s' % e)
+            time.sleep(self.interval - time.time() % self.interval)
+
+    def _today_bars(self, security) -> DataFrame:
+        with self._lock:
+            if self.aggregator.day != datetime.date.today() or not self.aggregator.is_complete(security):
+                return None
+            return self.aggregator.bars_of(security)
+
+    def _history_bars(self, security, count, unit) -> DataFrame:
+        """当天之前的历史K线, 每天获取一次"""
+        today = datetime.date.today()
+        key = (security, unit)
+        cached = self._history.get(key)
+        if cached is None or cached[0] != today or cached[1] < count:
+            df = self.source.get_bars(security, count, unit=unit,
+                                      end_dt=datetime.datetime.combine(today, datetime.time(0)))
+            df = to_ohlcv(df[pd.DatetimeIndex(df.index) < pd.Timestamp(today)])
+            cached = self._history[key] = (today, count, df)
+        return cached[2]
 
     def get_bars(self, security, count, unit='1d',
                  fields=['date', 'open', 'high', 'low', 'close', 'volume'],
                  include_now=False, end_dt=None) -> DataFrame:
-        df = get_price(self._format_code(security), end_date=end_dt, count=security, frequency=unit)
-        return df
+        today_bars = None
+        if unit in self.MINUTE_UNITS or unit == '1d':
+            today_bars = self._today_bars(security)
+        if today_bars is None or today_bars.empty or (
+                end_dt is not None and pd.Timestamp(end_dt) + pd.Timedelta(minutes=1) < today_bars.index[-1]):
+            return self.source.get_bars(security, count, unit=unit, fields=fields,
+                                        include_now=include_now, end_dt=end_dt)
+
+        if unit == '1d':
+            today_bars = DataFrame({
+                'open': [today_bars['open'].iloc[0]],
+                'high': [today_bars['high'].max()],
+                'low': [today_bars['low'].min()],
+                'close': [today_bars['close'].iloc[-1]],
+                'volume': [today_bars['volume'].sum()],
+            }, index=pd.DatetimeIndex([pd.Timestamp(datetime.date.today())]))
+        elif unit != '1m':
+            today_bars = resample_bars(today_bars, int(unit[:-1]))
+        today_bars = today_bars[BarBuffer.FIELDS]
+        if len(today_bars) >= count:
+            return today_bars.iloc[-count:]
+        history = self._history_bars(security, count - len(today_bars), unit)
+        return pd.concat([history, today_bars]).iloc[-count:]
+
+    def get_all_trade_days(self):
+        return self.source.get_all_trade_days()
+
+    def get_north_money(self, date):
+        return self.source.get_north_money(date)
+
+    def get_stock_info(self, security: str):
+        return self.source.get_stock_info(security)
 
 
 def use_quotation(source: str) -> Quotation:
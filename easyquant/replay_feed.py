@@ -0,0 +1,85 @@
+# coding: utf-8
+import datetime
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from .bar_store import bars_per_day, end_of_day
+from .easydealutils.time import calendar
+
+
+class ReplayFeed:
+    """
+    回测行情回放: 每个股票的K线只在首次用到时获取一次, 之后每一步按截止时间前移游标,
+    用 searchsorted 定位, 返回最近 window 根K线.
+    每一步返回的是这 window 根K线的副本, 策略增加列或原地修改值(fillna(inplace=True) 等)都不会影响预加载的K线和之后的步骤
+    """
+
+    def __init__(self, quotation, unit, start_date, end_date, window=200):
+        """
+        :param quotation: 行情源, Quotation
+        :param unit: K线周期
+        :param start_date: 回测开始日期
+        :param end_date: 回测结束日期
+        :param window: 每一步返回的K线数量
+        """
+        self.quotation = quotation
+        self.unit = unit
+        self.end_dt = end_of_day(end_date)
+        self.window = window
+        # 覆盖回测区间 + 开始前 window 根K线
+        self.count = window + calendar.count(start_date, end_date) * bars_per_day(unit)
+        # 股票代码 -> (K线, 时间 int64 数组), 没有行情的股票为 None
+        self._bars = {}
+        # 股票代码 -> 已回放到的位置(不含)
+        self._cursors = {}
+
+    def preload(self, codes):
+        """通过行情源的批量接口加载还没有加载过的股票"""
+        codes = [code for code in codes if code not in self._bars]
+        if not codes:
+            return
+        bars = self.quotation.get_bars_batch(codes, self.count, unit=self.unit, end_dt=self.end_dt)
+        for code in codes:
+            if code not in bars:
+                print('回放行情：加载 %s 行情失败' % code)
+                # 记为没有行情, 不再重复请求
+                self._bars[code] = None
+                continue
+            df = bars[code].sort_index()
+            self._bars[code] = df, pd.DatetimeIndex(df.index).to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+    def bars(self, code, end_dt: datetime.datetime) -> DataFrame:
+        """截止到 end_dt(含) 的最近 window 根K线"""
+        if code not in self._bars:
+            self.preload([code])
+        return self._advance(code, int(np.datetime64(end_dt, 'ns').view(np.int64)))
+
+    def _advance(self, code, end):
+        loaded = self._bars.get(code)
+        if loaded is None:
+            return None
+        df, times = loaded
+        cursor = self._cursors.get(code, 0)
+        if cursor and times[cursor - 1] > end:
+            # 时间回退, 重新定位
+            cursor = 0
+        cursor += int(np.searchsorted(times[cursor:], end, side='right'))
+        self._cursors[code] = cursor
+        # 只复制 window 根K线, 预加载的K线不会被策略改动
+        return df.iloc[max(cursor - self.window, 0):cursor].copy()
+
+    def fetch(self, codes, end_dt: datetime.datetime):
+        """
+        所有股票截止到 end_dt 的K线
+        :return: dict, 股票代码 -> DataFrame, 没有行情的股票不包含在内
+        """
+        self.preload(codes)
+        end = int(np.datetime64(end_dt, 'ns').view(np.int64))
+        result = {}
+        for code in codes:
+            df = self._advance(code, end)
+            if df is not None and len(df):
+                result[code] = df
+        return result
@@ -0,0 +1,86 @@
+# coding: utf-8
+import numpy as np
+from pandas import DataFrame
+
+NS_PER_DAY = 24 * 3600 * 10 ** 9
+
+
+class Session:
+    """单个股票最近一个交易日在K线中的位置"""
+
+    def __init__(self, start, prev_close):
+        """
+        :param start: 当天第一根K线在K线 DataFrame 中的位置
+        :param prev_close: 上一个交易日最后一根K线的收盘价, 未知时为 nan
+        """
+        self.start = start
+        self.prev_close = prev_close
+
+    def today(self, df: DataFrame) -> DataFrame:
+        """当天的K线, df 与传入 SessionIndex.update 的K线行数相同(可以是计算了指标的 DataFrame)"""
+        return df.iloc[self.start:]
+
+    def first_bar(self, df: DataFrame):
+        """当天第一根K线"""
+        return df.iloc[self.start]
+
+
+class SessionIndex:
+    """
+    按股票维护K线中的日期分界: 每次推送只检查新增的K线, 记录当天第一根K线的绝对序号和前一天的收盘价,
+    策略用整数位置取当天数据, 不需要构造时间字符串或在索引上查找
+    """
+
+    def __init__(self):
+        # 股票代码 -> [已处理的K线总数, 最后一根K线时间(int64), 当天第一根K线的序号, 前收盘价]
+        self._state = {}
+
+    def update(self, code, df: DataFrame) -> Session:
+        """
+        合并一次推送的K线(按时间升序, 可以是滚动窗口)
+        :param code: 股票代码
+        :param df: K线, 索引为时间, 包含 close
+        :return: Session
+        """
+        if df.empty:
+            return Session(0, np.nan)
+        times = df.index.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        closes = df['close'].to_numpy()
+        state = self._state.get(code)
+        new = self._count_new(times, state[1]) if state is not None else None
+        if new is None or new == len(times):
+            # 首次推送, 或与上次推送没有重叠(缺口 / 重新加载), 全量计算
+            state = self._state[code] = self._scan(times, closes)
+        else:
+            total, last_time, start, prev_close = state
+            last_day = last_time // NS_PER_DAY
+            for pos in range(len(times) - new, len(times)):
+                total += 1
+                day = times[pos] // NS_PER_DAY
+                if day != last_day:
+                    start, prev_close = total - 1, closes[pos - 1]
+                    last_day = day
+            state = self._state[code] = [total, int(times[-1]), start, prev_close]
+        total, _, start, prev_close = state
+        return Session(max(start - (total - len(times)), 0), prev_close)
+
+    @staticmethod
+    def _count_new(times, last_time):
+        """最后一根已处理K线之后的K线数量; 上次的最后一根不在本次K线中时返回 None"""
+        n = 0
+        while n < len(times) and times[-1 - n] > last_time:
+            n += 1
+        if n == len(times) or times[-1 - n] != last_time:
+            return None
+        return n
+
+    @staticmethod
+    def _scan(times, closes):
+        days = times // NS_PER_DAY
+        starts = np.flatnonzero(days != days[-1])
+        start = int(starts[-1]) + 1 if len(starts) else 0
+        prev_close = closes[start - 1] if start > 0 else np.nan
+        return [len(times), int(times[-1]), start, prev_close]
+
+    def remove(self, code):
+        self._state.pop(code, None)
@@ -1,5 +1,7 @@
 # coding:utf-8
+import asyncio
 import sys
+import time
 import traceback
 from typing import Dict
 
@@ -7,6 +9,7 @@ from pandas import DataFrame
 
 from ..context import Context
 from ..event_engine import Event
+from ..metrics import metrics
 from easytrader.webtrader import WebTrader
 
 
@@ -20,9 +23,14 @@ class StrategyTemplate:
         self.log = self.log_handler() or log_handler
         self._context: Context = main_engine.context
         self.quotation_engine = main_engine.quotation_engine
+        # 当前处理的行情对应的K线收盘时间戳
+        self._bar_close = None
         self.init()
 
     def on_bar(self, context: Context, data: Dict[str, DataFrame]):
+        """
+        行情推送, 也可以定义为 async def on_bar, 在 AsyncEventEngine 下可以在其中 await 网络 / 数据库操作
+        """
         pass
 
     def init(self):
@@ -68,7 +76,12 @@ class StrategyTemplate:
     def run(self, event):
         try:
             if event.event_type == "bar":
-                self.on_bar(self._context, event.data)
+                self._bar_close = event.bar_close
+                result = self.on_bar(self._context, event.data)
+                if asyncio.iscoroutine(result):
+                    # 同步事件引擎下运行 async def on_bar
+                    asyncio.run(result)
+                self._observe_bar_latency('bar_to_handled')
             else:
                 self.strategy(self._context, event)
         except:
@@ -77,6 +90,34 @@ class StrategyTemplate:
                                                            exc_value,
                                                            exc_traceback)))
 
+    async def run_async(self, event):
+        """
+        AsyncEventEngine 下的事件入口,
+        on_bar 为协程函数时直接在事件循环中等待, 否则放到线程池中执行, 不阻塞其他策略
+        """
+        if not (event.event_type == "bar" and asyncio.iscoroutinefunction(self.on_bar)):
+            await asyncio.get_event_loop().run_in_executor(None, self.run, event)
+            return
+        try:
+            self._bar_close = event.bar_close
+            await self.on_bar(self._context, event.data)
+            self._observe_bar_latency('bar_to_handled')
+        except:
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            self.log.error(repr(traceback.format_exception(exc_type,
+                                                           exc_value,
+                                                           exc_traceback)))
+
+    def mark_signal(self):
+        """
+        策略产生交易信号时调用, 统计K线收盘到产生信号的延迟
+        """
+        self._observe_bar_latency('bar_to_signal')
+
+    def _observe_bar_latency(self, name):
+        if self._bar_close is not None:
+            metrics.observe(name, time.time() - self._bar_close, strategy=self.name)
+
     def clock(self, event):
         """在交易时间会定时推送 clock 事件
         :param event: event.data.clock_event 为 [0.5, 1, 3, 5, 15, 30, 60] 单位为分钟,  ['open', 'close'] 为开市、收市
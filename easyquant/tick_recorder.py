@@ -0,0 +1,313 @@
+# coding: utf-8
+"""
+全市场行情快照录制
+
+按固定间隔调用 easyquotation 的 market_snapshot, 把每次快照追加写入按日分目录的列式文件:
+每个字段一个定长的二进制文件(第 i 条记录在每个文件的第 i 个位置), 另有一个索引文件记录每次快照
+的时间和写完后的记录总数. 读取时直接 np.memmap 映射文件, 不需要解析;
+按时间范围读取时先在索引上二分查找得到记录区间.
+
+目录结构:
+    root/20240102/codes.json   股票代码表, 记录中保存的是代码在表中的下标
+    root/20240102/<字段>.bin   各字段的数据
+    root/20240102/index.bin    [快照时间(ms), 记录总数] int64, 每次快照一条
+"""
+import datetime
+import json
+import os
+import time
+from threading import Thread
+
+import numpy as np
+import pandas as pd
+
+import easyquotation
+
+from .easydealutils import time as etime
+
+LEVELS = 5
+
+# 字段名 -> (类型, 每条记录的元素个数)
+FIELDS = {
+    'code': (np.uint16, 1),
+    'time': ('datetime64[ms]', 1),
+    'price': (np.float32, 1),
+    'volume': (np.int64, 1),
+    'amount': (np.float64, 1),
+    'bid': (np.float32, LEVELS),
+    'bid_volume': (np.int32, LEVELS),
+    'ask': (np.float32, LEVELS),
+    'ask_volume': (np.int32, LEVELS),
+}
+
+INDEX_DTYPE = np.dtype([('time', 'datetime64[ms]'), ('end', np.int64)])
+
+
+def sina_columns(df):
+    """新浪列式快照 -> 录制字段, 新浪的 turnover 为成交量(股), volume 为成交额(元)"""
+    return dict(
+        time=pd.to_datetime(df['date'] + ' ' + df['time'], format='%Y-%m-%d %H:%M:%S'),
+        price=df['now'],
+        volume=df['turnover'],
+        amount=df['volume'],
+        bid=df[['bid%d' % i for i in range(1, LEVELS + 1)]],
+        bid_volume=df[['bid%d_volume' % i for i in range(1, LEVELS + 1)]],
+        ask=df[['ask%d' % i for i in range(1, LEVELS + 1)]],
+        ask_volume=df[['ask%d_volume' % i for i in range(1, LEVELS + 1)]],
+    )
+
+
+def tencent_columns(df):
+    """腾讯列式快照 -> 录制字段, 成交量已换算为股, 成交额已换算为元"""
+    return dict(
+        time=df['datetime'],
+        price=df['now'],
+        volume=df['成交量(手)'],
+        amount=df['成交额(万)'],
+        bid=df[['bid%d' % i for i in range(1, LEVELS + 1)]],
+        bid_volume=df[['bid%d_volume' % i for i in range(1, LEVELS + 1)]],
+        ask=df[['ask%d' % i for i in range(1, LEVELS + 1)]],
+        ask_volume=df[['ask%d_volume' % i for i in range(1, LEVELS + 1)]],
+    )
+
+
+COLUMNS = {
+    'sina': sina_columns,
+    'tencent': tencent_columns,
+    'qq': tencent_columns,
+}
+
+# 录制时段, 收盘后多录一分钟保证拿到收盘快照
+SESSIONS = (
+    (datetime.time(9, 15, 0), datetime.time(11, 31, 0)),
+    (datetime.time(13, 0, 0), datetime.time(15, 1, 0)),
+)
+
+
+def is_session_time(now):
+    """是否在需要获取快照的时段内"""
+    if not etime.is_trade_date(now):
+        return False
+    return any(begin <= now.time() < end for begin, end in SESSIONS)
+
+
+class TickWriter:
+    """单日快照文件的追加写入端, 内存占用只和股票数量有关"""
+
+    def __init__(self, path):
+        """
+        :param path: 当天的目录
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        codes_path = os.path.join(path, 'codes.json')
+        self.codes = []
+        if os.path.exists(codes_path):
+            with open(codes_path, encoding='utf-8') as f:
+                self.codes = json.load(f)
+        self.code_index = {code: i for i, code in enumerate(self.codes)}
+        self.count = self._committed_count()
+        self._files = {}
+        for name in FIELDS:
+            f = open(os.path.join(path, name + '.bin'), 'ab')
+            # 上次异常退出时可能写了一半, 截断到索引记录的位置
+            f.truncate(self.count * self._record_size(name))
+            self._files[name] = f
+        self._index = open(os.path.join(path, 'index.bin'), 'ab')
+        # 每个股票最近一次写入的行情时间, 行情时间没有变化的股票不重复写入
+        self._last_time = np.full(len(self.codes), np.datetime64('NaT'), dtype='datetime64[ms]')
+
+    @staticmethod
+    def _record_size(name):
+        dtype, width = FIELDS[name]
+        return np.dtype(dtype).itemsize * width
+
+    def _committed_count(self):
+        index_path = os.path.join(self.path, 'index.bin')
+        if not os.path.exists(index_path) or os.path.getsize(index_path) < INDEX_DTYPE.itemsize:
+            return 0
+        index = np.memmap(index_path, dtype=INDEX_DTYPE, mode='r')
+        return int(index['end'][-1])
+
+    def _code_ids(self, codes):
+        new_codes = [code for code in codes if code not in self.code_index]
+        if new_codes:
+            for code in new_codes:
+                self.code_index[code] = len(self.codes)
+                self.codes.append(code)
+            tmp_path = os.path.join(self.path, 'codes.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.codes, f)
+            os.replace(tmp_path, os.path.join(self.path, 'codes.json'))
+            self._last_time = np.concatenate([
+                self._last_time, np.full(len(new_codes), np.datetime64('NaT'), dtype='datetime64[ms]')
+            ])
+        return np.array([self.code_index[code] for code in codes], dtype=np.uint16)
+
+    def append(self, columns, codes, snapshot_time=None):
+        """
+        追加一次快照
+        :param columns: dict, 字段名 -> 列数据(Series / DataFrame), 见 sina_columns
+        :param codes: 股票代码, 与列数据的行一一对应
+        :param snapshot_time: 快照时间, 默认当前时间
+        :return: 写入的记录数
+        """
+        ids = self._code_ids(list(codes))
+        data = {'code': ids}
+        for name, (dtype, width) in FIELDS.items():
+            if name == 'code':
+                continue
+            values = np.asarray(columns[name])
+            if dtype != 'datetime64[ms]':
+                values = np.nan_to_num(values.astype(np.float64, copy=False))
+            data[name] = values.astype(dtype).reshape(len(ids), width) if width > 1 else values.astype(dtype)
+        # 只写入行情时间有更新的股票
+        changed = data['time'] != self._last_time[ids]
+        self._last_time[ids[changed]] = data['time'][changed]
+        n = int(changed.sum())
+        for name, f in self._files.items():
+            f.write(np.ascontiguousarray(data[name][changed]).tobytes())
+            f.flush()
+        self.count += n
+        # 数据写完后再写索引, 索引是提交点
+        entry = np.array([(np.datetime64(snapshot_time or datetime.datetime.now(), 'ms'), self.count)],
+                         dtype=INDEX_DTYPE)
+        self._index.write(entry.tobytes())
+        self._index.flush()
+        return n
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._index.close()
+
+
+class TickStore:
+    """录制文件的读取端, 返回 np.memmap 视图, 不复制也不解析数据"""
+
+    def __init__(self, root='ticks'):
+        """
+        :param root: 录制文件根目录
+        """
+        self.root = root
+
+    def days(self):
+        """已录制的日期列表, YYYYMMDD"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.isfile(os.path.join(self.root, d, 'index.bin')))
+
+    def path(self, day):
+        if isinstance(day, (datetime.date, datetime.datetime)):
+            day = day.strftime('%Y%m%d')
+        return os.path.join(self.root, day)
+
+    def writer(self, day) -> TickWriter:
+        return TickWriter(self.path(day))
+
+    def codes(self, day):
+        with open(os.path.join(self.path(day), 'codes.json'), encoding='utf-8') as f:
+            return json.load(f)
+
+    def index(self, day):
+        """快照索引, 结构化数组 [('time', 快照时间), ('end', 写完该快照后的记录总数)]"""
+        path = os.path.join(self.path(day), 'index.bin')
+        if os.path.getsize(path) < INDEX_DTYPE.itemsize:
+            return np.empty(0, dtype=INDEX_DTYPE)
+        return np.memmap(path, dtype=INDEX_DTYPE, mode='r')
+
+    def read(self, day, start=None, end=None):
+        """
+        读取一天中快照时间在 [start, end) 内的记录
+        :param day: 日期, YYYYMMDD 或 datetime.date
+        :param start: datetime.datetime, 默认从头开始
+        :param end: datetime.datetime, 默认到最后
+        :return: dict, 字段名 -> np.memmap 视图; 'code' 为 codes(day) 中的下标
+        """
+        index = self.index(day)
+        first, last = 0, int(index['end'][-1]) if len(index) else 0
+        if start is not None:
+            pos = int(np.searchsorted(index['time'], np.datetime64(start, 'ms'), side='left'))
+            first = int(index['end'][pos - 1]) if pos > 0 else 0
+        if end is not None:
+            pos = int(np.searchsorted(index['time'], np.datetime64(end, 'ms'), side='left'))
+            last = int(index['end'][pos - 1]) if pos > 0 else 0
+        last = max(first, last)
+        result = {}
+        for name, (dtype, width) in FIELDS.items():
+            path = os.path.join(self.path(day), name + '.bin')
+            shape = (last, width) if width > 1 else (last,)
+            if last == 0:
+                result[name] = np.empty(shape, dtype=dtype)[first:]
+                continue
+            result[name] = np.memmap(path, dtype=dtype, mode='r', shape=shape)[first:last]
+        return result
+
+    def frame(self, day, start=None, end=None) -> pd.DataFrame:
+        """读取为 DataFrame, 价格 / 量只取第一档盘口, 便于查看"""
+        data = self.read(day, start, end)
+        codes = np.array(self.codes(day), dtype=object) if len(data['code']) else np.empty(0, dtype=object)
+        return pd.DataFrame(dict(
+            code=codes[data['code']], time=data['time'], price=data['price'],
+            volume=data['volume'], amount=data['amount'],
+            bid1=data['bid'][:, 0], bid1_volume=data['bid_volume'][:, 0],
+            ask1=data['ask'][:, 0], ask1_volume=data['ask_volume'][:, 0],
+        ))
+
+
+class TickRecorder:
+    """按固定间隔录制全市场行情快照"""
+
+    def __init__(self, root='ticks', source='sina', interval=3):
+        """
+        :param root: 录制文件根目录
+        :param source: easyquotation 行情源, 支持 sina / tencent
+        :param interval: 录制间隔(秒)
+        """
+        if source not in COLUMNS:
+            raise ValueError('不支持的行情源: %s' % source)
+        self.store = TickStore(root)
+        self.quotation = easyquotation.use(source)
+        self.to_columns = COLUMNS[source]
+        self.interval = interval
+        self.is_active = True
+        self._writer = None
+        self._day = None
+        self.thread = Thread(target=self.run, name='TickRecorder')
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.is_active = False
+
+    def record(self, now=None):
+        """录制一次快照, 返回写入的记录数"""
+        now = now or datetime.datetime.now()
+        day = now.strftime('%Y%m%d')
+        if day != self._day:
+            if self._writer is not None:
+                self._writer.close()
+            self._writer, self._day = self.store.writer(day), day
+        df = self.quotation.market_snapshot(prefix=True, columnar=True)
+        return self._writer.append(self.to_columns(df), df.index, now)
+
+    def run(self):
+        while self.is_active:
+            now = datetime.datetime.now()
+            if is_session_time(now):
+                try:
+                    start = time.time()
+                    n = self.record(now)
+                    print('录制快照 %s: %d 条, 耗时 %.3fs' % (now.strftime('%H:%M:%S'), n, time.time() - start))
+                except Exception as e:
+                    print('录制快照失败: %s' % e)
+            # 对齐到整 interval 秒
+            time.sleep(self.interval - time.time() % self.interval)
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+if __name__ == '__main__':
+    TickRecorder().start()
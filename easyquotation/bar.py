@@ -1,22 +1,36 @@
-import json, requests, datetime
+import json, datetime
 import pandas as pd  #
+from . import session
+from .source_manager import SourceManager
+
+
+# 与新浪一致的列顺序, 腾讯和新浪在 get_price 中互为对冲, 返回的数据需要同样的格式
+SINA_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
 
 
 # 腾讯日线
-def get_price_day_tx(code, end_date='', count=10, frequency='1d'):  # 日线获取
+def get_price_day_tx(code, end_date='', count=10, frequency='1d', fq='qfq'):  # 日线获取, fq='qfq'前复权, ''不复权
     unit = 'week' if frequency in '1w' else 'month' if frequency in '1M' else 'day'  # 判断日线，周线，月线
     if end_date:
         end_date = end_date.strftime('%Y-%m-%d') if isinstance(end_date, datetime.date) else end_date.split(' ')[0]
     end_date = '' if end_date == datetime.datetime.now().strftime('%Y-%m-%d') else end_date  # 如果日期今天就变成空
-    URL = f'http://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param={code},{unit},,{end_date},{count},qfq'
-    st = json.loads(requests.get(URL).content)
+    URL = f'http://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param={code},{unit},,{end_date},{count},{fq}'
+    st = json.loads(session.get(URL).content)
     ms = 'qfq' + unit
     stk = st['data'][code]
     buf = stk[ms] if ms in stk else stk[unit]  # 指数返回不是qfqday,是day
-    df = pd.DataFrame(buf, columns=['trade_date', 'open', 'close', 'high', 'low', 'volume'], dtype='float')
+    buf = [row[:6] for row in buf]  # 除权日的行后面带有分红信息
+    df = pd.DataFrame(buf, columns=['time', 'open', 'close', 'high', 'low', 'volume'])
+    df[['open', 'close', 'high', 'low', 'volume']] = df[['open', 'close', 'high', 'low', 'volume']].astype('float')
+    df['volume'] *= 100  # 腾讯成交量单位为手, 统一为股(与新浪一致)
     df.time = pd.to_datetime(df.time)
-    df.set_index(['trade_date'], inplace=True)
-    return df
+    df.set_index(['time'], inplace=True)
+    df.index.name = ''  # 处理索引
+    return df[SINA_COLUMNS]
+
+
+def get_price_day_tx_unadjusted(code, end_date='', count=10, frequency='1d'):  # 腾讯不复权日线, 与新浪对冲
+    return get_price_day_tx(code, end_date=end_date, count=count, frequency=frequency, fq='')
 
 
 # 腾讯分钟线
@@ -25,16 +39,17 @@ def get_price_min_tx(code, end_date=None, count=10, frequency='1d'):  # 分钟
     if end_date: 
         end_date = end_date.strftime('%Y-%m-%d') if isinstance(end_date, datetime.date) else end_date.split(' ')[0]
     URL = f'http://ifzq.gtimg.cn/appstock/app/kline/mkline?param={code},m{ts},,{count}'
-    st = json.loads(requests.get(URL).content)
+    st = json.loads(session.get(URL).content)
     buf = st['data'][code]['m' + str(ts)]
     df = pd.DataFrame(buf, columns=['time', 'open', 'close', 'high', 'low', 'volume', 'n1', 'n2'])
     df = df[['time', 'open', 'close', 'high', 'low', 'volume']]
     df[['open', 'close', 'high', 'low', 'volume']] = df[['open', 'close', 'high', 'low', 'volume']].astype('float')
+    df['volume'] *= 100  # 腾讯成交量单位为手, 统一为股(与新浪一致)
     df.time = pd.to_datetime(df.time)
     df.set_index(['time'], inplace=True)
     df.index.name = ''  # 处理索引
-    df['close'][-1] = float(st['data'][code]['qt'][code][3])  # 最新基金数据是3位的
-    return df
+    df.iloc[-1, df.columns.get_loc('close')] = float(st['data'][code]['qt'][code][3])  # 最新基金数据是3位的
+    return df[SINA_COLUMNS]
 
 
 # sina新浪全周期获取函数，分钟线 5m,15m,30m,60m  日线1d=240m   周线1w=1200m  1月=7200m
@@ -48,7 +63,7 @@ def get_price_sina(code, end_date='', count=10, frequency='60m'):  # 新浪全
         count = count + (datetime.datetime.now() - end_date).days // unit  # 结束时间到今天有多少天自然日(肯定 >交易日)
         print(code, end_date, count)
     URL = f'http://money.finance.sina.com.cn/quotes_service/api/json_v2.php/CN_MarketData.getKLineData?symbol={code}&scale={ts}&ma=5&datalen={count}'
-    dstr = json.loads(requests.get(URL).content)
+    dstr = json.loads(session.get(URL).content)
     df = pd.DataFrame(dstr, columns=['day', 'open', 'high', 'low', 'close', 'volume'], dtype='float')
     df.day = pd.to_datetime(df.day)
     df.set_index(['day'], inplace=True)
@@ -58,22 +73,23 @@ def get_price_sina(code, end_date='', count=10, frequency='60m'):  # 新浪全
     return df
 
 
+# 各行情源的延迟统计 / 对冲 / 熔断
+source_manager = SourceManager()
+
+
 def get_price(code, end_date='', count=10, frequency='1d', fields=[]):  # 对外暴露只有唯一函数，这样对用户才是最友好的
     xcode = code.replace('.XSHG', '').replace('.XSHE', '')  # 证券代码编码兼容处理
     xcode = 'sh' + xcode if ('XSHG' in code) else 'sz' + xcode if ('XSHE' in code) else code
 
     if frequency in ['1d', '1w', '1M']:  # 1d日线  1w周线  1M月线
-        try:
-            return get_price_sina(xcode, end_date=end_date, count=count, frequency=frequency)  # 主力
-        except:
-            return get_price_day_tx(xcode, end_date=end_date, count=count, frequency=frequency)  # 备用
+        # 新浪 / 腾讯 按延迟选择, 慢请求对冲到另一个源; 新浪日线不复权, 腾讯也取不复权, 两个源的结果可以互换
+        return source_manager.call([('sina', get_price_sina), ('tencent', get_price_day_tx_unadjusted)],
+                                   xcode, end_date=end_date, count=count, frequency=frequency)
 
     if frequency in ['1m', '5m', '15m', '30m', '60m']:  # 分钟线 ,1m只有腾讯接口  5分钟5m   60分钟60m
         if frequency in '1m': return get_price_min_tx(xcode, end_date=end_date, count=count, frequency=frequency)
-        try:
-            return get_price_sina(xcode, end_date=end_date, count=count, frequency=frequency)  # 主力
-        except:
-            return get_price_min_tx(xcode, end_date=end_date, count=count, frequency=frequency)  # 备用
+        return source_manager.call([('sina', get_price_sina), ('tencent', get_price_min_tx)],
+                                   xcode, end_date=end_date, count=count, frequency=frequency)
 
 
 if __name__ == '__main__':
@@ -1,18 +1,21 @@
 # coding:utf8
 import abc
 import json
-import multiprocessing.pool
 import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from . import helpers
+from . import helpers, throttle
 
 
 class BaseQuotation(metaclass=abc.ABCMeta):
     """行情获取基类"""
 
     max_num = 800  # 每次请求的最大股票数
+    max_workers = 8  # 同时进行的请求数
+    timeout = (3.05, 10)  # 每个请求的 (连接超时, 读取超时), 单位秒
 
     @property
     @abc.abstractmethod
@@ -24,6 +27,14 @@ class BaseQuotation(metaclass=abc.ABCMeta):
 
     def __init__(self):
         self._session = requests.session()
+        adapter = HTTPAdapter(pool_maxsize=self.max_workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        # 常驻的请求线程池, 每次获取行情不再重新创建线程
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix=type(self).__name__,
+        )
         stock_codes = self.load_stock_codes()
         self.stock_list = self.gen_stock_list(stock_codes)
 
@@ -81,12 +92,14 @@ class BaseQuotation(metaclass=abc.ABCMeta):
         stock_list = self.gen_stock_list(stock_codes)
         return self.get_stock_data(stock_list, prefix=prefix, **kwargs)
 
-    def market_snapshot(self, prefix=False):
+    def market_snapshot(self, prefix=False, **kwargs):
         """return all market quotation snapshot
         :param prefix: if prefix is True, return quotation dict's  stock_code
              key start with sh/sz market flag
+        :param kwargs: passed to format_response_data, e.g. columnar=True
+             for sina / tencent returns a DataFrame indexed by stock_code
         """
-        return self.get_stock_data(self.stock_list, prefix=prefix)
+        return self.get_stock_data(self.stock_list, prefix=prefix, **kwargs)
 
     def get_stocks_by_range(self, params):
         headers = {
@@ -98,7 +111,9 @@ class BaseQuotation(metaclass=abc.ABCMeta):
             ),
         }
 
-        r = self._session.get(self.stock_api + params, headers=headers)
+        url = self.stock_api + params
+        with throttle.limit(url):
+            r = self._session.get(url, headers=headers, timeout=self.timeout)
         return r.text
 
     def get_stock_data(self, stock_list, **kwargs):
@@ -106,14 +121,53 @@ class BaseQuotation(metaclass=abc.ABCMeta):
         res = self._fetch_stock_data(stock_list)
         return self.format_response_data(res, **kwargs)
 
-    def _fetch_stock_data(self, stock_list):
-        """获取股票信息"""
-        pool = multiprocessing.pool.ThreadPool(len(stock_list))
+    def iter_stock_data(self, stock_list, **kwargs):
+        """按请求完成的先后逐批返回格式化后的股票信息, 请求失败或超时的批次会被跳过
+        :param stock_list: gen_stock_list 生成的请求列表
+        :return: generator, 每次返回一批请求的 {股票代码: 行情}
+        """
+        futures = {
+            self._executor.submit(self.get_stocks_by_range, stock): stock
+            for stock in stock_list
+        }
         try:
-            res = pool.map(self.get_stocks_by_range, stock_list)
+            for future in as_completed(futures):
+                try:
+                    resp = future.result()
+                except requests.RequestException as e:
+                    warnings.warn("fetch %s failed: %s" % (futures[future][:20], e))
+                    continue
+                if resp is None:
+                    continue
+                yield self.format_response_data(
+                    [self._with_request(futures[future], resp)], **kwargs
+                )
         finally:
-            pool.close()
-        return [d for d in res if d is not None]
+            # 提前结束迭代时取消还没开始的请求
+            for future in futures:
+                future.cancel()
+
+    def iter_market_snapshot(self, prefix=False, **kwargs):
+        """逐批返回全市场行情, 见 iter_stock_data"""
+        return self.iter_stock_data(self.stock_list, prefix=prefix, **kwargs)
+
+    def _fetch_stock_data(self, stock_list):
+        """获取股票信息"""
+        res = self._executor.map(self.get_stocks_by_range, stock_list)
+        return [
+            self._with_request(stock, d)
+            for stock, d in zip(stock_list, res)
+            if d is not None
+        ]
+
+    def _with_request(self, stock, resp):
+        """把请求参数附加到返回数据上, 供 format_response_data 使用, 默认只保留返回数据"""
+        return resp
+
+    def close(self):
+        """关闭请求线程池和连接"""
+        self._executor.shutdown(wait=False)
+        self._session.close()
 
     def format_response_data(self, rep_data, **kwargs):
         pass
@@ -0,0 +1,61 @@
+# coding:utf8
+"""
+全市场行情解析耗时对比: 逐只股票 dict 解析 vs 列式 DataFrame 解析
+
+用法: python -m easyquotation.benchmark [股票数量] [重复次数]
+"""
+import random
+import sys
+import timeit
+
+from .sina import Sina
+from .tencent import Tencent
+
+
+def sina_payload(n):
+    """模拟新浪全市场行情返回, 每 800 只股票一个请求"""
+    lines = []
+    for i in range(n):
+        code = "sh%06d" % (600000 + i) if i % 2 else "sz%06d" % i
+        price = round(random.uniform(2, 200), 2)
+        fields = ["股票%d" % i] + ["%.2f" % price] * 7 + [str(random.randint(1, 10 ** 8)),
+                                                         "%.2f" % (price * 10 ** 6)]
+        for _ in range(10):
+            fields += [str(random.randint(100, 10 ** 6)), "%.2f" % price]
+        fields += ["2024-01-02", "15:00:00", "00"]
+        lines.append('var hq_str_%s="%s";' % (code, ",".join(fields)))
+    return ["\n".join(lines[i:i + Sina.max_num]) for i in range(0, n, Sina.max_num)]
+
+
+def tencent_payload(n):
+    """模拟腾讯全市场行情返回, 每 60 只股票一个请求"""
+    lines = []
+    for i in range(n):
+        market, code = ("sh", "%06d" % (600000 + i)) if i % 2 else ("sz", "%06d" % i)
+        price = round(random.uniform(2, 200), 2)
+        fields = ["1", "股票%d" % i, code] + ["%.2f" % price] * 3 + [str(random.randint(1, 10 ** 6))] * 3
+        for _ in range(10):
+            fields += ["%.2f" % price, str(random.randint(1, 10 ** 4))]
+        fields += ["", "20240102150000", "0.10", "1.00", "%.2f" % price, "%.2f" % price,
+                   "%.2f/1/1" % price, str(random.randint(1, 10 ** 6)), "12345.6", "0.5",
+                   "12.3", "", "%.2f" % price, "%.2f" % price, "1.2", "100.5", "120.8",
+                   "1.5", "%.2f" % (price * 1.1), "%.2f" % (price * 0.9), "1.01",
+                   "-100", "%.2f" % price, "13.2", "12.8"]
+        lines.append('v_%s%s="%s~";' % (market, code, "~".join(fields)))
+    return ["\n".join(lines[i:i + Tencent.max_num]) for i in range(0, n, Tencent.max_num)]
+
+
+def run(n=5000, repeat=10):
+    for cls, payload in ((Sina, sina_payload(n)), (Tencent, tencent_payload(n))):
+        quotation = cls.__new__(cls)  # 不需要加载股票代码和网络连接
+        for columnar in (False, True):
+            seconds = timeit.timeit(
+                lambda: quotation.format_response_data(payload, columnar=columnar),
+                number=repeat,
+            ) / repeat
+            print("%-8s %5d stocks  %-8s %8.2f ms" % (
+                cls.__name__, n, "columnar" if columnar else "dict", seconds * 1000))
+
+
+if __name__ == "__main__":
+    run(*[int(arg) for arg in sys.argv[1:3]])
@@ -1,7 +1,11 @@
 # coding:utf8
+import csv
+import io
 import json
 import os
 import re
+
+import pandas as pd
 import requests
 
 STOCK_CODE_PATH = os.path.join(os.path.dirname(__file__), "stock_codes.conf")
@@ -39,3 +43,30 @@ def get_stock_type(stock_code):
         return stock_code[:2]
     else:
         return "sh" if stock_code.startswith(sh_head) else "sz"
+
+
+def read_records(records, sep, names, dtype=None):
+    """把多行 '代码<sep>字段1<sep>字段2...' 文本一次性解析为 DataFrame
+    由 pandas 的 C 解析器直接写入列数组, 不为每个字段创建 Python 对象
+    :param records: list of str, 每行一个股票, 第一个字段为股票代码
+    :param sep: 字段分隔符
+    :param names: 列名, 只解析前 len(names) 个字段, 多出的字段忽略, 缺少的字段为 NaN
+    :param dtype: 列名 -> 类型, 第一列固定为 str
+    :return DataFrame, 以第一列(股票代码)为索引"""
+    if not records:
+        return pd.DataFrame(columns=names[1:], index=pd.Index([], name=names[0]))
+    # 股票代码保持字符串, 不能解析为数字
+    dtype = dict(dtype or {}, **{names[0]: str})
+    return pd.read_csv(
+        io.StringIO("\n".join(records)),
+        sep=sep,
+        header=None,
+        names=names,
+        usecols=range(len(names)),
+        index_col=0,
+        dtype=dtype,
+        quoting=csv.QUOTE_NONE,
+        keep_default_na=False,
+        na_values=[""],
+        engine="c",
+    )
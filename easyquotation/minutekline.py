@@ -4,46 +4,91 @@
 url = "https://ifzq.gtimg.cn/appstock/app/kline/mkline?param=sz002230,m30,,320&_var=m30_today&r=0.42616245339179404"
 """
 
-import re
 import json
+
+import numpy as np
+
 from . import basequotation, helpers
 
 
 class MinuteTimeKline(basequotation.BaseQuotation):
-    """腾讯免费行情获取"""
+    """
+    腾讯免费分钟K线获取.
+    mkline 接口每个请求只接受一个 param, 多个股票不能合并到一个请求里: 批量获取仍是每个股票一个请求,
+    由常驻线程池最多 max_workers 个同时发出(并发, 不是合并). 整个自选股列表的1分钟K线用快照合成更省请求
+    """
 
-    max_num = 80
+    max_num = 1
+    max_workers = 16
+    count = 320  # 每个股票获取的K线数量
     minute = 5
 
+    # K线每行的字段: [时间, 开, 收, 高, 低, 成交量(手), ...]
+    columns = ("open", "close", "high", "low", "volume")
+
     @property
     def stock_api(self) -> str:
         return "https://ifzq.gtimg.cn/appstock/app/kline/mkline?param="
 
-    def real(self, stock_codes, prefix=False, **kwargs):
-        if "max_num" in kwargs:
-            self.max_num = kwargs["max_num"]
+    def real(self, stock_codes, prefix=False, minute=None, count=None, **kwargs):
+        """
+        :param stock_codes: 股票代码或列表
+        :param minute: K线周期(分钟), 1 / 5 / 15 / 30 / 60
+        :param count: 每个股票获取的K线数量, 兼容旧参数 max_num
+        :param arrays: 为 True 时每个股票返回 dict of np.ndarray, 见 format_response_data
+        """
+        if not isinstance(stock_codes, list):
+            stock_codes = [stock_codes]
+        minute = minute or self.minute
+        count = count or kwargs.pop("max_num", None) or self.count
+        stock_list = [self._param(code, minute, count) for code in stock_codes]
+        return self.get_stock_data(stock_list, prefix=prefix, minute=minute, count=count, **kwargs)
 
-        if "minute" in kwargs:
-            self.minute = kwargs["minute"]
+    def bars(self, stock_codes, minute=None, count=None, prefix=False):
+        """
+        批量获取多个股票的分钟K线
+        :return: dict, 股票代码 -> {'time': datetime64[m], 'open' / 'close' / 'high' / 'low': float64,
+            'volume': float64(股)}
+        """
+        return self.real(stock_codes, prefix=prefix, minute=minute, count=count, arrays=True)
 
-        return super().real(stock_codes, prefix=prefix, **kwargs)
+    @staticmethod
+    def _param(code, minute, count):
+        return "%s%s,m%d,,%d" % (helpers.get_stock_type(code), code[-6:], minute, count)
 
     def _gen_stock_prefix(self, stock_codes):
-        return [
-            '%s%s,m%d,,%d&_var=m%d_today&r=0.42616245339179404' %
-            (helpers.get_stock_type(code), code[-6:], self.minute, self.max_num, self.minute)
-            for code in stock_codes
-        ]
+        return [self._param(code, self.minute, self.count) for code in stock_codes]
 
-    def format_response_data(self, rep_data, **kwargs):
+    def format_response_data(self, rep_data, prefix=False, minute=None, count=None, arrays=False, **kwargs):
+        minute = minute or self.minute
+        count = count or self.count
+        key = "m%d" % minute
         stock_dict = dict()
-        _var = 'm%d_today=' % self.minute
-        prefix = kwargs["prefix"] if kwargs["prefix"] in kwargs else False
         for stock_detail in rep_data:
-            # pylint: disable=line-too-long
-            # res like ['min_data="', 'date:180413', '0930 11.64 29727', '0931 11.65 52410']
-            stock_detail = stock_detail.replace(_var, '')
-            result = json.loads(stock_detail)['data']
+            # 兼容带 _var=mX_today 的 JS 返回
+            stock_detail = stock_detail[stock_detail.index("{"):]
+            result = json.loads(stock_detail)["data"]
             for code in result:
-                stock_dict[code if prefix else code[2:]] = result[code]['m%d' % self.minute]
+                rows = result[code].get(key)
+                if not isinstance(rows, list):
+                    continue
+                # 接口返回的K线可能多于请求的数量
+                rows = rows[-count:]
+                stock_code = code if prefix else code[2:]
+                stock_dict[stock_code] = self._to_arrays(rows) if arrays else rows
         return stock_dict
+
+    def _to_arrays(self, rows):
+        table = np.array([row[:6] for row in rows], dtype=object).reshape(-1, 6)
+        times = table[:, 0].astype(str)
+        data = {
+            "time": np.array(
+                ["%s-%s-%sT%s:%s" % (t[:4], t[4:6], t[6:8], t[8:10], t[10:12]) for t in times],
+                dtype="datetime64[m]",
+            )
+        }
+        for index, name in enumerate(self.columns, start=1):
+            data[name] = table[:, index].astype(np.float64)
+        # 成交量单位为手
+        data["volume"] *= 100
+        return data
@@ -0,0 +1,67 @@
+# coding:utf8
+"""
+行情接口共用的 HTTP 会话
+
+所有请求共用一个 requests.Session, 按 host 保持长连接池, 避免每次请求重新建立 TCP 连接;
+urllib3 连接池是线程安全的, 可以在多个线程中同时使用
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import throttle
+
+# (连接超时, 读取超时), 单位秒
+DEFAULT_TIMEOUT = (3.05, 10)
+# 缓存的 host 连接池数量
+POOL_CONNECTIONS = 16
+# 每个 host 连接池的最大连接数
+POOL_MAXSIZE = 32
+
+DEFAULT_HEADERS = {
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/54.0.2840.100 "
+        "Safari/537.36"
+    ),
+}
+
+_session = None
+_lock = threading.Lock()
+
+
+def _new_session(pool_connections, pool_maxsize):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+def configure(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE):
+    """重新设置连接池大小, 原有连接会被关闭"""
+    global _session
+    with _lock:
+        old_session = _session
+        _session = _new_session(pool_connections, pool_maxsize)
+    if old_session is not None:
+        old_session.close()
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _new_session(POOL_CONNECTIONS, POOL_MAXSIZE)
+    return _session
+
+
+def get(url, timeout=DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+    """通过共用会话发送 GET 请求, 默认带连接 / 读取超时, 受 host 限流控制"""
+    with throttle.limit(url):
+        return get_session().get(url, timeout=timeout, **kwargs)
@@ -2,7 +2,7 @@
 import re
 import time
 
-from . import basequotation
+from . import basequotation, helpers
 
 
 class Sina(basequotation.BaseQuotation):
@@ -20,12 +20,26 @@ class Sina(basequotation.BaseQuotation):
     del_null_data_stock = re.compile(
         r"(\w{2}\d+)=\"\";"
     )
+    grep_record = re.compile(r"hq_str_(\w{2})(\d+)=\"([^\"]+)\"")
+    # 列式解析的字段, 顺序与接口返回一致
+    columns = (
+        ["name", "open", "close", "now", "high", "low", "buy", "sell",
+         "turnover", "volume"]
+        + [f"bid{i}{f}" for i in range(1, 6) for f in ("_volume", "")]
+        + [f"ask{i}{f}" for i in range(1, 6) for f in ("_volume", "")]
+        + ["date", "time"]
+    )
+    int_columns = ["turnover"] + [
+        f"{side}{i}_volume" for side in ("bid", "ask") for i in range(1, 6)
+    ]
 
     @property
     def stock_api(self) -> str:
         return f"http://hq.sinajs.cn/rn={int(time.time() * 1000)}&list="
 
-    def format_response_data(self, rep_data, prefix=False):
+    def format_response_data(self, rep_data, prefix=False, columnar=False):
+        if columnar:
+            return self.format_response_columnar(rep_data, prefix=prefix)
         stocks_detail = "".join(rep_data)
         stocks_detail = self.del_null_data_stock.sub('', stocks_detail)
         stocks_detail = stocks_detail.replace(' ', '')
@@ -69,3 +83,17 @@ class Sina(basequotation.BaseQuotation):
                 time=stock[32],
             )
         return stock_dict
+
+    def format_response_columnar(self, rep_data, prefix=False):
+        """列式解析: 返回以股票代码为索引的 DataFrame, 列与 format_response_data 的字段相同,
+        价格为 float64, 成交量为 int64"""
+        records = [
+            (market + code if prefix else code) + "," + detail
+            for market, code, detail in self.grep_record.findall("".join(rep_data))
+        ]
+        dtype = {name: "float64" for name in self.columns}
+        dtype.update(name=str, date=str, time=str)
+        df = helpers.read_records(records, ",", ["code"] + self.columns, dtype=dtype)
+        df["name"] = df["name"].str.replace(" ", "")
+        df[self.int_columns] = df[self.int_columns].fillna(0).astype("int64")
+        return df
@@ -0,0 +1,176 @@
+# coding:utf8
+"""
+多行情源调度
+
+按各行情源最近的延迟和错误率选择最快的可用源; 首选源在其 p95 延迟内没有返回时, 向下一个源发出对冲请求,
+先成功返回的结果生效; 连续失败(包括超时)的源被熔断一段时间, 期间不再请求
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+
+class SourceStats:
+    """单个行情源的滚动统计和熔断状态"""
+
+    def __init__(self, name, window=100, failure_threshold=3, cooldown=30):
+        """
+        :param name: 行情源名称
+        :param window: 统计最近多少次请求
+        :param failure_threshold: 连续失败多少次后熔断
+        :param cooldown: 熔断时长(秒), 之后放行一次试探请求, 成功则恢复
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latencies = deque(maxlen=window)
+        self.results = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.results.append(ok)
+            if ok:
+                self.latencies.append(latency)
+                self.consecutive_failures = 0
+                self.open_until = 0.0
+            else:
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= self.failure_threshold:
+                    self.open_until = time.time() + self.cooldown
+            self._trial = False
+
+    def percentile(self, q):
+        """成功请求的延迟分位数, 没有数据时返回 None"""
+        with self._lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+    @property
+    def error_rate(self):
+        with self._lock:
+            if not self.results:
+                return 0.0
+            return 1 - sum(self.results) / len(self.results)
+
+    def available(self):
+        """熔断中返回 False; 熔断到期后只放行一个试探请求"""
+        with self._lock:
+            if self.open_until == 0.0:
+                return True
+            if time.time() < self.open_until or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def snapshot(self):
+        return dict(name=self.name, p50=self.percentile(0.5), p95=self.percentile(0.95),
+                    p99=self.percentile(0.99), error_rate=self.error_rate,
+                    open=self.open_until > time.time())
+
+
+class SourceManager:
+    """按延迟选择行情源, 对冲慢请求, 熔断连续失败的源"""
+
+    def __init__(self, hedge_delay=1.0, min_hedge_delay=0.05, max_workers=16, **stats_options):
+        """
+        :param hedge_delay: 首选源还没有延迟数据时, 等待多久(秒)发出对冲请求
+        :param min_hedge_delay: 对冲等待时间下限(秒), 避免对很快的源也频繁对冲
+        :param max_workers: 请求线程数
+        :param stats_options: 传给 SourceStats 的参数
+        """
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.stats_options = stats_options
+        self.sources = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='SourceManager')
+
+    def stats(self, name) -> SourceStats:
+        stats = self.sources.get(name)
+        if stats is None:
+            with self._lock:
+                stats = self.sources.setdefault(name, SourceStats(name, **self.stats_options))
+        return stats
+
+    def rank(self, names):
+        """
+        按健康状况和 p50 延迟排序, 熔断中的源排在最后; 没有延迟数据的源保持传入顺序排在前面
+        """
+        def key(item):
+            index, name = item
+            stats = self.stats(name)
+            p50 = stats.percentile(0.5)
+            return (stats.open_until > time.time(), stats.error_rate >= 0.5,
+                    p50 is not None, p50 or 0, index)
+        return [name for _, name in sorted(enumerate(names), key=key)]
+
+    def _hedge_delay(self, name):
+        p95 = self.stats(name).percentile(0.95)
+        if p95 is None:
+            return self.hedge_delay
+        return max(p95, self.min_hedge_delay)
+
+    def _submit(self, name, func, args, kwargs):
+        stats = self.stats(name)
+        start = time.time()
+
+        def run():
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                stats.record(time.time() - start, False)
+                raise
+            stats.record(time.time() - start, True)
+            return result
+
+        return self._executor.submit(run)
+
+    def call(self, sources, *args, **kwargs):
+        """
+        请求多个行情源中的一个, 返回最先成功的结果
+        :param sources: [(行情源名称, 请求函数)], 各函数参数相同
+        :return: 请求函数的返回值; 全部失败时抛出最后一个异常
+        """
+        funcs = dict(sources)
+        names = self.rank([name for name, _ in sources])
+        pending = {}
+        error = None
+        for position, name in enumerate(names):
+            last = position == len(names) - 1
+            # 熔断中的源跳过, 但所有源都熔断时仍要请求最后一个
+            if not self.stats(name).available() and not (last and not pending):
+                continue
+            pending[self._submit(name, funcs[name], args, kwargs)] = name
+            delay = None if last else self._hedge_delay(name)
+            deadline = None if delay is None else time.time() + delay
+            # 等到首个成功结果, 或者等待超过对冲时间 / 当前请求都失败后再请求下一个源
+            while pending:
+                timeout = None if deadline is None else max(0.0, deadline - time.time())
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    pending.pop(future)
+                    if future.exception() is None:
+                        return future.result()
+                    error = future.exception()
+        # 最后一个源已发出, 等待剩下的请求
+        for future in as_completed(pending):
+            try:
+                return future.result()
+            except Exception as e:
+                error = e
+        if error is None:
+            raise RuntimeError('没有可用的行情源: %s' % ', '.join(names))
+        raise error
+
+    def snapshot(self):
+        """各行情源的延迟 / 错误率 / 熔断状态"""
+        return [stats.snapshot() for stats in list(self.sources.values())]
@@ -3,20 +3,47 @@ import re
 from datetime import datetime
 from typing import Optional
 
-from . import basequotation
+import pandas as pd
+
+from . import basequotation, helpers
 
 
 class Tencent(basequotation.BaseQuotation):
     """腾讯免费行情获取"""
 
     grep_stock_code = re.compile(r"(?<=_)\w+")
+    grep_record = re.compile(r"v_(\w+)=\"([^\"]*)\"")
     max_num = 60
 
+    # 列式解析的字段, 下标与 format_response_data 中 stock[i] 一致, 0 为带市场前缀的股票代码
+    columns = [
+        "key", "name", "code", "now", "close", "open", "volume",
+        "bid_volume", "ask_volume",
+    ] + [f"{side}{i}{f}" for side in ("bid", "ask") for i in range(1, 6)
+         for f in ("", "_volume")] + [
+        "最近逐笔成交", "datetime", "涨跌", "涨跌(%)", "high", "low",
+        "价格/成交量(手)/成交额", "成交量(手)", "成交额(万)", "turnover", "PE",
+        "unknown", "high_2", "low_2", "振幅", "流通市值", "总市值", "PB",
+        "涨停价", "跌停价", "量比", "委差", "均价", "市盈(动)", "市盈(静)",
+    ]
+    str_columns = ["name", "code", "最近逐笔成交", "datetime",
+                   "价格/成交量(手)/成交额", "unknown"]
+    # 可能为空或非数字的字段
+    safe_columns = ["turnover", "PE", "流通市值", "总市值", "量比",
+                    "委差", "均价", "市盈(动)", "市盈(静)"]
+    # 单位为手的字段, 转换为股
+    lot_columns = ["volume", "bid_volume", "ask_volume", "成交量(手)"] + [
+        f"{side}{i}_volume" for side in ("bid", "ask") for i in range(1, 6)
+    ]
+    int_columns = [c for c in lot_columns if c not in ("volume", "ask_volume")]
+
     @property
     def stock_api(self) -> str:
         return "http://qt.gtimg.cn/q="
 
-    def format_response_data(self, rep_data, prefix=False):
+    def format_response_data(self, rep_data, prefix=False, columnar=False):
+        if columnar:
+            return self.format_response_columnar(rep_data, prefix=prefix)
         stocks_detail = "".join(rep_data)
         stock_details = stocks_detail.split(";")
         stock_dict = dict()
@@ -86,6 +113,31 @@ class Tencent(basequotation.BaseQuotation):
             }
         return stock_dict
 
+    def format_response_columnar(self, rep_data, prefix=False):
+        """列式解析: 返回以股票代码为索引的 DataFrame, 列与 format_response_data 的字段相同"""
+        records = [
+            key + detail[detail.index("~"):]
+            for key, detail in self.grep_record.findall("".join(rep_data))
+            if detail.count("~") >= 49
+        ]
+        dtype = {name: "float64" for name in self.columns[1:]
+                 if name not in self.safe_columns}
+        dtype.update({name: str for name in self.str_columns})
+        df = helpers.read_records(records, "~", self.columns, dtype=dtype)
+        df[self.str_columns] = df[self.str_columns].fillna("")
+        for name in self.safe_columns:
+            df[name] = pd.to_numeric(df[name], errors="coerce")
+        df[self.lot_columns] = df[self.lot_columns] * 100
+        df[self.int_columns] = df[self.int_columns].fillna(0).astype("int64")
+        df["成交额(万)"] = df["成交额(万)"] * 10000
+        df["datetime"] = pd.to_datetime(df["datetime"], format="%Y%m%d%H%M%S")
+        if prefix:
+            df["code"] = df.index
+        else:
+            df.index = df["code"].values
+        df.index.name = "code"
+        return df
+
     def _safe_acquire_float(self, stock: list, idx: int) -> Optional[float]:
         """
         There are some securities that only have 50 fields. See example below:
@@ -0,0 +1,171 @@
+# coding:utf8
+"""
+进程内共用的上游请求限流
+
+按上游 host 分别限制请求速率(令牌桶)和同时进行的请求数, easyquotation / easyquant.quotation /
+data_fetcher 的请求都经过这里, 避免多处同时请求同一个上游时触发对方限流.
+没有 URL 的 SDK(jqdata / tushare)用固定名称作为 host
+"""
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# 未单独配置的 host 的默认限制: 不限, 只做统计
+DEFAULT_RATE = None  # 每秒请求数, None 为不限
+DEFAULT_CONCURRENCY = None  # 同时进行的请求数, None 为不限
+
+TOKEN_EPSILON = 1e-9
+MIN_SLEEP = 1e-6  # 等待令牌时每次至少休眠的时长(秒), 太小的值加到时钟上不会改变时钟
+
+# 已知上游的限制: host -> dict(rate, burst, concurrency)
+# 新浪 / 腾讯的限制按进程计算, 所有 BaseQuotation 实例、行情引擎和 bar.py 的请求共用,
+# 各线程池的 max_workers 只决定单个实例的并发. 腾讯快照每个请求 60 只股票, 全市场约 100 个请求, 容量按一次全市场快照设置
+DEFAULT_LIMITS = {
+    # 新浪 / 腾讯实时快照
+    "hq.sinajs.cn": dict(rate=20, concurrency=8),
+    "qt.gtimg.cn": dict(rate=50, burst=100, concurrency=16),
+    "sqt.gtimg.cn": dict(rate=20, concurrency=8),
+    # 新浪 / 腾讯K线, 每个股票一个请求
+    "ifzq.gtimg.cn": dict(rate=30, concurrency=16),
+    "web.ifzq.gtimg.cn": dict(rate=30, concurrency=16),
+    "data.gtimg.cn": dict(rate=30, concurrency=16),
+    "money.finance.sina.com.cn": dict(rate=10, concurrency=4),
+    "quotes.sina.cn": dict(rate=10, concurrency=4),
+    "push2his.eastmoney.com": dict(rate=10, concurrency=8),
+    "jqdata": dict(rate=5, concurrency=4),
+    "tushare": dict(rate=3, concurrency=2),
+}
+
+
+def host_of(url_or_host):
+    """URL 的 host, 不是 URL 时原样返回"""
+    if "://" not in url_or_host:
+        return url_or_host
+    return urlparse(url_or_host).hostname or url_or_host
+
+
+class HostLimiter:
+    """单个 host 的令牌桶 + 并发数限制"""
+
+    def __init__(self, host, rate=DEFAULT_RATE, burst=None, concurrency=DEFAULT_CONCURRENCY):
+        """
+        :param host: 上游 host
+        :param rate: 每秒请求数, None 为不限
+        :param burst: 令牌桶容量, 即允许的突发请求数, 默认等于 rate
+        :param concurrency: 同时进行的请求数, None 为不限
+        """
+        self.host = host
+        self.rate = rate
+        self.burst = burst or rate or 1
+        self.concurrency = concurrency
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(concurrency) if concurrency else None
+        # 统计
+        self.requests = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _take_token(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                # 浮点累加会留下 0.99999999999 这样的余量, 按 1 个令牌处理
+                if self._tokens >= 1 - TOKEN_EPSILON:
+                    self._tokens = max(0.0, self._tokens - 1)
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(max(delay, MIN_SLEEP))
+
+    def acquire(self):
+        """
+        等待并发名额和令牌
+        :return: 排队等待的时间(秒)
+        """
+        start = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+        self._take_token()
+        wait = time.monotonic() - start
+        with self._lock:
+            self.waiting -= 1
+            self.in_flight += 1
+            self.requests += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        return wait
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(host=self.host, rate=self.rate, concurrency=self.concurrency,
+                        requests=self.requests, in_flight=self.in_flight, waiting=self.waiting,
+                        mean_wait=self.total_wait / self.requests if self.requests else 0.0,
+                        max_wait=self.max_wait)
+
+
+class ThrottleRegistry:
+    """host -> HostLimiter, 首次使用时按 DEFAULT_LIMITS 或默认值创建"""
+
+    def __init__(self, limits=None):
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self._limiters = {}
+        self._lock = threading.Lock()
+        # observer(host, wait), 每次请求排队结束后调用, 用于上报排队延迟
+        self.observer = None
+
+    def configure(self, host, rate=DEFAULT_RATE, burst=None, concurrency=DEFAULT_CONCURRENCY):
+        """设置 host 的限制, 替换已有的限制器(正在进行的请求不受影响)"""
+        host = host_of(host)
+        with self._lock:
+            self.limits[host] = dict(rate=rate, burst=burst, concurrency=concurrency)
+            self._limiters[host] = HostLimiter(host, rate=rate, burst=burst, concurrency=concurrency)
+
+    def limiter(self, url_or_host) -> HostLimiter:
+        host = host_of(url_or_host)
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(host)
+                if limiter is None:
+                    limiter = self._limiters[host] = HostLimiter(host, **self.limits.get(host, {}))
+        return limiter
+
+    @contextmanager
+    def limit(self, url_or_host):
+        """在限制内执行一次请求: with registry.limit(url): ..."""
+        limiter = self.limiter(url_or_host)
+        wait = limiter.acquire()
+        try:
+            observer = self.observer
+            if observer is not None:
+                observer(limiter.host, wait)
+            yield limiter
+        finally:
+            limiter.release()
+
+    def snapshot(self):
+        """各 host 的请求数 / 排队情况"""
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return [limiter.snapshot() for limiter in limiters]
+
+
+# 进程内共用的限流登记表
+registry = ThrottleRegistry()
+limit = registry.limit
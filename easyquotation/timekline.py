@@ -23,15 +23,9 @@ class TimeKline(basequotation.BaseQuotation):
             for code in stock_codes
         ]
 
-    def _fetch_stock_data(self, stock_list):
+    def _with_request(self, stock, resp):
         """因为 timekline 的返回没有带对应的股票代码，所以要手动带上"""
-        res = super()._fetch_stock_data(stock_list)
-
-        with_stock = []
-        for stock, resp in zip(stock_list, res):
-            if resp is not None:
-                with_stock.append((stock, resp))
-        return with_stock
+        return stock, resp
 
     def format_response_data(self, rep_data, **kwargs):
         stock_dict = dict()
@@ -34,9 +34,12 @@ class ETFQuant:
     def get_rank(self):
         self.slope_series = self.initial_slope_series()[:-1]
         rank = []
-        for stock in self.stock_pool:
-            data = jq.get_price(stock, end_date=self.date, count=self.mom)
-            score = np.polyfit(np.arange(len(data)), data.close / data.close[0], 1)[0]
+        # 股票池可以是聚宽格式的代码('159949.XSHE'), 行情源用6位代码
+        codes = {stock.split('.')[0]: stock for stock in self.stock_pool}
+        bars = quotation.get_bars_batch(list(codes), self.mom, end_dt=self.date)
+        for code, data in bars.items():
+            stock = codes[code]
+            score = np.polyfit(np.arange(len(data)), data.close / data.close.iloc[0], 1)[0]
             rank.append([stock, 100 * score])
         rank.sort(key=lambda x: x[-1], reverse=True)
         return rank[0]
@@ -12,6 +12,7 @@ from default_handler import DefaultLogHandler
 from easyquant import StrategyTemplate
 from context import Context
 from easyquant.event_engine import Event
+from easyquant.session_index import SessionIndex
 from easytrader.model import Position
 from trade_signal import SignalMonitorManager
 from utils import DateHelper
@@ -25,33 +26,26 @@ class Strategy(StrategyTemplate):
 
     def init(self):
         print(f"策略初始化时的事件处理器：{self.main_engine.event_engine.queue_size}")
-        for stock in self.watch_stocks:
-            self.quotation_engine.watch(stock.code)
+        self.quotation_engine.set_watchlist(self, [stock.code for stock in self.watch_stocks])
         # 创建信号监控管理器
         self.signal_manager = SignalMonitorManager(self.log)
+        # 每个股票当天K线的位置和昨收
+        self.sessions = SessionIndex()
 
     # 更新监听股票
     def update_watch_stocks(self):
-        # 取消当前股票监听
-        for stock in self.watch_stocks:
-            self.quotation_engine.un_watch(stock.code)
-        # 重新查询数据库更新监听
+        # 重新查询数据库更新监听, 只增删有变化的股票
         self.watch_stocks = [stock for stock in get_watching_stocks()]
-        for stock in self.watch_stocks:
-            self.quotation_engine.watch(stock.code)
+        self.quotation_engine.set_watchlist(self, [stock.code for stock in self.watch_stocks])
 
     def on_bar(self, context: Context, data: Dict[str, DataFrame]):
         self.update_watch_stocks()
         for stock in self.watch_stocks:
             stock_code = stock.code
+            session = self.sessions.update(stock_code, data[stock_code])
             ddt_df = ddt(data[stock_code])
-            # 过滤出最近一个工作日00:00:00到23:59:59之间的数据
-            latest_day = data[stock_code].index[-1]
-            start_time = latest_day.replace(hour=9, minute=30, second=0, microsecond=0)
-            start_time_str = start_time.strftime('%Y-%m-%d %H:%M:%S')
-            end_time = latest_day.replace(hour=15, minute=0, second=0, microsecond=0)
-            # 过滤索引为今天的数据
-            latest_data = ddt_df.loc[start_time_str:end_time.strftime('%Y-%m-%d %H:%M:%S')]
+            # 最近一个交易日的数据
+            latest_data = session.today(ddt_df)
             stock_info = get_stock_info(stock_code)
             if stock_info:
                 stock_id = stock_info.name
@@ -61,9 +55,8 @@ class Strategy(StrategyTemplate):
             # plot_basic(latest_data,latest_day.strftime('%Y-%m-%d')+'_'+stock_id+'.png')
 
             # 涨停判断数据预处理
-            # 昨天收盘价
-            yesterday_info = ddt_df.loc[:start_time_str].iloc[-2]
-            yesterday_close = yesterday_info.close
+            # 昨天收盘价: 前一交易日最后一根(15:00)K线的收盘价, 腾讯1分钟K线有没有 09:30 集合竞价K线都一样
+            yesterday_close = session.prev_close
             # 最新价格
             latest_info = latest_data.iloc[-1]
             # 涨停判断
@@ -81,6 +74,7 @@ class Strategy(StrategyTemplate):
                 latest_info = latest_data.iloc[-1]
                 signal_types = [signal[0] for signal in signals]  # 提取所有信号类型
                 push_msg = f"[{' '.join(signal_types)}] {stock_id}: 由价格{latest_info.close}在{latest_data.index[-1].strftime('%H:%M:%S')}触发"
+                self.mark_signal()
                 push_res = wx_push(push_msg)
                 self.log.info(f"推送消息: {push_msg}==>>>{push_res}")
 
@@ -4,8 +4,9 @@ from typing import List
 from easyquant.quotation import use_quotation
 
 
-def get_t_price(code: str):
-    df = quotation.get_bars(code, count=1, end_dt=datetime.datetime.now() - datetime.timedelta(days=1))
+def get_t_price(code: str, df=None):
+    if df is None:
+        df = quotation.get_bars(code, count=1, end_dt=datetime.datetime.now() - datetime.timedelta(days=1))
 
     last = df[-1:]
 
@@ -23,7 +24,9 @@ def get_t_price(code: str):
 
 
 def get_t_prices(codes: List[str]):
-    return [get_t_price(code) for code in codes]
+    """与 codes 一一对应, 获取失败或没有数据的股票为 None"""
+    bars = quotation.get_bars_batch(codes, 1, end_dt=datetime.datetime.now() - datetime.timedelta(days=1))
+    return [get_t_price(code, bars[code]) if code in bars else None for code in codes]
 
 
 quotation = use_quotation('tushare')
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+from easyquant.event_engine import AsyncEventEngine, Event
+from easyquant.push_engine.clock_engine import AsyncClockEngine
+
+
+def test_dispatches_sync_and_coroutine_handlers_in_order():
+    engine = AsyncEventEngine()
+    received = []
+    done = threading.Event()
+
+    async def on_bar(event):
+        await asyncio.sleep(0)
+        received.append(('async', event.data))
+
+    def on_bar_sync(event):
+        received.append(('sync', event.data))
+        if event.data == 2:
+            done.set()
+
+    def fail(event):
+        raise RuntimeError('boom')
+
+    engine.register('bar', on_bar)
+    engine.register('bar', on_bar_sync)
+    engine.register('bar', fail)
+    engine.start()
+    try:
+        for i in range(3):
+            engine.put(Event('bar', i))
+        assert done.wait(5)
+    finally:
+        engine.stop()
+    # 同一类型的事件按顺序处理, 处理函数抛出异常不影响之后的事件
+    assert [data for kind, data in received if kind == 'async'] == [0, 1, 2]
+    assert [data for kind, data in received if kind == 'sync'] == [0, 1, 2]
+
+
+class FakeContext:
+
+    def __init__(self):
+        self.dts = []
+
+    def change_dt(self, dt):
+        self.dts.append(dt)
+
+
+def test_clock_ticks_on_event_loop():
+    event_engine = AsyncEventEngine()
+    context = FakeContext()
+    clock = AsyncClockEngine(event_engine, context)
+    clock.sleep_time = 0.01
+    ticks = threading.Event()
+    tock = clock.tock
+
+    def count_tock():
+        tock()
+        if len(context.dts) >= 3:
+            ticks.set()
+
+    clock.tock = count_tock
+    event_engine.start()
+    clock.start()
+    try:
+        assert ticks.wait(5)
+    finally:
+        clock.stop()
+        event_engine.stop()
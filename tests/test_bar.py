@@ -0,0 +1,62 @@
+import json
+
+import pandas as pd
+
+from easyquotation import bar
+from easyquotation.source_manager import SourceManager
+
+
+class FakeResponse:
+
+    def __init__(self, payload):
+        self.content = json.dumps(payload).encode()
+
+
+def test_tencent_minute_volume_in_shares(monkeypatch):
+    payload = {'data': {'sz000001': {
+        'm1': [['202305050931', '10.0', '10.1', '10.2', '9.9', '12', {}, ''],
+               ['202305050932', '10.1', '10.2', '10.3', '10.0', '3', {}, '']],
+        'qt': {'sz000001': ['', '', '', '10.25']},
+    }}}
+    monkeypatch.setattr(bar.session, 'get', lambda url, **kwargs: FakeResponse(payload))
+    df = bar.get_price_min_tx('sz000001', count=2, frequency='1m')
+    assert df.volume.tolist() == [1200.0, 300.0]
+    assert df.close.iloc[-1] == 10.25
+
+
+def test_tencent_daily_matches_sina_shape(monkeypatch):
+    urls = []
+    payload = {'data': {'sz000001': {'day': [
+        ['2023-05-04', '10.0', '10.1', '10.2', '9.9', '12'],
+        ['2023-05-05', '10.1', '10.2', '10.3', '10.0', '3', {'nd': '2022', 'fh_sh': '2.85'}],
+    ]}}}
+
+    def get(url, **kwargs):
+        urls.append(url)
+        return FakeResponse(payload)
+
+    monkeypatch.setattr(bar.session, 'get', get)
+    df = bar.get_price_day_tx('sz000001', count=2)
+    # 默认前复权, 成交量为股, 列顺序和索引与新浪一致
+    assert urls[0].endswith(',2,qfq')
+    assert df.columns.tolist() == bar.SINA_COLUMNS
+    assert df.volume.tolist() == [1200.0, 300.0]
+    assert df.index[-1] == pd.Timestamp('2023-05-05')
+
+
+def test_get_price_hedges_sina_with_unadjusted_tencent(monkeypatch):
+    urls = []
+    payload = {'data': {'sz000001': {'day': [['2023-05-05', '10.1', '10.2', '10.3', '10.0', '3']]}}}
+
+    def get(url, **kwargs):
+        urls.append(url)
+        if 'sina' in url:
+            raise ConnectionError('sina down')
+        return FakeResponse(payload)
+
+    monkeypatch.setattr(bar.session, 'get', get)
+    monkeypatch.setattr(bar, 'source_manager', SourceManager())
+    df = bar.get_price('000001.XSHE', count=1)
+    assert df.close.tolist() == [10.2]
+    # 新浪不复权, 对冲的腾讯请求也不复权
+    assert urls[-1].endswith(',1,')
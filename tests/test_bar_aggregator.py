@@ -0,0 +1,52 @@
+import datetime
+
+import pandas as pd
+
+from easyquant.bar_aggregator import MinuteBarAggregator
+
+
+def feed(aggregator, quotes):
+    """quotes: [(行情时间, 现价, 累计成交量)], 逐次喂给聚合器"""
+    for quote_time, price, volume in quotes:
+        aggregator.update(['a'], [pd.Timestamp('2024-01-02 ' + quote_time)], [price], [volume], [volume * price])
+
+
+def at(hour, minute):
+    return pd.Timestamp(datetime.datetime(2024, 1, 2, hour, minute))
+
+
+def test_bars_close_at_lunch_break_and_market_close():
+    aggregator = MinuteBarAggregator()
+    feed(aggregator, [
+        ('09:25:00', 9.0, 50),    # 集合竞价并入第一根K线
+        ('11:29:50', 10.0, 100),
+        ('11:30:02', 11.0, 150),  # 午间收盘后的快照并入 11:30 的K线
+        ('13:00:10', 12.0, 160),  # 下午第一根K线在 13:01 收盘
+        ('14:59:58', 13.0, 200),
+        ('15:00:03', 14.0, 300),  # 收盘后的快照并入 15:00 的K线
+    ])
+    assert aggregator.is_complete('a')
+    df = aggregator.bars_of('a')
+
+    assert df.index[0] == at(9, 31)
+    assert df.index[-1] == at(15, 0)
+    assert len(df) == 240
+    position = df.index.get_loc(at(11, 30))
+    assert df.index[position + 1] == at(13, 1)
+
+    assert df.loc[at(9, 31), ['open', 'close', 'volume']].tolist() == [9.0, 9.0, 50]
+    assert df.loc[at(11, 30), ['open', 'high', 'close', 'volume']].tolist() == [10.0, 11.0, 11.0, 100]
+    assert df.loc[at(13, 1), ['open', 'close', 'volume']].tolist() == [12.0, 12.0, 10]
+    assert df.loc[at(15, 0), ['open', 'high', 'low', 'close', 'volume']].tolist() == [13.0, 14.0, 13.0, 14.0, 140]
+    # 没有成交的分钟用上一根K线的收盘价补齐
+    assert df.loc[at(11, 29), ['open', 'close', 'volume']].tolist() == [9.0, 9.0, 0]
+
+
+def test_first_snapshot_after_open_is_incomplete():
+    aggregator = MinuteBarAggregator()
+    feed(aggregator, [('10:00:05', 10.0, 1000), ('10:00:40', 10.5, 1200)])
+    assert not aggregator.is_complete('a')
+    df = aggregator.bars_of('a')
+    # 开盘以来的累计量无法分配到各分钟, 只计入之后的增量
+    assert df.index.tolist() == [pd.Timestamp('2024-01-02 10:01')]
+    assert df['volume'].tolist() == [200]
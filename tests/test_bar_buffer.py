@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from easyquant.bar_buffer import BarBuffer
+
+
+def bars(start, periods, close=None):
+    index = pd.date_range(start, periods=periods, freq='min')
+    close = np.arange(periods, dtype='float64') if close is None else close
+    return pd.DataFrame({'open': close, 'high': close, 'low': close, 'close': close, 'volume': 1.0}, index=index)
+
+
+def test_update_overwrites_last_bar_and_appends():
+    buffer = BarBuffer(capacity=5)
+    buffer.load(bars('2023-05-05 09:31', 3))
+    # 增量数据从最后一根K线开始: 覆盖未走完的 09:33, 追加 09:34
+    assert buffer.update(bars('2023-05-05 09:33', 2, close=np.array([9.0, 10.0])))
+    df = buffer.frame()
+    assert df.close.tolist() == [0.0, 1.0, 9.0, 10.0]
+    assert buffer.last_time == pd.Timestamp('2023-05-05 09:34')
+    # 增量数据不包含最后一根K线, 需要全量加载
+    assert not buffer.update(bars('2023-05-05 09:40', 2))
+
+
+def test_keeps_last_capacity_bars_across_reallocation():
+    buffer = BarBuffer(capacity=3)
+    buffer.load(bars('2023-05-05 09:31', 1))
+    for i in range(1, 10):
+        minute = pd.Timestamp('2023-05-05 09:31') + pd.Timedelta(minutes=i - 1)
+        buffer.update(bars(minute, 2, close=np.array([i - 1.0, float(i)])))
+    df = buffer.frame()
+    assert len(buffer) == 3
+    assert df.close.tolist() == [7.0, 8.0, 9.0]
+    assert df.index[-1] == pd.Timestamp('2023-05-05 09:40')
+
+
+def test_returned_frame_is_not_overwritten():
+    buffer = BarBuffer(capacity=5)
+    buffer.load(bars('2023-05-05 09:31', 3))
+    held = buffer.frame()
+    buffer.update(bars('2023-05-05 09:33', 2, close=np.array([9.0, 10.0])))
+    assert held.close.tolist() == [0.0, 1.0, 2.0]
+    assert buffer.frame().close.tolist() == [0.0, 1.0, 9.0, 10.0]
+
+
+def test_frame_is_a_writable_copy():
+    buffer = BarBuffer(capacity=5)
+    buffer.load(bars('2023-05-05 09:31', 3))
+    df = buffer.frame()
+    # 与回测的 ReplayFeed 一样, 策略可以原地修改和增加列
+    df.loc[df.index[0], 'open'] = 100.0
+    df['close'] *= 2
+    df['ma'] = df.close.rolling(2).mean()
+    assert df.close.tolist() == [0.0, 2.0, 4.0]
+    assert buffer.frame().open.tolist() == [0.0, 1.0, 2.0]
+    assert buffer.frame().close.tolist() == [0.0, 1.0, 2.0]
+
+
+def test_load_renames_vol_and_keeps_ohlcv_only():
+    # tushare 的成交量列为 vol, 还带有 ts_code / trade_date / amount 等列
+    df = bars('2023-05-05 09:31', 3).rename(columns={'volume': 'vol'})
+    df['ts_code'] = '000001.SZ'
+    df['amount'] = 10.0
+    buffer = BarBuffer(capacity=5)
+    buffer.load(df)
+    frame = buffer.frame()
+    assert list(frame.columns) == BarBuffer.FIELDS
+    assert frame.volume.tolist() == [1.0, 1.0, 1.0]
+
+
+def test_update_writes_in_place_without_reallocation():
+    buffer = BarBuffer(capacity=5)
+    buffer.load(bars('2023-05-05 09:31', 3))
+    held = buffer.frame()
+    values = buffer._values
+    buffer.update(bars('2023-05-05 09:33', 2, close=np.array([9.0, 10.0])))
+    assert buffer._values is values
+    assert buffer.frame().close.tolist() == [0.0, 1.0, 9.0, 10.0]
+    assert held.close.tolist() == [0.0, 1.0, 2.0]
@@ -0,0 +1,152 @@
+import datetime
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from easyquant.bar_cache import BarCache
+from easyquant import quotation as quotation_module
+from easyquant.bar_store import BarStore
+from easyquant.quotation import JQDataQuotation, Quotation, bar_expire_time, live_expire_time
+
+
+def test_evicts_least_recently_used_over_budget():
+    cache = BarCache(max_bytes=2500)
+    for key in 'abc':
+        cache.put(key, np.zeros(100))
+    cache.get('a', lambda: None)
+    # 超出上限, 淘汰最久未使用的 b
+    cache.put('d', np.zeros(100))
+    assert 'b' not in cache._entries and 'a' in cache._entries
+    assert cache.stats()['evictions'] == 1
+    assert cache.bytes <= cache.max_bytes
+
+
+def test_concurrent_misses_load_once():
+    cache = BarCache()
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return 'bars'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('k', loader))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [1] and results == ['bars'] * 4
+
+
+def test_loader_error_is_not_cached():
+    cache = BarCache()
+
+    def fail():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        cache.get('k', fail)
+    assert cache.get('k', lambda: 'bars') == 'bars'
+
+
+def test_cached_returns_a_copy(monkeypatch):
+    monkeypatch.setattr(Quotation, 'cache', BarCache())
+    quotation = Quotation.__new__(Quotation)
+    bars = pd.DataFrame({'close': [1.0, 2.0]})
+    first = quotation._cached(('000001',), lambda: bars)
+    first.loc[0, 'close'] = 100.0
+    assert quotation._cached(('000001',), lambda: None).close.tolist() == [1.0, 2.0]
+    assert Quotation.cache.stats()['hits'] == 1
+
+
+def test_expired_entry_is_reloaded():
+    cache = BarCache()
+    cache.get('k', lambda: 'old', expires=time.time() - 1)
+    assert cache.get('k', lambda: 'new') == 'new'
+
+
+def test_bar_expire_time_waits_settle_lag_after_close():
+    lag = datetime.timedelta(seconds=3)
+    close = datetime.datetime(2023, 5, 5, 10, 20)
+    assert bar_expire_time('5m', datetime.datetime(2023, 5, 5, 10, 17)) == close + lag
+    # 收盘后 settle_lag 内加载的数据可能还没有包含最后一根K线, 在 settle_lag 结束时失效
+    assert bar_expire_time('5m', close + datetime.timedelta(seconds=1)) == close + lag
+    assert bar_expire_time('5m', close + lag) == close + datetime.timedelta(minutes=5) + lag
+    assert bar_expire_time('5m', close, 0) == close + datetime.timedelta(minutes=5)
+
+
+def test_live_bars_expire_history_does_not():
+    now = datetime.datetime.now()
+    assert live_expire_time('5m', now) > now
+    assert live_expire_time('1d', now - datetime.timedelta(days=3)) is None
+
+
+def test_jqdata_minute_requests_within_one_bar_share_a_cache_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(Quotation, 'cache', BarCache())
+    quotation = JQDataQuotation.__new__(JQDataQuotation)
+    quotation.store = BarStore(str(tmp_path))
+    times = pd.date_range('2023-05-05 09:35', '2023-05-05 11:30', freq='5min')
+    bars = pd.DataFrame({'date': times, 'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': range(len(times)),
+                         'volume': 1.0, 'money': 1.0})
+    monkeypatch.setattr(JQDataQuotation, '_query',
+                        staticmethod(lambda codes, count, unit, fields, include_now, end: bars.tail(count)))
+
+    first = quotation.get_bars('000001', 3, unit='5m', end_dt=datetime.datetime(2023, 5, 5, 10, 15, 30))
+    second = quotation.get_bars('000001', 3, unit='5m', end_dt=datetime.datetime(2023, 5, 5, 10, 19))
+    assert len(Quotation.cache) == 1
+    assert first.close.tolist() == second.close.tolist()
+    later = quotation.get_bars('000001', 3, unit='5m', end_dt=datetime.datetime(2023, 5, 5, 10, 20))
+    assert later.index[-1] == pd.Timestamp('2023-05-05 10:20')
+
+
+def test_peek_does_not_load_or_return_expired():
+    cache = BarCache()
+    assert cache.peek('k') is None
+    cache.put('k', 'bars', expires=time.time() - 1)
+    assert cache.peek('k') is None and len(cache) == 0
+    cache.put('k', 'bars')
+    assert cache.peek('k') == 'bars'
+
+
+class FakeMinuteKline:
+
+    def __init__(self):
+        self.requests = []
+
+    def bars(self, securities, minute=None, count=None):
+        self.requests.append(list(securities))
+        times = np.array(['2023-05-05T09:35', '2023-05-05T09:40'], dtype='datetime64[m]')
+        return {security: dict(time=times, open=np.ones(2), high=np.ones(2), low=np.ones(2),
+                                close=np.array([1.0, 2.0]), volume=np.full(2, 100.0))
+                for security in securities}
+
+
+def test_free_online_batch_frames_are_cached_apart_from_get_bars(monkeypatch):
+    monkeypatch.setattr(Quotation, 'cache', BarCache())
+    minute_kline = FakeMinuteKline()
+    monkeypatch.setattr(quotation_module.FreeOnlineQuotation, '_minute_kline', minute_kline)
+    quotation = quotation_module.FreeOnlineQuotation()
+
+    assert quotation.get_bars_batch(['000001'], 2, unit='5m')['000001'].close.tolist() == [1.0, 2.0]
+    quotation.get_bars_batch(['000001', '000002'], 2, unit='5m')
+    # 已缓存的股票不再请求
+    assert minute_kline.requests == [['000001'], ['000002']]
+
+    realtime = pd.DataFrame({'close': [1.0, 2.05]})
+    monkeypatch.setattr(quotation_module, 'get_price', lambda *args, **kwargs: realtime)
+    assert quotation.get_bars('000001', 2, unit='5m').close.tolist() == [1.0, 2.05]
+
+
+def test_jqdata_batch_includes_current_bar_by_default(monkeypatch):
+    calls = []
+    monkeypatch.setattr(JQDataQuotation, '_get_bars_batch', lambda self, securities, count, unit, fields,
+                        include_now, end_dt: calls.append(include_now) or {})
+    JQDataQuotation.__new__(JQDataQuotation).get_bars_batch(['000001'], 3)
+    assert calls == [True]
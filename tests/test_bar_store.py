@@ -0,0 +1,76 @@
+import datetime
+import os
+
+import pandas as pd
+
+from easyquant.bar_store import BarStore
+from easyquant.easydealutils.time import calendar
+
+
+def daily_bars():
+    days = pd.DatetimeIndex(calendar.range(datetime.date(2023, 3, 1), datetime.date(2023, 5, 31)))
+    return pd.DataFrame({'close': range(len(days)), 'volume': 100.0}, index=days + pd.Timedelta(hours=15))
+
+
+class Source:
+    """记录每次请求的行情源"""
+
+    def __init__(self):
+        self.bars = daily_bars()
+        self.requests = []
+
+    def __call__(self, end, count):
+        self.requests.append(count)
+        return self.bars[self.bars.index <= end].iloc[-count:]
+
+
+def test_get_serves_covered_ranges_and_fetches_only_the_gap(tmp_path):
+    source = Source()
+    store = BarStore(str(tmp_path))
+    end = datetime.datetime(2023, 5, 10, 23, 59)
+    expected = source(end, 10)
+    source.requests.clear()
+
+    df = store.get('000001', '1d', end, 10, source)
+    assert df.close.tolist() == expected.close.tolist()
+    # 已覆盖区间内更短的查询直接切片
+    assert store.has('000001', '1d', datetime.datetime(2023, 5, 9, 23, 59), 5)
+    store.get('000001', '1d', datetime.datetime(2023, 5, 9, 23, 59), 5, source)
+    assert source.requests == [10]
+
+    # 向后延伸只请求缺少的K线
+    later = datetime.datetime(2023, 5, 12, 23, 59)
+    df = store.get('000001', '1d', later, 10, source)
+    assert df.close.tolist() == source.bars[source.bars.index <= later].close.iloc[-10:].tolist()
+    assert source.requests[1] < 10
+
+
+def test_saved_bars_reload_and_old_versions_are_removed(tmp_path):
+    source = Source()
+    store = BarStore(str(tmp_path))
+    store.get('000001', '1d', datetime.datetime(2023, 5, 10, 23, 59), 10, source)
+    held = store.get('000001', '1d', datetime.datetime(2023, 5, 12, 23, 59), 10, source)
+
+    reloaded = BarStore(str(tmp_path))
+    end = datetime.datetime(2023, 5, 12, 23, 59)
+    assert reloaded.has('000001', '1d', end, 10)
+    assert reloaded.get('000001', '1d', end, 10, source).close.tolist() == held.close.tolist()
+    # 数据文件只保留当前版本
+    assert sorted(os.listdir(os.path.join(str(tmp_path), '1d', '000001'))) == \
+        ['meta.json', 'times.2.npy', 'values.2.npy']
+
+
+def test_adjustment_change_refetches_whole_range(tmp_path):
+    source = Source()
+    store = BarStore(str(tmp_path))
+    store.get('000001', '1d', datetime.datetime(2023, 5, 10, 23, 59), 10, source)
+
+    # 除权后行情源以新的基准前复权, 之前的K线价格都变了
+    source.bars = source.bars.assign(close=source.bars.close * 0.5)
+    later = datetime.datetime(2023, 5, 12, 23, 59)
+    df = store.get('000001', '1d', later, 10, source)
+    assert df.close.tolist() == source.bars[source.bars.index <= later].close.iloc[-10:].tolist()
+    # 增量请求发现基准变化后重新请求了全部K线
+    assert source.requests[-1] == 10
+    assert store.get('000001', '1d', datetime.datetime(2023, 5, 10, 23, 59), 10, source).close.tolist() == \
+        source.bars[source.bars.index <= datetime.datetime(2023, 5, 10, 23, 59)].close.iloc[-10:].tolist()
@@ -0,0 +1,40 @@
+import warnings
+
+import requests
+
+from easyquotation.basequotation import BaseQuotation
+
+
+class FakeQuotation(BaseQuotation):
+    """按请求返回固定数据, 请求 'bad' 时超时"""
+
+    stock_api = 'http://fake/'
+
+    @staticmethod
+    def load_stock_codes():
+        return []
+
+    def get_stocks_by_range(self, params):
+        if params == 'bad':
+            raise requests.Timeout('timeout')
+        return params
+
+    def format_response_data(self, rep_data, **kwargs):
+        return {resp: len(resp) for resp in rep_data}
+
+
+def test_iter_stock_data_skips_failed_requests():
+    quotation = FakeQuotation()
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            batches = list(quotation.iter_stock_data(['a', 'bad', 'bb']))
+        merged = {}
+        for batch in batches:
+            merged.update(batch)
+        assert len(batches) == 2
+        assert merged == {'a': 1, 'bb': 2}
+        # 批量接口复用同一个线程池
+        assert quotation.get_stock_data(['a', 'bb']) == {'a': 1, 'bb': 2}
+    finally:
+        quotation.close()
@@ -0,0 +1,27 @@
+import random
+
+import pandas as pd
+import pytest
+
+from easyquotation.benchmark import sina_payload, tencent_payload
+from easyquotation.sina import Sina
+from easyquotation.tencent import Tencent
+
+
+@pytest.mark.parametrize('cls, make_payload', [(Sina, sina_payload), (Tencent, tencent_payload)])
+@pytest.mark.parametrize('prefix', [False, True])
+def test_columnar_matches_dict_output(cls, make_payload, prefix):
+    random.seed(0)
+    payload = make_payload(cls.max_num + 5)  # 跨两个请求
+    quotation = cls.__new__(cls)  # 不需要加载股票代码和网络连接
+    records = quotation.format_response_data(payload, prefix=prefix)
+    df = quotation.format_response_data(payload, prefix=prefix, columnar=True)
+    assert list(df.index) == list(records)
+    assert set(df.columns) == set(next(iter(records.values())))
+    for code, record in records.items():
+        row = df.loc[code]
+        for field, value in record.items():
+            if value is None:
+                assert pd.isna(row[field]), (code, field)
+            else:
+                assert row[field] == value, (code, field)
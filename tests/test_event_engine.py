@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+
+from easyquant.event_engine import Event, EventEngine, QueuePolicy
+
+
+def test_lane_out_of_range():
+    with pytest.raises(ValueError):
+        EventEngine(pool_size=2, lanes={'bar': 2})
+    with pytest.raises(ValueError):
+        EventEngine(lanes={'bar': 0})
+
+
+def test_handler_exception_keeps_worker_alive():
+    engine = EventEngine(pool_size=1)
+    handled = threading.Event()
+
+    def fail(event):
+        raise RuntimeError('boom')
+
+    def ok(event):
+        if event.data == 2:
+            handled.set()
+
+    engine.register('a', fail)
+    engine.register('b', ok)
+    engine.start()
+    try:
+        engine.put(Event('a', 1))
+        engine.put(Event('b', 2))
+        assert handled.wait(5)
+    finally:
+        engine.stop()
+
+
+def test_coalesce_keeps_latest_data():
+    engine = EventEngine(pool_size=1, policies={'bar': QueuePolicy(coalesce=True)})
+    received = []
+    engine.register('bar', lambda event: received.append((event.data, event.bar_close, event.created)))
+    # 引擎未启动, 后两个事件合并到第一个未处理的事件中
+    events = [Event('bar', i, bar_close=100 + i) for i in range(3)]
+    for event in events:
+        engine.put(event)
+    assert engine.merged['bar'] == 2
+    engine.start()
+    try:
+        deadline = time.time() + 5
+        while not received and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        engine.stop()
+    assert received == [(2, 102, events[-1].created)]
+
+
+def test_non_blocking_policy_drops_over_maxsize():
+    engine = EventEngine(pool_size=1, policies={'clock': QueuePolicy(maxsize=1, block=False)})
+    engine.put(Event('clock', 1))
+    engine.put(Event('clock', 2))
+    assert engine.dropped['clock'] == 1
+    assert engine.stats['clock']['pending'] == 1
@@ -0,0 +1,42 @@
+from easyquant.metrics import BUCKETS, Histogram, MetricsRegistry, load
+
+
+def test_histogram_bucket_edges():
+    histogram = Histogram()
+    # 等于上界的值落在该桶, 略大于上界的值落在下一个桶
+    histogram.observe(BUCKETS[0])
+    histogram.observe(BUCKETS[0] * 1.01)
+    histogram.observe(BUCKETS[-1] * 2)
+    assert histogram.counts[0] == 1
+    assert histogram.counts[1] == 1
+    assert histogram.counts[len(BUCKETS)] == 1
+    assert histogram.count == 3
+    assert histogram.max == BUCKETS[-1] * 2
+
+
+def test_histogram_percentile_is_capped_by_max():
+    histogram = Histogram()
+    for _ in range(99):
+        histogram.observe(0.00015)
+    histogram.observe(1.0)
+    # 0.00015 落在上界 0.0002 的桶, 估算值取桶上界
+    assert histogram.percentile(0.5) == BUCKETS[1]
+    assert histogram.percentile(1.0) == 1.0
+    assert Histogram().percentile(0.5) == 0.0
+
+
+def test_metrics_file_round_trip(tmp_path):
+    registry = MetricsRegistry()
+    registry.observe('handler', 0.01, event_type='bar', handler='s.on_bar')
+    registry.observe('handler', 0.03, event_type='bar', handler='s.on_bar')
+    registry.observe('fetch', 0.2, code='000001')
+    path = str(tmp_path / 'metrics.json')
+    registry.dump(path)
+    loaded = load(path)
+    assert loaded == registry.snapshot()
+    handler = loaded['handler'][0]
+    assert handler['labels'] == {'event_type': 'bar', 'handler': 's.on_bar'}
+    assert handler['count'] == 2
+    assert abs(handler['mean'] - 0.02) < 1e-9
+    assert handler['max'] == 0.03
+    assert load(str(tmp_path / 'missing.json')) == {}
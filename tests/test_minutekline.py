@@ -0,0 +1,63 @@
+import json
+
+import numpy as np
+
+from easyquotation.minutekline import MinuteTimeKline
+
+# 腾讯 mkline 接口的返回: [时间, 开, 收, 高, 低, 成交量(手), {}, 成交额]
+PAYLOAD = {
+    'code': 0,
+    'data': {
+        'sz000001': {
+            'm1': [['202305050931', '12.50', '12.52', '12.53', '12.49', '3210.00', {}, '401.2'],
+                   ['202305050932', '12.52', '12.55', '12.56', '12.51', '1500.00', {}, '188.1'],
+                   ['202305050933', '12.55', '12.54', '12.57', '12.53', '820.00', {}, '102.9']],
+            'qt': {},
+        },
+    },
+}
+
+
+class CapturedKline(MinuteTimeKline):
+    """每个请求都返回 PAYLOAD, 记录请求参数"""
+
+    @staticmethod
+    def load_stock_codes():
+        return []
+
+    def __init__(self):
+        super().__init__()
+        self.params = []
+
+    def get_stocks_by_range(self, params):
+        self.params.append(params)
+        return 'm1_today=' + json.dumps(PAYLOAD)
+
+
+def test_bars_returns_typed_arrays():
+    kline = CapturedKline()
+    try:
+        bars = kline.bars('000001', minute=1, count=2)['000001']
+    finally:
+        kline.close()
+    assert kline.params == ['sz000001,m1,,2']
+    assert bars['time'].dtype == np.dtype('datetime64[m]')
+    # 多返回的K线按 count 截掉最早的
+    assert bars['time'].tolist() == np.array(['2023-05-05T09:32', '2023-05-05T09:33'],
+                                             dtype='datetime64[m]').tolist()
+    for name in ('open', 'close', 'high', 'low', 'volume'):
+        assert bars[name].dtype == np.float64
+    assert bars['close'].tolist() == [12.55, 12.54]
+    # 成交量由手换算为股
+    assert bars['volume'].tolist() == [150000.0, 82000.0]
+
+
+def test_real_sends_one_request_per_code():
+    kline = CapturedKline()
+    try:
+        result = kline.real(['000001', '600000'], minute=1, count=3, prefix=True)
+    finally:
+        kline.close()
+    assert sorted(kline.params) == ['sh600000,m1,,3', 'sz000001,m1,,3']
+    # 原始行原样返回
+    assert result['sz000001'] == PAYLOAD['data']['sz000001']['m1']
@@ -0,0 +1,118 @@
+import datetime
+import threading
+
+import pandas as pd
+
+from easyquant.event_engine import EventEngine
+from easyquant.push_engine.quotation_engine import QuotationEngine
+
+
+class SlowEngine(QuotationEngine):
+    """第一次获取 slow 时阻塞到 release 被设置, 每次获取返回递增的序号"""
+
+    def init(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def fetch_stock(self, code, end_date=None):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if code == 'slow' and call == 1:
+            self.release.wait(5)
+        return call
+
+
+def test_late_result_is_not_pushed_as_fresh():
+    engine = SlowEngine(None, EventEngine(), bar_type='1m', fetch_deadline=0.2)
+    try:
+        engine.watch('slow')
+        first = engine.fetch_quotation()
+        assert first == {} and engine.stale_codes == {'slow'}
+
+        # 上一轮的任务在本轮开始前返回, 结果属于上一根K线, 需要重新获取
+        engine.release.set()
+        engine._pending_fetches['slow'][1].result()
+        second = engine.fetch_quotation()
+        assert second == {'slow': 2}
+        assert engine.stale_codes == set()
+    finally:
+        engine.un_watch('slow')
+        engine.stop()
+
+
+def test_unfinished_fetch_from_previous_cycle_is_stale():
+    engine = SlowEngine(None, EventEngine(), bar_type='1m', fetch_deadline=0.1)
+    try:
+        engine.watch('slow')
+        engine.fetch_quotation()
+        second = engine.fetch_quotation()
+        assert second == {} and engine.stale_codes == {'slow'}
+    finally:
+        engine.un_watch('slow')
+        engine.release.set()
+        engine.stop()
+
+
+def test_next_push_time_is_bar_close_plus_settle_lag():
+    engine = QuotationEngine(None, EventEngine(), bar_type='5m', settle_lag=3)
+    try:
+        day = datetime.date(2023, 5, 5)
+
+        def at(hour, minute, second=0):
+            return datetime.datetime.combine(day, datetime.time(hour, minute, second))
+
+        assert engine.next_push_time(at(10, 17)) == at(10, 20, 3)
+        # 收盘后 settle_lag 内仍推送刚收盘的K线
+        assert engine.next_push_time(at(10, 20, 1)) == at(10, 20, 3)
+        assert engine.next_push_time(at(10, 20, 3)) == at(10, 25, 3)
+        # 跳过午休
+        assert engine.next_push_time(at(11, 30, 5)) == at(13, 5, 3)
+    finally:
+        engine.stop()
+
+
+def test_daily_push_skips_to_next_trade_day():
+    engine = QuotationEngine(None, EventEngine(), bar_type='1d', settle_lag=3)
+    try:
+        # 2023-05-05 为周五
+        assert engine.next_push_time(datetime.datetime(2023, 5, 5, 14, 0)) == datetime.datetime(2023, 5, 5, 15, 0, 3)
+        assert engine.next_push_time(datetime.datetime(2023, 5, 5, 15, 10)) == datetime.datetime(2023, 5, 8, 15, 0, 3)
+    finally:
+        engine.stop()
+
+
+class BlockingBarsEngine(QuotationEngine):
+    """fetch_bars 阻塞到 release 被设置, 用于在获取期间取消监听"""
+
+    def init(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def fetch_bars(self, code, end_dt, count=None):
+        self.started.set()
+        self.release.wait(5)
+        index = pd.date_range('2023-05-05 09:31', periods=3, freq='min')
+        return pd.DataFrame(1.0, index=index, columns=['open', 'high', 'low', 'close', 'volume'])
+
+
+def test_unwatched_code_is_dropped_after_fetch():
+    engine = BlockingBarsEngine(None, EventEngine(), bar_type='1m', fetch_deadline=5)
+    try:
+        engine.watch('a')
+        result = {}
+        fetch = threading.Thread(target=lambda: result.update(engine.fetch_quotation()))
+        fetch.start()
+        assert engine.started.wait(5)
+        # 获取期间取消监听, 返回的结果和缓冲区都不保留
+        engine.un_watch('a')
+        engine.release.set()
+        fetch.join(5)
+        assert result == {}
+        assert 'a' not in engine.buffers
+        assert 'a' not in engine._last_bars
+        assert engine.stale_codes == set()
+    finally:
+        engine.release.set()
+        engine.stop()
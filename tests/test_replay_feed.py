@@ -0,0 +1,68 @@
+import datetime
+
+import pandas as pd
+
+from easyquant.replay_feed import ReplayFeed
+
+
+class FakeQuotation:
+
+    def __init__(self, bars):
+        self.bars = bars
+        self.requests = []
+
+    def get_bars_batch(self, securities, count, unit='1d', end_dt=None, **kwargs):
+        self.requests.append(list(securities))
+        return {security: self.bars.tail(count) for security in securities if security != 'missing'}
+
+
+def minute_bars():
+    morning = pd.date_range('2023-05-05 09:31', '2023-05-05 11:30', freq='min')
+    afternoon = pd.date_range('2023-05-05 13:01', '2023-05-05 15:00', freq='min')
+    index = morning.append(afternoon)
+    return pd.DataFrame({'close': range(len(index))}, index=index, dtype='float64')
+
+
+def test_cursor_matches_filter_then_tail_and_rewinds():
+    bars = minute_bars()
+    quotation = FakeQuotation(bars)
+    feed = ReplayFeed(quotation, '1m', datetime.date(2023, 5, 5), datetime.date(2023, 5, 5), window=10)
+    steps = [datetime.datetime(2023, 5, 5, 9, 31), datetime.datetime(2023, 5, 5, 10, 0, 30),
+             datetime.datetime(2023, 5, 5, 12, 0), datetime.datetime(2023, 5, 5, 14, 59),
+             # 回退到更早的时间
+             datetime.datetime(2023, 5, 5, 9, 40)]
+    for end_dt in steps:
+        expected = bars[bars.index <= end_dt].tail(10)
+        assert feed.bars('000001', end_dt).close.tolist() == expected.close.tolist()
+    assert quotation.requests == [['000001']]
+
+
+def test_each_step_returns_a_new_frame():
+    feed = ReplayFeed(FakeQuotation(minute_bars()), '1m', datetime.date(2023, 5, 5), datetime.date(2023, 5, 5),
+                      window=10)
+    # 午休期间没有新K线
+    first = feed.bars('000001', datetime.datetime(2023, 5, 5, 11, 45))
+    first['ma'] = first.close.rolling(3).mean()
+    second = feed.bars('000001', datetime.datetime(2023, 5, 5, 12, 0))
+    assert 'ma' not in second.columns
+    assert second.close.tolist() == first.close.tolist()
+
+
+def test_missing_code_is_loaded_once_and_skipped():
+    quotation = FakeQuotation(minute_bars())
+    feed = ReplayFeed(quotation, '1m', datetime.date(2023, 5, 5), datetime.date(2023, 5, 5), window=10)
+    end_dt = datetime.datetime(2023, 5, 5, 10, 0)
+    assert list(feed.fetch(['000001', 'missing'], end_dt)) == ['000001']
+    feed.fetch(['000001', 'missing'], end_dt)
+    assert quotation.requests == [['000001', 'missing']]
+
+
+def test_in_place_edits_do_not_leak_into_later_steps():
+    feed = ReplayFeed(FakeQuotation(minute_bars()), '1m', datetime.date(2023, 5, 5), datetime.date(2023, 5, 5),
+                      window=10)
+    end_dt = datetime.datetime(2023, 5, 5, 10, 0)
+    first = feed.bars('000001', end_dt)
+    expected = first.close.tolist()
+    first.loc[first.index[-1], 'close'] = -1.0
+    first['close'] *= 2
+    assert feed.bars('000001', end_dt).close.tolist() == expected
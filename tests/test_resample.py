@@ -0,0 +1,82 @@
+import pandas as pd
+
+from easyquant.quotation import ResampleQuotation, resample_bars
+
+
+def test_resample_aligns_to_sessions():
+    morning = pd.date_range('2023-05-05 09:31', '2023-05-05 11:30', freq='min')
+    afternoon = pd.date_range('2023-05-05 13:01', '2023-05-05 15:00', freq='min')
+    index = morning.append(afternoon)
+    df = pd.DataFrame({'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': range(len(index)), 'volume': 100.0},
+                      index=index)
+    bars = resample_bars(df, 60)
+    assert bars.index.strftime('%H:%M').tolist() == ['10:30', '11:30', '14:00', '15:00']
+    assert bars.volume.tolist() == [6000.0] * 4
+    # 上午最后一根K线收于 11:30, 下午第一根从 13:01 开始
+    assert bars.close.tolist() == [59, 119, 179, 239]
+
+
+class MinuteSource:
+    """1分钟K线截止到 last(未走完的K线以收盘时间标记), 记录收到的请求"""
+
+    def __init__(self, last):
+        self.last = pd.Timestamp(last)
+        self.calls = []
+
+    def get_bars(self, security, count, unit='1d', fields=None, include_now=False, end_dt=None):
+        self.calls.append((unit, count))
+        index = pd.date_range(end=self.last, periods=count, freq='min')
+        return pd.DataFrame({'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0, 'volume': 1.0}, index=index)
+
+
+def test_live_end_dt_uses_local_bars():
+    now = pd.Timestamp.now().floor('s')
+    # 未走完的K线标记为下一分钟
+    source = MinuteSource(now.floor('min') + pd.Timedelta(minutes=1))
+    quotation = ResampleQuotation(source, capacity=100)
+    df = quotation.get_bars('000001', 20, unit='1m', end_dt=now.to_pydatetime())
+    assert len(df) == 20
+    # 只有刷新1分钟K线的请求, 没有回退到行情源
+    assert source.calls == [('1m', 100)]
+
+
+class SessionSource:
+    """按交易时段对齐的1分钟K线截止到 last, 其他分钟周期由这些1分钟K线合成, 记录收到的请求"""
+
+    def __init__(self, last):
+        morning = pd.date_range('09:31', '11:30', freq='min').time
+        afternoon = pd.date_range('13:01', '15:00', freq='min').time
+        minutes = [pd.Timestamp.combine(day, t) for day in pd.date_range('2023-05-04', '2023-05-05')
+                   for t in list(morning) + list(afternoon)]
+        index = pd.DatetimeIndex(minutes)
+        close = pd.Series(range(len(index)), index=index, dtype='float64')
+        self.minute_bars = pd.DataFrame({'open': close, 'high': close + 0.5, 'low': close - 0.5,
+                                         'close': close, 'volume': 1.0})
+        self.last = pd.Timestamp(last)
+        self.calls = []
+
+    def get_bars(self, security, count, unit='1d', fields=None, include_now=False, end_dt=None):
+        self.calls.append((unit, count))
+        df = self.minute_bars[self.minute_bars.index <= self.last]
+        if unit != '1m':
+            df = resample_bars(df, int(unit[:-1]))
+        return df.iloc[-count:]
+
+
+def test_history_is_seeded_once_and_extended_from_minute_bars():
+    source = SessionSource('2023-05-05 10:07')
+    quotation = ResampleQuotation(source, capacity=100)
+    df = quotation.get_bars('000001', 20, unit='15m')
+    # 100 根1分钟K线合成不出 20 根15分钟K线, 更早的从行情源获取一次
+    assert source.calls == [('1m', 100), ('15m', 20)]
+    assert df.equals(source.get_bars('000001', 20, unit='15m'))
+
+    # 行情走过 30 分钟, 新的和未走完的15分钟K线由1分钟K线合成, 不再请求15分钟K线
+    source.last = pd.Timestamp('2023-05-05 10:37')
+    source.calls.clear()
+    quotation._refreshed.clear()
+    df = quotation.get_bars('000001', 20, unit='15m')
+    assert [unit for unit, _ in source.calls] == ['1m']
+    expected = source.get_bars('000001', 20, unit='15m')
+    assert df.index.tolist() == expected.index.tolist()
+    assert df.equals(expected)
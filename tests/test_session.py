@@ -0,0 +1,28 @@
+from easyquotation import session
+
+
+def test_session_is_shared_and_reconfigurable():
+    first = session.get_session()
+    assert session.get_session() is first
+    assert first.get_adapter('http://qt.gtimg.cn')._pool_maxsize == session.POOL_MAXSIZE
+    session.configure(pool_connections=2, pool_maxsize=4)
+    try:
+        second = session.get_session()
+        assert second is not first
+        assert second.get_adapter('https://hq.sinajs.cn')._pool_maxsize == 4
+    finally:
+        session.configure()
+
+
+def test_get_uses_default_timeout(monkeypatch):
+    calls = []
+
+    class FakeSession:
+        def get(self, url, **kwargs):
+            calls.append((url, kwargs))
+
+    monkeypatch.setattr(session, 'get_session', lambda: FakeSession())
+    session.get('http://qt.gtimg.cn/q=sz000001')
+    session.get('http://qt.gtimg.cn/q=sz000001', timeout=1)
+    assert calls[0][1]['timeout'] == session.DEFAULT_TIMEOUT
+    assert calls[1][1]['timeout'] == 1
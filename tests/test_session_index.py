@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from easyquant.session_index import SessionIndex
+
+
+def minute_bars(day, start, periods, first_close=0.0):
+    index = pd.date_range('%s %s' % (day, start), periods=periods, freq='min')
+    return pd.DataFrame({'close': first_close + np.arange(periods, dtype='float64')}, index=index)
+
+
+def two_days(auction=False):
+    """前一天 14:57-15:00 四根K线(收盘 3.0), 当天从 09:31 (auction 时从 09:30) 开始三根"""
+    yesterday = minute_bars('2023-05-04', '14:57', 4)
+    today = minute_bars('2023-05-05', '09:30' if auction else '09:31', 3, first_close=10.0)
+    return pd.concat([yesterday, today])
+
+
+def test_first_scan_finds_today_and_prev_close():
+    for auction in (False, True):
+        df = two_days(auction)
+        session = SessionIndex().update('000001', df)
+        assert session.start == 4
+        # 有没有 09:30 K线, 昨收都是前一天 15:00 的收盘价
+        assert session.prev_close == 3.0
+        assert session.today(df).close.tolist() == [10.0, 11.0, 12.0]
+        assert session.first_bar(df).name.strftime('%H:%M') == ('09:30' if auction else '09:31')
+
+
+def test_incremental_updates_across_day_boundary():
+    index = SessionIndex()
+    yesterday = minute_bars('2023-05-04', '14:57', 4)
+    session = index.update('000001', yesterday)
+    assert session.start == 0 and np.isnan(session.prev_close)
+
+    df = pd.concat([yesterday, minute_bars('2023-05-05', '09:31', 2, first_close=10.0)])
+    session = index.update('000001', df)
+    assert session.start == 4 and session.prev_close == 3.0
+
+    # 当天的K线继续增加, 分界不变
+    df = pd.concat([df, minute_bars('2023-05-05', '09:33', 1, first_close=12.0)])
+    session = index.update('000001', df)
+    assert session.start == 4 and session.prev_close == 3.0
+    assert session.today(df).close.tolist() == [10.0, 11.0, 12.0]
+
+
+def test_rolling_window_shifts_start():
+    index = SessionIndex()
+    df = two_days()
+    index.update('000001', df)
+    # 滚动窗口: 丢掉最早的两根, 追加一根
+    rolled = pd.concat([df.iloc[2:], minute_bars('2023-05-05', '09:34', 1, first_close=13.0)])
+    session = index.update('000001', rolled)
+    assert session.start == 2
+    assert session.today(rolled).close.tolist() == [10.0, 11.0, 12.0, 13.0]
+    assert session.prev_close == 3.0
+
+    # 前一天的K线全部滚出窗口, 当天第一根在窗口开头, 昨收保持不变
+    rolled = rolled.iloc[3:]
+    session = index.update('000001', rolled)
+    assert session.start == 0 and session.prev_close == 3.0
+
+
+def test_non_overlapping_reload_rescans():
+    index = SessionIndex()
+    index.update('000001', two_days())
+    # 与上次推送没有重叠的K线(例如重新加载), 全量计算
+    reloaded = pd.concat([minute_bars('2023-05-08', '14:59', 2, first_close=20.0),
+                          minute_bars('2023-05-09', '09:31', 1, first_close=30.0)])
+    session = index.update('000001', reloaded)
+    assert session.start == 2 and session.prev_close == 21.0
+
+    index.remove('000001')
+    assert index.update('000001', reloaded.iloc[:0]).start == 0
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from easyquant.multiprocess import shared_bars
+from easyquant.multiprocess.shared_bars import SharedBarReader, SharedBarStore, StaleBarsError
+
+
+def bars(close):
+    index = pd.date_range('2023-05-05 09:31', periods=3, freq='min').as_unit('ns')
+    return pd.DataFrame({'open': close, 'high': close, 'low': close, 'close': close, 'volume': 100.0},
+                        index=index)
+
+
+def test_read_returns_published_bars_and_rejects_overwritten_seq(monkeypatch):
+    # 读写在同一进程中, 读取端不能注销写入端登记的共享内存
+    monkeypatch.setattr(shared_bars.resource_tracker, 'unregister', lambda name, rtype: None)
+    store = SharedBarStore(capacity=5)
+    reader = SharedBarReader(store.prefix, store.capacity)
+    try:
+        first = store.publish({'000001': bars(1.0)}).seqs['000001']
+        held = reader.read('000001', first)
+        assert held.close.tolist() == [1.0] * 3
+
+        store.publish({'000001': bars(2.0)})
+        assert reader.read('000001', first).close.tolist() == [1.0] * 3
+
+        third = store.publish({'000001': bars(3.0)}).seqs['000001']
+        # 序号 first 所在的槽已被第三次写入覆盖
+        with pytest.raises(StaleBarsError):
+            reader.read('000001', first)
+        assert reader.read('000001', third).close.tolist() == [3.0] * 3
+        # 已返回的数据不随之后的写入改变
+        assert held.close.tolist() == [1.0] * 3
+    finally:
+        reader.close()
+        store.close()
+
+
+def test_only_plain_ohlcv_frames_go_through_shared_memory():
+    store = SharedBarStore(capacity=3)
+    assert store.accepts({'000001': bars(1.0)})
+    # 共享内存不保存其他列, 带 money 的数据经队列传递
+    assert not store.accepts({'000001': bars(1.0).assign(money=1.0)})
+    assert not store.accepts({'000001': bars(1.0)[['close', 'open', 'high', 'low', 'volume']]})
+    assert not store.accepts([bars(1.0)])
+    # 超过容量的K线放不下, 也经队列传递, 不截断
+    assert not SharedBarStore(capacity=2).accepts({'000001': bars(1.0)})
@@ -0,0 +1,45 @@
+import pandas as pd
+
+from easyquant import quotation
+from easyquant.quotation import SnapshotQuotation
+from easyquant.tick_recorder import LEVELS
+
+
+class FakeSnapshot:
+    """新浪列式快照, prefix=True 时以带市场前缀的代码为索引"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def market_snapshot(self, prefix=False, columnar=False):
+        self.calls.append(dict(prefix=prefix, columnar=columnar))
+        codes, prices, volumes = zip(*self.rows)
+        data = dict(date='2024-01-02', time='09:25:00', now=prices, turnover=volumes,
+                    volume=[price * volume for price, volume in zip(prices, volumes)])
+        for i in range(1, LEVELS + 1):
+            data.update({'bid%d' % i: prices, 'bid%d_volume' % i: 100, 'ask%d' % i: prices, 'ask%d_volume' % i: 100})
+        return pd.DataFrame(data, index=pd.Index(codes if prefix else [code[2:] for code in codes]))
+
+
+def test_index_with_stock_code_does_not_overwrite_stock(monkeypatch):
+    # 上证指数 sh000001 与平安银行 sz000001 的6位代码相同
+    snapshot = FakeSnapshot([('sz000001', 10.5, 1000), ('sh000001', 3000.0, 900000), ('sh600000', 7.0, 500)])
+    monkeypatch.setattr(quotation.easyquotation, 'use', lambda source: snapshot)
+    monkeypatch.setattr(quotation, 'is_session_time', lambda now: False)
+    snapshot_quotation = SnapshotQuotation(source=None)
+    snapshot_quotation.stop()
+
+    snapshot_quotation.poll()
+    assert snapshot.calls == [dict(prefix=True, columnar=True)]
+    aggregator = snapshot_quotation.aggregator
+    assert sorted(aggregator.codes) == ['000001', '600000']
+    df = aggregator.bars_of('000001')
+    assert df[['open', 'close', 'volume']].iloc[0].tolist() == [10.5, 10.5, 1000]
+
+
+def test_stock_rows_keeps_unprefixed_requests_only():
+    df = pd.DataFrame({'now': [1.0, 2.0, 3.0, 4.0]}, index=pd.Index(['sh000001', 'sz000001', 'sz399001', 'zz000912']))
+    rows = SnapshotQuotation.stock_rows(df)
+    assert rows.index.tolist() == ['000001', '399001']
+    assert rows.now.tolist() == [2.0, 3.0]
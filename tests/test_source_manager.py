@@ -0,0 +1,126 @@
+import threading
+
+import pytest
+
+from easyquotation import source_manager
+from easyquotation.source_manager import SourceManager, SourceStats
+
+
+class FakeClock:
+    """替换 source_manager 中的 time, 熔断时间由测试控制"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(source_manager, 'time', clock)
+    return clock
+
+
+class FakeSource:
+
+    def __init__(self, name, fail=False, block=None):
+        self.name = name
+        self.fail = fail
+        self.block = block
+        self.calls = 0
+
+    def __call__(self, code):
+        self.calls += 1
+        if self.block is not None:
+            self.block.wait(5)
+        if self.fail:
+            raise IOError('%s failed' % self.name)
+        return self.name, code
+
+
+def test_rank_by_p50_latency(clock):
+    manager = SourceManager()
+    for latency in (0.3, 0.4, 0.5):
+        manager.stats('slow').record(latency, True)
+    for latency in (0.01, 0.02, 0.03):
+        manager.stats('fast').record(latency, True)
+    # 没有延迟数据的源排在前面, 先试探一次
+    assert manager.rank(['slow', 'fast', 'new']) == ['new', 'fast', 'slow']
+    manager.stats('new').record(1.0, True)
+    assert manager.rank(['slow', 'fast', 'new']) == ['fast', 'slow', 'new']
+
+    fast, slow = FakeSource('fast'), FakeSource('slow')
+    assert manager.call([('slow', slow), ('fast', fast)], '000001') == ('fast', '000001')
+    assert slow.calls == 0
+
+
+def test_hedge_delay_follows_p95_with_floor(clock):
+    manager = SourceManager(hedge_delay=1.0, min_hedge_delay=0.05)
+    assert manager._hedge_delay('new') == 1.0
+    for latency in (0.01, 0.02):
+        manager.stats('fast').record(latency, True)
+    assert manager._hedge_delay('fast') == 0.05
+    for latency in [0.1] * 19 + [0.4]:
+        manager.stats('slow').record(latency, True)
+    assert manager._hedge_delay('slow') == 0.4
+
+
+def test_slow_primary_is_hedged(clock):
+    manager = SourceManager(hedge_delay=0.05)
+    release = threading.Event()
+    primary, backup = FakeSource('primary', block=release), FakeSource('backup')
+    try:
+        # 首选源在对冲时间内没有返回, 使用备用源的结果
+        assert manager.call([('primary', primary), ('backup', backup)], '000001') == ('backup', '000001')
+        assert primary.calls == 1 and backup.calls == 1
+    finally:
+        release.set()
+
+    # 首选源及时返回时不发出对冲请求
+    manager = SourceManager(hedge_delay=5)
+    primary, backup = FakeSource('primary'), FakeSource('backup')
+    assert manager.call([('primary', primary), ('backup', backup)], '000001') == ('primary', '000001')
+    assert backup.calls == 0
+
+
+def test_circuit_opens_after_failures_and_recovers(clock):
+    manager = SourceManager(failure_threshold=2, cooldown=30)
+    first, second = FakeSource('first', fail=True), FakeSource('second', fail=True)
+    sources = [('first', first), ('second', second)]
+    for _ in range(2):
+        with pytest.raises(IOError):
+            manager.call(sources, '000001')
+    assert first.calls == 2
+    assert manager.stats('first').snapshot()['open']
+
+    # 熔断期间跳过, 全部熔断时只请求最后一个源
+    with pytest.raises(IOError):
+        manager.call(sources, '000001')
+    assert first.calls == 2 and second.calls == 3
+
+    # 熔断到期后放行一次试探请求, 成功则恢复
+    clock.now += 31
+    first.fail = False
+    assert manager.call(sources, '000001') == ('first', '000001')
+    assert first.calls == 3
+    stats = manager.stats('first')
+    assert stats.consecutive_failures == 0 and not stats.snapshot()['open']
+    assert stats.available()
+
+
+def test_breaker_lets_one_trial_through(clock):
+    stats = SourceStats('s', failure_threshold=1, cooldown=10)
+    stats.record(0.1, False)
+    assert not stats.available()
+    clock.now += 11
+    assert stats.available()
+    # 试探请求返回前不再放行
+    assert not stats.available()
+    stats.record(0.1, False)
+    assert not stats.available()
+    clock.now += 11
+    assert stats.available()
+    stats.record(0.1, True)
+    assert stats.available() and stats.available()
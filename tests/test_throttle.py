@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from easyquotation import throttle
+from easyquotation.throttle import HostLimiter, ThrottleRegistry
+
+
+class FakeClock:
+    """替换 throttle 中的 time, sleep 只推进时钟"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_paces_requests(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(throttle, 'time', clock)
+    limiter = HostLimiter('host', rate=10, burst=2, concurrency=None)
+    waits = []
+    for _ in range(5):
+        waits.append(limiter.acquire())
+        limiter.release()
+    # 突发的 2 个请求不等待, 之后每 0.1s 一个
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2:] == pytest.approx([0.1, 0.1, 0.1])
+    assert clock.now == pytest.approx(100.3)
+
+    # 空闲期间令牌恢复, 但不超过桶容量
+    clock.now += 10
+    for _ in range(2):
+        assert limiter.acquire() == 0.0
+        limiter.release()
+    assert limiter.acquire() == pytest.approx(0.1)
+    limiter.release()
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_concurrency_cap():
+    registry = ThrottleRegistry(limits={'host': dict(rate=None, concurrency=2)})
+    release = threading.Event()
+    entered = []
+
+    def request(i):
+        with registry.limit('http://host/q=%d' % i):
+            entered.append(i)
+            release.wait(5)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    limiter = registry.limiter('host')
+    try:
+        assert wait_until(lambda: len(entered) == 2 and limiter.waiting == 1)
+        assert limiter.in_flight == 2
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join(5)
+    assert len(entered) == 3
+    assert limiter.snapshot()['requests'] == 3
+    assert limiter.in_flight == 0
+
+
+def test_release_on_exception():
+    registry = ThrottleRegistry(limits={'host': dict(rate=None, concurrency=1)})
+    with pytest.raises(ValueError):
+        with registry.limit('host'):
+            raise ValueError('request failed')
+
+    def observer(host, wait):
+        raise RuntimeError('observer failed')
+
+    registry.observer = observer
+    with pytest.raises(RuntimeError):
+        with registry.limit('host'):
+            pass
+    registry.observer = None
+
+    # 名额都已归还, 不会阻塞
+    limiter = registry.limiter('host')
+    assert limiter.in_flight == 0
+    assert limiter._semaphore.acquire(blocking=False)
+    limiter._semaphore.release()
+
+
+def test_quotation_hosts_are_limited_and_unlisted_hosts_are_not():
+    registry = ThrottleRegistry()
+    # 新浪 / 腾讯的快照和K线 host 有默认限制, 同一 host 的不同 URL 共用一个限制器
+    for url in ['http://hq.sinajs.cn/rn=1&list=sh600000', 'http://qt.gtimg.cn/q=sz000001',
+                'http://ifzq.gtimg.cn/appstock/app/kline/mkline?param=sz000001,m1,,10',
+                'http://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param=sz000001,day,,,10,qfq',
+                'http://money.finance.sina.com.cn/quotes_service/api/json_v2.php/CN_MarketData.getKLineData']:
+        limiter = registry.limiter(url)
+        assert limiter.rate and limiter.concurrency
+    assert registry.limiter('http://qt.gtimg.cn/q=sh600000') is registry.limiter('http://qt.gtimg.cn/q=sz000001')
+    limiter = registry.limiter('https://www.jisilu.cn/data/cbnew/')
+    assert limiter.rate is None and limiter.concurrency is None
@@ -0,0 +1,76 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+
+from easyquant import tick_recorder
+from easyquant.tick_recorder import LEVELS, TickStore, sina_columns
+
+
+def snapshot(codes, quote_time, price=10.0):
+    """新浪列式快照, 以带市场前缀的股票代码为索引"""
+    data = dict(date='2024-01-02', time=quote_time, now=price, turnover=1000, volume=price * 1000)
+    for i in range(1, LEVELS + 1):
+        data.update({'bid%d' % i: price - i * 0.01, 'bid%d_volume' % i: 100 * i,
+                     'ask%d' % i: price + i * 0.01, 'ask%d_volume' % i: 200 * i})
+    return pd.DataFrame(data, index=pd.Index(codes))
+
+
+def test_code_index_and_unchanged_quotes(tmp_path):
+    store = TickStore(str(tmp_path))
+    writer = store.writer('20240102')
+    df = snapshot(['sh600000', 'sz000001'], '09:30:00')
+    assert writer.append(sina_columns(df), df.index, datetime.datetime(2024, 1, 2, 9, 30, 3)) == 2
+    # sz000001 行情时间没有变化, 不重复写入; 新股票追加到代码表末尾
+    df = snapshot(['sz000001', 'sh600001', 'sh600000'], '09:30:03', price=11.0)
+    df.loc['sz000001', 'time'] = '09:30:00'
+    assert writer.append(sina_columns(df), df.index, datetime.datetime(2024, 1, 2, 9, 30, 6)) == 2
+    writer.close()
+
+    assert store.codes('20240102') == ['sh600000', 'sz000001', 'sh600001']
+    data = store.read('20240102')
+    assert isinstance(data['price'], np.memmap)
+    assert data['code'].tolist() == [0, 1, 2, 0]
+    assert data['price'].tolist() == [10.0, 10.0, 11.0, 11.0]
+    assert data['bid_volume'][0].tolist() == [100, 200, 300, 400, 500]
+    later = store.read('20240102', start=datetime.datetime(2024, 1, 2, 9, 30, 4))
+    assert later['code'].tolist() == [2, 0]
+
+    # 重新打开时沿用代码表, 截断没有写入索引的半条记录
+    with open(os.path.join(store.path('20240102'), 'price.bin'), 'ab') as f:
+        f.write(b'\0\0')
+    writer = store.writer('20240102')
+    assert writer.count == 4
+    assert writer.code_index == {'sh600000': 0, 'sz000001': 1, 'sh600001': 2}
+    writer.close()
+    assert os.path.getsize(os.path.join(store.path('20240102'), 'price.bin')) == 4 * np.dtype(np.float32).itemsize
+
+
+class FakeQuotation:
+
+    def __init__(self):
+        self.snapshots = []
+
+    def market_snapshot(self, prefix=False, columnar=False):
+        return self.snapshots.pop(0)
+
+
+def test_recorder_rolls_over_to_new_day(tmp_path, monkeypatch):
+    quotation = FakeQuotation()
+    monkeypatch.setattr(tick_recorder.easyquotation, 'use', lambda source: quotation)
+    recorder = tick_recorder.TickRecorder(root=str(tmp_path))
+    quotation.snapshots = [snapshot(['sh600000'], '14:59:57'), snapshot(['sz000001', 'sh600000'], '09:30:00')]
+    assert recorder.record(datetime.datetime(2024, 1, 2, 14, 59, 58)) == 1
+    first_writer = recorder._writer
+    assert recorder.record(datetime.datetime(2024, 1, 3, 9, 30, 3)) == 2
+    assert recorder._writer is not first_writer
+    assert first_writer._index.closed
+    recorder._writer.close()
+
+    store = recorder.store
+    assert store.days() == ['20240102', '20240103']
+    # 每天一个代码表, 下标从 0 开始
+    assert store.codes('20240103') == ['sz000001', 'sh600000']
+    assert store.frame('20240103').code.tolist() == ['sz000001', 'sh600000']
+    assert store.read('20240102')['code'].tolist() == [0]
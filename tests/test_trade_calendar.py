@@ -0,0 +1,54 @@
+import datetime
+
+import pytest
+
+from easyquant.easydealutils.time import calendar
+from easyquant.easydealutils.trade_calendar import TradeCalendar
+
+D = datetime.date
+# trade_days.json 的第一天 2005-01-04(周二), 最后一天 2023-10-09(周一, 国庆节后)
+FIRST, LAST = D(2005, 1, 4), D(2023, 10, 9)
+
+
+def test_calendar_ends():
+    assert calendar.next(D(2005, 1, 1)) == FIRST
+    assert calendar.prev(D(2005, 1, 5)) == FIRST
+    with pytest.raises(ValueError):
+        calendar.prev(FIRST)
+    assert calendar.next(D(2023, 9, 28)) == LAST
+
+
+def test_non_trading_days_inside_calendar():
+    # 国庆节假期和周末
+    assert not calendar.is_trade_day(D(2023, 10, 2))
+    assert calendar.next(D(2023, 10, 1)) == LAST
+    assert calendar.prev(D(2023, 10, 7)) == D(2023, 9, 28)
+    assert calendar.count(D(2023, 9, 29), D(2023, 10, 8)) == 0
+    assert calendar.count(D(2023, 9, 28), LAST) == 2
+    assert calendar.offset(D(2023, 10, 3), 0) == LAST
+
+
+def test_beyond_last_day_uses_weekdays():
+    assert calendar.next(LAST) == D(2023, 10, 10)
+    # 从周六开始, 下一个交易日是周一
+    assert calendar.next(D(2023, 10, 14)) == D(2023, 10, 16)
+    assert calendar.next(LAST, 5) == D(2023, 10, 16)
+    # 从日历之外往前数, 跨回日历范围内
+    assert calendar.prev(D(2023, 10, 11), 2) == LAST
+    assert calendar.prev(D(2023, 10, 11), 3) == D(2023, 9, 28)
+    assert calendar.prev(D(2023, 10, 16)) == D(2023, 10, 13)
+    # 日历内的部分按日历, 之后按工作日
+    assert calendar.count(D(2023, 9, 28), D(2023, 10, 15)) == 2 + 4
+    assert calendar.count(D(2023, 10, 14), D(2023, 10, 15)) == 0
+
+
+def test_count_matches_next_and_prev():
+    cal = TradeCalendar(['2016-05-04', '2016-05-05', '2016-05-06', '2016-05-09'])
+    assert cal.count('2016-05-04', '2016-05-09') == 4
+    assert cal.count('2016-05-07', '2016-05-08') == 0
+    assert cal.count('2016-05-09', '2016-05-04') == 0
+    # 从第 n 个交易日往回数 n-1 个得到起点
+    for n in range(1, 6):
+        end = cal.next('2016-05-03', n)
+        assert cal.count('2016-05-04', end) == n
+        assert cal.prev(end, n - 1) == D(2016, 5, 4)
@@ -0,0 +1,25 @@
+from easyquant.push_engine.watch_registry import WatchRegistry
+
+
+def test_refcount_calls_back_on_first_add_and_last_remove():
+    events = []
+    registry = WatchRegistry(on_add=lambda code: events.append(('add', code)),
+                             on_remove=lambda code: events.append(('remove', code)))
+    assert registry.add('s1', 'a')
+    assert registry.add('s2', 'a')
+    assert not registry.add('s1', 'a')
+    assert registry.refcount('a') == 2
+    registry.remove('s1', 'a')
+    assert 'a' in registry
+    registry.remove('s2', 'a')
+    assert 'a' not in registry
+    assert events == [('add', 'a'), ('remove', 'a')]
+
+
+def test_set_watchlist_only_applies_changes():
+    registry = WatchRegistry()
+    registry.set_watchlist('s1', ['a', 'b'])
+    added, removed = registry.set_watchlist('s1', ['b', 'c'])
+    assert added == {'c'} and removed == {'a'}
+    assert registry.watchlist('s1') == {'b', 'c'}
+    assert registry.codes() == ['b', 'c']
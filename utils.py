@@ -23,6 +23,12 @@ def is_work_time():
 
 
 
+def _trade_calendar():
+    # 延迟加载交易日历, 只做普通日期计算时不需要
+    from easyquant.easydealutils.time import calendar
+    return calendar
+
+
 class DateHelper:
     """日期操作辅助类"""
     
@@ -121,11 +127,49 @@ class DateHelper:
     # 获取最近一个工作日
     @classmethod
     def get_last_work_day(cls, fmt: str = DEFAULT_FMT) -> str:
-        today = datetime.now()
-        #  todo 死循环
-        while not is_weekday():
-            today = cls.sub_days(today, 1)
-        return today
+        """最近一个交易日(含今天)"""
+        return cls.prev_trade_day(cls.add_days(cls.get_today(), 1), 1, fmt)
+
+    @classmethod
+    def is_trade_day(cls, date: Union[str, datetime]) -> bool:
+        """是否是交易日"""
+        if isinstance(date, str):
+            date = cls.str_to_date(date)
+        return _trade_calendar().is_trade_day(date)
+
+    @classmethod
+    def next_trade_day(cls, date: Union[str, datetime], n: int = 1,
+                       out_fmt: str = DEFAULT_FMT) -> str:
+        """之后第 n 个交易日"""
+        if isinstance(date, str):
+            date = cls.str_to_date(date)
+        return cls.date_to_str(_trade_calendar().next(date, n), out_fmt)
+
+    @classmethod
+    def prev_trade_day(cls, date: Union[str, datetime], n: int = 1,
+                       out_fmt: str = DEFAULT_FMT) -> str:
+        """之前第 n 个交易日"""
+        if isinstance(date, str):
+            date = cls.str_to_date(date)
+        return cls.date_to_str(_trade_calendar().prev(date, n), out_fmt)
+
+    @classmethod
+    def get_trade_days_before(cls, days: int,
+                              end_date: Optional[Union[str, datetime]] = None,
+                              out_fmt: str = DEFAULT_FMT) -> str:
+        """获取指定日期前N个交易日的日期"""
+        return cls.prev_trade_day(end_date or datetime.now(), days, out_fmt)
+
+    @classmethod
+    def get_trade_date_range(cls, start: Union[str, datetime],
+                             end: Union[str, datetime],
+                             fmt: str = DEFAULT_FMT) -> list:
+        """获取日期范围内的所有交易日"""
+        if isinstance(start, str):
+            start = cls.str_to_date(start)
+        if isinstance(end, str):
+            end = cls.str_to_date(end)
+        return [cls.date_to_str(day.astype(object), fmt) for day in _trade_calendar().range(start, end)]
 
         
 # 使用示例
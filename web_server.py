@@ -1,4 +1,5 @@
 import json
+import os
 from datetime import datetime, timedelta
 from typing import List
 
@@ -33,6 +34,10 @@ SECRET_KEY = "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 3000
 
+# 主引擎写入的延迟统计文件, 与 easyquant.metrics.METRICS_FILE 一致.
+# 直接读取文件, 不导入 easyquant(会连带导入交易 / 行情的依赖)
+METRICS_FILE = "metrics.json"
+
 app = FastAPI()
 settings = APISettings()
 database = Database()
@@ -174,6 +179,14 @@ async def add_watch_stock(code: str = Body(...),strategy: str = Body(default='
 async def update_watch_stock_buy_monitor(id: int = Body(...), is_buy_monitor: int = Body(...)):
     return db_service.update_watch_stock_buy_monitor(id, is_buy_monitor)
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """交易程序的延迟统计(排队 / 策略处理 / 行情获取 / K线收盘到信号), 由主引擎定期写入"""
+    if not os.path.exists(METRICS_FILE):
+        return {}
+    with open(METRICS_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)